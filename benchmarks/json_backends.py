@@ -0,0 +1,109 @@
+"""Benchmark the JSON backends on `ad_stats_hourly`-shaped responses.
+
+Decodes a stats response, builds its rows with `StatsStream.parse_response` and
+serializes every row as a Singer RECORD message, then reports records/sec. With
+the tap installed (`pip install -e .`):
+
+    python benchmarks/json_backends.py --entities 50 --hours 168
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import importlib.util
+import json
+import time
+
+import requests
+from singer_sdk.singerlib import RecordMessage
+
+from tap_snapchat_ads.jsonlib import (
+    PREFERRED_BACKENDS,
+    SingerMessageWriter,
+    get_json_backend,
+)
+from tap_snapchat_ads.streams import ALL_STATS_FIELDS
+from tap_snapchat_ads.tap import TapSnapchatAds
+
+CONFIG = {
+    "client_id": "client-id",
+    "client_secret": "client-secret",
+    "refresh_token": "refresh-token",
+    "start_date": "2024-01-01T00:00:00Z",
+}
+
+
+def to_timestamp(value: datetime.datetime) -> str:
+    """Return `value` formatted like the timestamps in SnapchatAds responses."""
+    return value.isoformat(timespec="milliseconds")
+
+
+def build_payload(entities: int, hours: int) -> bytes:
+    """Return an hourly stats response body for `entities` ads over `hours` hours."""
+    tzinfo = datetime.timezone(datetime.timedelta(hours=-8))
+    start = datetime.datetime(2024, 1, 1, tzinfo=tzinfo)
+    hour_length = datetime.timedelta(hours=1)
+    metrics = ALL_STATS_FIELDS.split(",")
+    timeseries = [
+        {
+            "start_time": to_timestamp(start + hour * hour_length),
+            "end_time": to_timestamp(start + (hour + 1) * hour_length),
+            "stats": {
+                metric: (hour * index) % 997 / 7 for index, metric in enumerate(metrics)
+            },
+        }
+        for hour in range(hours)
+    ]
+    return json.dumps({
+        "request_status": "SUCCESS",
+        "timeseries_stats": [
+            {"timeseries_stat": {
+                "id": f"ad-{entity}",
+                "type": "AD",
+                "granularity": "HOUR",
+                "start_time": timeseries[0]["start_time"],
+                "end_time": timeseries[-1]["end_time"],
+                "finalized_data_end_time": timeseries[-1]["end_time"],
+                "timeseries": timeseries,
+            }}
+            for entity in range(entities)
+        ],
+    }).encode()
+
+
+def run(backend_name: str, body: bytes, repeat: int) -> float:
+    """Return the records/sec decoded, parsed and serialized with `backend_name`."""
+    stream = TapSnapchatAds(
+        config={**CONFIG, "json_backend": backend_name}, parse_env_config=False
+    ).streams["ad_stats_hourly"]
+    writer = SingerMessageWriter(get_json_backend(backend_name))
+    records = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = requests.Response()
+        response._content = body
+        for record in stream.parse_response(response):
+            writer.serialize_message(RecordMessage(stream=stream.name, record=record))
+            records += 1
+    return records / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=50)
+    parser.add_argument("--hours", type=int, default=168)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    body = build_payload(args.entities, args.hours)
+    print(f"{len(body) / 1e6:.1f} MB response, {args.entities * args.hours} rows")
+    for name in PREFERRED_BACKENDS:
+        if name != "json" and importlib.util.find_spec(name) is None:
+            print(f"{name:>8}: not installed")
+            continue
+        print(f"{name:>8}: {run(name, body, args.repeat):,.0f} records/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark end-to-end sync throughput of each stream family against the mock API.
+
+Every family is synced by a separate tap process against a local mock of the
+Marketing API, reporting records/sec, requests, peak RSS and wall time. With the
+tap installed (`pip install -e .`):
+
+    python benchmarks/throughput.py --ad-accounts 5 --ads 20 --days 30 --latency 0.05
+
+Results can be saved with `--output` and compared against a saved run with
+`--baseline`, which fails when a family got more than `--tolerance` slower.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from tap_snapchat_ads.tests.mock_api import MockDataset, MockSnapchatAdsAPI, run_tap
+
+STREAM_FAMILIES = {
+    "entities": ["organizations", "ad_accounts", "campaigns", "ad_squads", "ads"],
+    "stats_daily": [
+        "ad_account_stats_daily", "campaign_stats_daily", "ad_squad_stats_daily", "ad_stats_daily",
+    ],
+    "stats_hourly": [
+        "ad_account_stats_hourly", "campaign_stats_hourly", "ad_squad_stats_hourly",
+        "ad_stats_hourly",
+    ],
+    "targeting": [
+        "targeting_genders", "targeting_age_groups", "targeting_interests_dlxs",
+        "targeting_countries", "targeting_regions", "targeting_metros", "targeting_postal_codes",
+    ],
+}
+
+
+def run(family: str, dataset: MockDataset, config: dict, directory: Path) -> dict:
+    """Sync one stream family against a fresh mock API and return its measurements."""
+    with MockSnapchatAdsAPI(dataset) as api:
+        tap_run = run_tap({**api.config, **config}, STREAM_FAMILIES[family], directory)
+    records = sum(tap_run.records.values())
+    return {
+        "records": records,
+        "requests": api.request_count,
+        "wall_seconds": round(tap_run.wall_seconds, 3),
+        "records_per_second": round(records / tap_run.wall_seconds, 1),
+        "peak_rss_mb": round(tap_run.peak_rss_bytes / 2**20, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return the families whose records/sec dropped by more than `tolerance`."""
+    regressions = []
+    for family, result in results.items():
+        expected = baseline.get(family, {}).get("records_per_second")
+        if expected and result["records_per_second"] < expected * (1 - tolerance):
+            regressions.append(
+                f"{family}: {result['records_per_second']:,.0f} records/sec, "
+                f"baseline {expected:,.0f}"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--families", nargs="+", choices=list(STREAM_FAMILIES),
+                        default=list(STREAM_FAMILIES))
+    parser.add_argument("--organizations", type=int, default=1)
+    parser.add_argument("--ad-accounts", type=int, default=2)
+    parser.add_argument("--ads", type=int, default=10)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--targeting-dimensions", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds every mock API request takes")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="answer every n-th request with a 429")
+    parser.add_argument("--config", type=json.loads, default={},
+                        help='extra tap config as JSON, e.g. \'{"max_workers": 8}\'')
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    dataset = MockDataset(
+        organizations=args.organizations,
+        ad_accounts=args.ad_accounts,
+        ads=args.ads,
+        days=args.days,
+        targeting_dimensions=args.targeting_dimensions,
+        page_size=args.page_size,
+        latency=args.latency,
+        rate_limit_every=args.rate_limit_every,
+    )
+    config = {"targeting_country_codes": ["us", "nl", "fr"], **args.config}
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for family in args.families:
+            results[family] = result = run(family, dataset, config, Path(directory) / family)
+            print(
+                f"{family:>13}: {result['records']:>8,} records, "
+                f"{result['records_per_second']:>10,.0f} records/sec, "
+                f"{result['requests']:>6,} requests, "
+                f"{result['peak_rss_mb']:>6.1f} MB peak RSS, {result['wall_seconds']:.1f}s"
+            )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"regression in {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
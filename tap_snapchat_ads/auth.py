@@ -2,22 +2,50 @@
 
 from __future__ import annotations
 
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import requests
 from singer_sdk.authenticators import OAuthAuthenticator, SingletonMeta
+from singer_sdk.helpers._util import utc_now
+
+# Tokens are renewed in the background once they expire within this many seconds.
+REFRESH_MARGIN_SECONDS = 300
+# Requests wait for a new token once the current one expires within this many seconds.
+MIN_TOKEN_LIFETIME_SECONDS = 30
 
 
 # The SingletonMeta metaclass makes your streams reuse the same authenticator instance.
 # If this behaviour interferes with your use-case, you can remove the metaclass.
 class SnapchatAdsAuthenticator(OAuthAuthenticator, metaclass=SingletonMeta):
-    """Authenticator class for SnapchatAds."""
+    """Authenticator class for SnapchatAds.
+
+    Tokens are renewed by a background thread ahead of their expiry, so requests
+    keep using the current token meanwhile. Only requests made without a usable
+    token wait, and concurrent refreshes are de-duplicated. The access token can
+    be cached in `token_cache_path` for the next runs.
+    """
 
     def __init__(
         self,
         *args,
         refresh_token: str,
+        token_cache_path: str | None = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self._refresh_token = refresh_token
+        self.token_cache_path = Path(token_cache_path) if token_cache_path else None
+        self._refresh_lock = threading.Lock()
+        self._background_refresh_lock = threading.Lock()
+        self._background_refresh: threading.Thread | None = None
+        if self.token_cache_path:
+            self.load_cached_token()
 
     @property
     def oauth_request_body(self) -> dict:
@@ -28,3 +56,112 @@ class SnapchatAdsAuthenticator(OAuthAuthenticator, metaclass=SingletonMeta):
             "client_secret": self.client_secret,
             "refresh_token": self._refresh_token,
         }
+
+    def get_seconds_left(self) -> float | None:
+        """Return the number of seconds the token is valid for, or None if it never expires."""
+        if self.last_refreshed is None:
+            return 0.0
+        if not self.expires_in:
+            return None
+        return self.expires_in - (utc_now() - self.last_refreshed).total_seconds()
+
+    def is_token_valid(self) -> bool:
+        """Return True if the token outlives a request sent with it."""
+        seconds_left = self.get_seconds_left()
+        return seconds_left is None or seconds_left > MIN_TOKEN_LIFETIME_SECONDS
+
+    def authenticate_request(
+        self, request: requests.PreparedRequest
+    ) -> requests.PreparedRequest:
+        """Authenticate a request, renewing the token in the background if it expires soon."""
+        seconds_left = self.get_seconds_left()
+        if (
+            seconds_left is not None
+            and MIN_TOKEN_LIFETIME_SECONDS < seconds_left <= REFRESH_MARGIN_SECONDS
+        ):
+            self.start_background_refresh()
+        return super().authenticate_request(request)
+
+    def update_access_token(self) -> None:
+        """Request a new token, unless another thread renewed it in the meantime."""
+        self._update_access_token(self.last_refreshed)
+
+    def _update_access_token(self, last_refreshed: datetime.datetime | None) -> None:
+        with self._refresh_lock:
+            if self.last_refreshed != last_refreshed and self.is_token_valid():
+                return
+            super().update_access_token()
+            if self.token_cache_path:
+                self.save_cached_token()
+
+    def start_background_refresh(self) -> None:
+        """Renew the token on a background thread, unless one is already doing it."""
+        with self._background_refresh_lock:
+            if self._background_refresh and self._background_refresh.is_alive():
+                return
+            last_refreshed = self.last_refreshed
+
+            def refresh() -> None:
+                try:
+                    self._update_access_token(last_refreshed)
+                except Exception:  # noqa: BLE001
+                    # Requests renew the token themselves once it is about to expire.
+                    self.logger.warning("Background token refresh failed", exc_info=True)
+
+            self._background_refresh = threading.Thread(
+                target=refresh, name="snapchat-ads-token-refresh", daemon=True
+            )
+            self._background_refresh.start()
+
+    def expire_token(self, access_token: str | None) -> None:
+        """Mark `access_token` as expired, if it still is the current token.
+
+        Called when the API rejects a token, so that only the first rejection leads
+        to a refresh.
+        """
+        with self._refresh_lock:
+            if access_token == self.access_token:
+                self.last_refreshed = None
+
+    @property
+    def _cache_key(self) -> str:
+        """Return the key identifying the credentials a cached token was obtained with."""
+        credentials = f"{self.client_id}:{self._refresh_token}:{self._auth_endpoint}"
+        return hashlib.sha256(credentials.encode()).hexdigest()
+
+    def load_cached_token(self) -> None:
+        """Use the cached access token if it was obtained with the same credentials."""
+        try:
+            cached = json.loads(self.token_cache_path.read_text())
+            expires_at = datetime.datetime.fromisoformat(cached["expires_at"])
+            if cached["key"] != self._cache_key:
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        now = utc_now()
+        seconds_left = int((expires_at - now).total_seconds())
+        if seconds_left <= MIN_TOKEN_LIFETIME_SECONDS:
+            return
+        self.access_token = cached["access_token"]
+        self.expires_in = seconds_left
+        self.last_refreshed = now
+        self.logger.info("Using cached access token")
+
+    def save_cached_token(self) -> None:
+        """Write the access token and its expiry to the cache, readable by the owner only."""
+        if not self.expires_in:
+            return
+        expires_at = self.last_refreshed + datetime.timedelta(seconds=self.expires_in)
+        content = json.dumps({
+            "key": self._cache_key,
+            "access_token": self.access_token,
+            "expires_at": expires_at.isoformat(),
+        })
+        try:
+            self.token_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=self.token_cache_path.parent)
+            with os.fdopen(file_descriptor, "w") as cache_file:
+                cache_file.write(content)
+            os.replace(temporary_path, self.token_cache_path)
+        except OSError:
+            self.logger.warning("Could not cache the access token", exc_info=True)
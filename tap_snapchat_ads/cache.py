@@ -0,0 +1,152 @@
+"""On-disk stores: the reference data cache and change detection fingerprints."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from tap_snapchat_ads.jsonlib import JSONBackend, dumps_canonical
+
+
+def partition_path(
+    directory: Path, stream_name: str, context: dict | None, suffix: str
+) -> Path:
+    """Return the file storing data of one stream partition under `directory`."""
+    key = dumps_canonical(sorted((context or {}).items()))
+    return directory / stream_name / f"{hashlib.sha256(key).hexdigest()[:16]}{suffix}"
+
+
+def write_atomically(path: Path, content: bytes) -> None:
+    """Write `content` gzipped to `path` so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(file_descriptor, "wb") as raw_file, gzip.open(
+            raw_file, "wb", compresslevel=1
+        ) as gzip_file:
+            gzip_file.write(content)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+@dataclass
+class CacheEntry:
+    """The records of one stream partition as last fetched from the API."""
+
+    fetched_at: float
+    content_hash: str
+    records: list[dict[str, Any]]
+
+    def is_fresh(self, ttl_seconds: float) -> bool:
+        """Return True if the entry was fetched less than `ttl_seconds` ago."""
+        return time.time() - self.fetched_at < ttl_seconds
+
+
+class ReferenceCache:
+    """Store the records of stream partitions as gzipped JSON files.
+
+    Every entry keeps a hash of its content, so that a refetch can tell whether the
+    dataset changed since it was cached. Entries are written atomically, so partitions
+    fetched concurrently by worker threads never see partial files.
+    """
+
+    def __init__(self, directory: str | Path, backend: JSONBackend):
+        self.directory = Path(directory)
+        self.backend = backend
+
+    def _path(self, stream_name: str, context: dict | None) -> Path:
+        return partition_path(self.directory, stream_name, context, ".json.gz")
+
+    def content_hash(self, records: list[dict[str, Any]]) -> str:
+        """Return the hash identifying the content of `records`."""
+        return hashlib.sha256(dumps_canonical(records)).hexdigest()
+
+    def get(self, stream_name: str, context: dict | None) -> CacheEntry | None:
+        """Return the cached entry of a partition, or None if there is none."""
+        try:
+            with gzip.open(self._path(stream_name, context), "rb") as cache_file:
+                return CacheEntry(**self.backend.loads(cache_file.read()))
+        except (FileNotFoundError, EOFError, OSError, TypeError, ValueError):
+            return None
+
+    def put(
+        self, stream_name: str, context: dict | None, records: list[dict[str, Any]]
+    ) -> CacheEntry:
+        """Store the records of a partition and return the new entry."""
+        entry = CacheEntry(
+            fetched_at=time.time(),
+            content_hash=self.content_hash(records),
+            records=records,
+        )
+        write_atomically(
+            self._path(stream_name, context), self.backend.dumps(entry.__dict__)
+        )
+        return entry
+
+
+class FingerprintStore:
+    """Fingerprints of the rows of one stream partition, keyed by primary key.
+
+    Rows are checked one by one during a sync; `save` then stores the fingerprints
+    seen as a new generation, so rows that were not seen again are dropped after
+    being reported by `get_deleted_keys`.
+
+    The stream state references the generation a sync compares against. A sync
+    whose state never reached the target, for instance because the target failed,
+    leaves the next sync comparing against the same generation, which then emits
+    the changes again: changes are delivered at least once.
+    """
+
+    def __init__(self, path: Path, backend: JSONBackend, generation: str | None):
+        self.path = path
+        self.backend = backend
+        self.generation = generation
+        self.previous: dict[str, str] = {}
+        if generation is not None:
+            try:
+                with gzip.open(self._path(generation), "rb") as store_file:
+                    self.previous = backend.loads(store_file.read())
+            except (FileNotFoundError, EOFError, OSError, ValueError):
+                pass
+        self.current: dict[str, str] = {}
+
+    def _path(self, generation: str) -> Path:
+        return self.path.with_name(
+            f"{self.path.name}.{generation}.fingerprints.json.gz"
+        )
+
+    def is_changed(self, key: list, record: dict[str, Any]) -> bool:
+        """Record the fingerprint of a row and return whether it is new or changed."""
+        key_json = dumps_canonical(key).decode()
+        fingerprint = hashlib.sha256(dumps_canonical(record)).hexdigest()
+        self.current[key_json] = fingerprint
+        return self.previous.get(key_json) != fingerprint
+
+    def get_deleted_keys(self) -> list[list]:
+        """Return the primary keys of stored rows that were not seen in this sync."""
+        return [
+            self.backend.loads(key_json) for key_json in self.previous
+            if key_json not in self.current
+        ]
+
+    def save(self) -> str:
+        """Store the fingerprints seen in this sync as a new generation.
+
+        Returns the generation, for the stream state to reference. Only the
+        generation compared against is kept besides it.
+        """
+        generation = f"{time.time_ns():x}"
+        write_atomically(self._path(generation), self.backend.dumps(self.current))
+        kept = {generation, self.generation}
+        for path in self.path.parent.glob(f"{self.path.name}.*.fingerprints.json.gz"):
+            if path.name.split(".")[1] not in kept:
+                path.unlink(missing_ok=True)
+        return generation
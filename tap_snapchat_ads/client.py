@@ -2,24 +2,105 @@
 
 from __future__ import annotations
 
+import datetime
+import time
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import cached_property
+from pathlib import Path
 from typing import Any
 from urllib.parse import urlparse, parse_qs
 
+import backoff
 import requests
+from requests.adapters import HTTPAdapter
+from singer_sdk import metrics
+from singer_sdk.exceptions import RetriableAPIError
 from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk.streams import RESTStream
+from singer_sdk.streams.core import REPLICATION_INCREMENTAL
 
 from tap_snapchat_ads.auth import SnapchatAdsAuthenticator
+from tap_snapchat_ads.cache import FingerprintStore, ReferenceCache, partition_path
+from tap_snapchat_ads.engine import AsyncRequestEngine
+from tap_snapchat_ads.jsonlib import JSONBackend, get_json_backend
+from tap_snapchat_ads.metrics import StreamMetrics
+from tap_snapchat_ads.ratelimit import RateLimiter, get_rate_limiter
+from tap_snapchat_ads.sharding import Shard
+from tap_snapchat_ads.streaming import (
+    ObjectBuilder,
+    is_unread,
+    iter_chunks,
+    iter_items,
+    jsonpath_to_prefix,
+    parse_events,
+    require_ijson,
+)
+from tap_snapchat_ads.windows import parse_datetime
+
+API_URL = "https://adsapi.snapchat.com/v1"
+AUTH_URL = "https://accounts.snapchat.com/login/oauth2/access_token"
+# Context keys passed down to child streams that don't identify a partition.
+NON_PARTITION_CONTEXT_KEYS = ("ad_account_timezone",)
 
 
 class SnapchatAdsStream(RESTStream):
     """SnapchatAds stream class."""
 
-    url_base = "https://adsapi.snapchat.com/v1"
-
     records_jsonpath = "$[*]"  # Or override `parse_response`.
     next_page_token_jsonpath = "$.paging.next_link"  # Or override `get_next_page_token`.
+    # Whether the stream is near-static reference data that may be cached on disk.
+    cache_reference_data = False
+    # Whether incremental records older than the bookmark are left out.
+    filter_records_before_bookmark = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prefetched_records: dict[tuple, Future] = {}
+        self._pending_child_contexts: deque[dict] = deque()
+        self._fingerprint_stores: dict[tuple, FingerprintStore] = {}
+        self.sync_metrics = StreamMetrics(self.name)
+
+    @property
+    def url_base(self) -> str:
+        """Return the API base URL, which `api_url` overrides."""
+        return self.config.get("api_url") or API_URL
+
+    @property
+    def max_workers(self) -> int:
+        """Return the number of partitions that may be fetched in parallel."""
+        return max(self.config.get("max_workers") or 1, 1)
+
+    @cached_property
+    def shard(self) -> Shard | None:
+        """Return the shard of the sync this process runs, if it is sharded."""
+        return Shard.from_config(self.config)
+
+    @cached_property
+    def executor(self) -> ThreadPoolExecutor:
+        """Return the worker pool used to prefetch the partitions of child streams."""
+        return ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=self.name
+        )
+
+    @cached_property
+    def async_engine(self) -> AsyncRequestEngine | None:
+        """Return the shared asyncio engine if `http_engine` is set to `async`."""
+        if self.config.get("http_engine") != "async":
+            return None
+        return AsyncRequestEngine(max_concurrency=self.max_workers, timeout=self.timeout)
+
+    @property
+    def requests_session(self) -> requests.Session:
+        """Return the session, with a connection pool large enough for the workers."""
+        if not self._requests_session:
+            self._requests_session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=max(self.max_workers, 10))
+            self._requests_session.mount("https://", adapter)
+            self._requests_session.mount("http://", adapter)
+            self._requests_session.stream = self.stream_responses
+        return self._requests_session
 
     @cached_property
     def authenticator(self) -> SnapchatAdsAuthenticator:
@@ -28,10 +109,73 @@ class SnapchatAdsStream(RESTStream):
             client_id=self.config["client_id"],
             client_secret=self.config["client_secret"],
             refresh_token=self.config["refresh_token"],
-            auth_endpoint="https://accounts.snapchat.com/login/oauth2/access_token",
+            token_cache_path=self.config.get("token_cache_path"),
+            auth_endpoint=self.config.get("auth_url") or AUTH_URL,
             oauth_scopes="snapchat-marketing-api",
         )
 
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Return the rate limiter shared by all streams using the same token."""
+        return get_rate_limiter(
+            self.authenticator, max_rate=self.config.get("max_requests_per_second")
+        )
+
+    def _request(
+        self, prepared_request: requests.PreparedRequest, context: dict | None
+    ) -> requests.Response:
+        """Send a request when the rate limit allows, over the async engine if set."""
+        self.sync_metrics.observe_throttle(self.rate_limiter.acquire())
+        if self.async_engine is None:
+            return super()._request(prepared_request, context)
+        response = self.async_engine.send(self.authenticator(prepared_request))
+        self._write_request_duration_log(
+            endpoint=self.path, response=response, context=context, extra_tags=None
+        )
+        self.validate_response(response)
+        return response
+
+    def _write_request_duration_log(
+        self,
+        endpoint: str,
+        response: requests.Response,
+        context: dict | None,
+        extra_tags: dict | None,
+    ) -> None:
+        self.sync_metrics.observe_request(endpoint, self._context_key(context), response)
+        super()._write_request_duration_log(endpoint, response, context, extra_tags)
+
+    def backoff_handler(self, details) -> None:
+        self.sync_metrics.observe_retry()
+        super().backoff_handler(details)
+
+    def validate_response(self, response: requests.Response) -> None:
+        """Feed the response to the rate limiter before validating it.
+
+        Rejected tokens are renewed and the request retried with the new one.
+        """
+        self.rate_limiter.observe(response)
+        if response.status_code == 401:
+            authorization = response.request.headers.get("Authorization", "")
+            self.authenticator.expire_token(authorization.removeprefix("Bearer "))
+            raise RetriableAPIError(self.response_error_message(response), response)
+        super().validate_response(response)
+
+    def backoff_wait_generator(self):
+        """Back off exponentially, except on 429s which the rate limiter paces."""
+        exponential = backoff.expo(factor=2)
+        next(exponential)
+        exception = yield
+        while True:
+            if (
+                isinstance(exception, RetriableAPIError)
+                and exception.response is not None
+                and exception.response.status_code == 429
+            ):
+                exception = yield 0
+            else:
+                exception = yield next(exponential)
+
     @property
     def http_headers(self) -> dict:
         """Return the http headers needed."""
@@ -40,13 +184,312 @@ class SnapchatAdsStream(RESTStream):
             headers["User-Agent"] = self.config.get("user_agent")
         return headers
 
+    def _get_state_partition_context(self, context: dict | None) -> dict | None:
+        """Return the partition context of `context`, which identifies its state."""
+        partition_context = super()._get_state_partition_context(context)
+        if partition_context is None:
+            return None
+        return {
+            key: value for key, value in partition_context.items()
+            if key not in NON_PARTITION_CONTEXT_KEYS
+        }
+
+    @staticmethod
+    def _context_key(context: dict | None) -> tuple:
+        return tuple(sorted((context or {}).items()))
+
+    def prefetch(self, context: dict, executor: ThreadPoolExecutor) -> None:
+        """Start requesting the records of `context` in the background.
+
+        Requests run on a worker thread, sent over the async engine if enabled. Only
+        HTTP requests and parsing happen there: records are emitted and state is
+        updated when the partition is synced on the main thread.
+        """
+        # Set up the partition state here so workers only ever read state.
+        self.get_context_state(context)
+        self._write_starting_replication_value(context)
+        future = executor.submit(lambda: list(self.request_records(context)))
+        self._prefetched_records[self._context_key(context)] = future
+
+    @cached_property
+    def reference_cache(self) -> ReferenceCache | None:
+        """Return the on-disk cache if enabled for this stream."""
+        directory = self.config.get("reference_cache_dir")
+        if not self.cache_reference_data or not directory:
+            return None
+        return ReferenceCache(directory, self.json_backend)
+
+    @cached_property
+    def entity_index(self) -> ReferenceCache | None:
+        """Return the on-disk index of parent entities, if enabled for this stream.
+
+        Only streams with children use it: their records are what child partitions
+        are built from.
+        """
+        directory = self.config.get("entity_index_dir")
+        if not directory or not self.child_streams or self.cache_reference_data:
+            return None
+        return ReferenceCache(directory, self.json_backend)
+
+    def request_indexed_records(self, context: dict | None) -> Iterable[dict]:
+        """Request records and index them, or replay a recent snapshot from the index.
+
+        Snapshots are only replayed while the stream itself is not selected, i.e. it
+        is synced only to walk down to selected child streams, such as stats.
+        """
+        max_age_seconds = self.config.get("entity_index_max_age_hours", 24) * 3600
+        if not self.selected:
+            indexed = self.entity_index.get(self.name, context)
+            if indexed is not None and indexed.is_fresh(max_age_seconds):
+                self.logger.info("Using indexed %s records for %s", self.name, context)
+                yield from indexed.records
+                return
+        records = list(super().request_records(context))
+        self.entity_index.put(self.name, context, records)
+        yield from records
+
+    @property
+    def newest_first(self) -> bool:
+        """Return True if incremental records are requested newest first."""
+        return bool(self.replication_key and self.config.get("incremental_newest_first"))
+
+    def get_bookmark(self, context: dict | None) -> datetime.datetime | None:
+        """Return the bookmark left by the previous sync, if records are filtered by it.
+
+        The `start_date` is deliberately not used: entities are synced in full on
+        the first run, whenever they were last updated.
+        """
+        if (
+            not self.filter_records_before_bookmark
+            or self.replication_method != REPLICATION_INCREMENTAL
+        ):
+            return None
+        bookmark = self.get_context_state(context).get("replication_key_value")
+        return parse_datetime(bookmark) if bookmark else None
+
+    def request_records(self, context: dict | None) -> Iterable[dict]:
+        """Request records, leaving out those unchanged since the bookmark.
+
+        Those are neither emitted nor used to sync child streams. When records are
+        requested newest first, pagination stops at the first unchanged one.
+        """
+        if self.reference_cache is not None:
+            yield from self.request_cached_records(context)
+            return
+        bookmark = self.get_bookmark(context)
+        if bookmark is None:
+            if self.entity_index is not None:
+                yield from self.request_indexed_records(context)
+            else:
+                yield from super().request_records(context)
+            return
+        for record in super().request_records(context):
+            value = record.get(self.replication_key)
+            if value and parse_datetime(value) < bookmark:
+                if self.newest_first:
+                    return
+                continue
+            yield record
+
+    def request_cached_records(self, context: dict | None) -> Iterable[dict]:
+        """Request records, or replay them from the reference cache while it is fresh.
+
+        With `reference_cache_mode` set to `skip`, cached partitions that are still
+        fresh, or that were refetched unchanged, are not emitted at all.
+        """
+        skip_unchanged = self.config.get("reference_cache_mode") == "skip"
+        ttl_seconds = self.config.get("reference_cache_ttl_hours", 24) * 3600
+        cached = self.reference_cache.get(self.name, context)
+        if cached is not None and cached.is_fresh(ttl_seconds):
+            self.logger.info("Using cached %s records for %s", self.name, context)
+            if not skip_unchanged:
+                yield from cached.records
+            return
+        records = list(super().request_records(context))
+        entry = self.reference_cache.put(self.name, context, records)
+        if skip_unchanged and cached is not None and cached.content_hash == entry.content_hash:
+            self.logger.info("Cached %s records for %s are unchanged", self.name, context)
+            return
+        yield from records
+
+    @cached_property
+    def change_detection_enabled(self) -> bool:
+        """Return True if only new or changed rows of this full-table stream are emitted.
+
+        Streams with children are excluded: their unchanged rows still drive child syncs.
+        """
+        streams = self.config.get("change_detection_streams")
+        return (
+            bool(self.config.get("change_detection_dir"))
+            and self.replication_key is None
+            and not self.child_streams
+            and (not streams or self.name in streams)
+        )
+
+    def add_tombstone_column(self) -> None:
+        """Add `_sdc_deleted_at` to the schema if this stream writes tombstones.
+
+        Called once child streams are set up, as change detection depends on them.
+        """
+        if self.change_detection_enabled and self.config.get("change_detection_tombstones"):
+            self.schema = {
+                **self.schema,
+                "properties": {
+                    **self.schema["properties"],
+                    "_sdc_deleted_at": {"type": ["string", "null"], "format": "date-time"},
+                },
+            }
+
+    def get_fingerprint_store(self, context: dict | None) -> FingerprintStore:
+        """Return the fingerprint store of a partition, loading it on first use."""
+        key = self._context_key(context)
+        if key not in self._fingerprint_stores:
+            self._fingerprint_stores[key] = FingerprintStore(
+                partition_path(
+                    Path(self.config["change_detection_dir"]), self.name, context, ""
+                ),
+                self.json_backend,
+                self.get_context_state(context).get("fingerprints"),
+            )
+        return self._fingerprint_stores[key]
+
+    def post_process(self, row: dict, context: dict | None = None) -> dict | None:
+        """Drop rows unchanged since the last sync when change detection is enabled."""
+        if not self.change_detection_enabled:
+            return row
+        key = [row.get(primary_key) for primary_key in self.primary_keys]
+        if not self.get_fingerprint_store(context).is_changed(key, row):
+            return None
+        return row
+
+    def finish_change_detection(self, context: dict | None) -> None:
+        """Write tombstones for rows that disappeared and save the row fingerprints.
+
+        The saved fingerprints only take effect once the partition state referencing
+        them is emitted, after the rows.
+        """
+        store = self.get_fingerprint_store(context)
+        del self._fingerprint_stores[self._context_key(context)]
+        if self.config.get("change_detection_tombstones"):
+            deleted_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            for key in store.get_deleted_keys():
+                self._write_record_message(
+                    {**dict(zip(self.primary_keys, key)), "_sdc_deleted_at": deleted_at}
+                )
+        self.get_context_state(context)["fingerprints"] = store.save()
+
+    def get_records(self, context: dict | None) -> Iterable[dict[str, Any]]:
+        """Return the records of a partition, prefetched ones if available."""
+        future = self._prefetched_records.pop(self._context_key(context), None)
+        if future is not None:
+            yield from future.result()
+        else:
+            yield from self.request_records(context)
+        self.sync_metrics.finish_partition(self._context_key(context))
+        # Every record yielded so far went through `post_process` by now.
+        if self.change_detection_enabled:
+            self.finish_change_detection(context)
+        self._sync_pending_children()
+
+    def _write_record_message(self, record: dict) -> None:
+        self.sync_metrics.observe_record()
+        super()._write_record_message(record)
+
+    def log_sync_costs(self) -> None:
+        """Log sync costs and throughput metrics."""
+        super().log_sync_costs()
+        if not self.sync_metrics.is_empty:
+            for point in self.sync_metrics.get_points():
+                metrics.log(self.metrics_logger, point)
+
+    def _sync_children(self, child_context: dict | None) -> None:
+        """Sync child streams, prefetching up to `max_workers` partitions ahead."""
+        if self.max_workers <= 1 or child_context is None:
+            super()._sync_children(child_context)
+            return
+        for child_stream in self.child_streams:
+            if child_stream.selected or child_stream.has_selected_descendents:
+                child_stream.prefetch(child_context, self.executor)
+        self._pending_child_contexts.append(child_context)
+        while len(self._pending_child_contexts) > self.max_workers:
+            super()._sync_children(self._pending_child_contexts.popleft())
+
+    def _sync_pending_children(self) -> None:
+        while self._pending_child_contexts:
+            super()._sync_children(self._pending_child_contexts.popleft())
+
+    def finalize_state_progress_markers(self, state: dict | None = None) -> None:
+        """Reset progress markers, also of the selected streams below deselected ones.
+
+        The SDK only finalizes the selected children of a stream, so the state of
+        e.g. stats streams would not be finalized when their entity stream is
+        deselected.
+        """
+        if not state:
+            for child_stream in self.child_streams:
+                if not child_stream.selected and child_stream.has_selected_descendents:
+                    child_stream.finalize_state_progress_markers()
+        super().finalize_state_progress_markers(state)
+
+    @cached_property
+    def json_backend(self) -> JSONBackend:
+        """Return the JSON backend used to decode responses."""
+        return get_json_backend(self.config.get("json_backend"))
+
+    @cached_property
+    def stream_responses(self) -> bool:
+        """Return True if records are parsed while responses are downloaded.
+
+        Raises:
+            ImportError: If enabled but ijson is not installed.
+        """
+        if not self.config.get("stream_responses"):
+            return False
+        require_ijson()
+        return True
+
+    def iter_response_items(self, response: requests.Response, prefix: str) -> Iterable[Any]:
+        """Yield the values at the ijson `prefix` of the body while it is downloaded.
+
+        The rest of the body is kept as the response's decoded JSON, so that the
+        paging links stay available to `get_next_page_token`.
+        """
+        response.json_envelope = envelope = ObjectBuilder()
+        unread = is_unread(response)
+        try:
+            yield from iter_items(parse_events(iter_chunks(response)), prefix, envelope)
+        finally:
+            if unread:
+                # Hands the connection back to the pool, also when the body was left unread.
+                response.close()
+        response.decoded_json = envelope.value
+
+    def get_response_json(self, response: requests.Response) -> Any:
+        """Return the decoded body of `response`, decoding it only once."""
+        try:
+            return response.decoded_json
+        except AttributeError:
+            started = time.perf_counter()
+            response.decoded_json = self.json_backend.loads(response.content)
+            self.sync_metrics.observe_parse(time.perf_counter() - started)
+            return response.decoded_json
+
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        prefix = jsonpath_to_prefix(self.records_jsonpath)
+        if self.stream_responses and prefix is not None:
+            yield from self.iter_response_items(response, prefix)
+            return
+        yield from extract_jsonpath(
+            self.records_jsonpath, input=self.get_response_json(response)
+        )
+
     def get_next_page_token(
         self, response: requests.Response, previous_token: Any | None
     ) -> Any | None:
         """Return a token for identifying next page or None if no more pages."""
         if self.next_page_token_jsonpath:
             all_matches = extract_jsonpath(
-                self.next_page_token_jsonpath, response.json()
+                self.next_page_token_jsonpath, self.get_response_json(response)
             )
             first_match = next(iter(all_matches), None)
             next_page_link_parsed = urlparse(first_match)
@@ -63,6 +506,6 @@ class SnapchatAdsStream(RESTStream):
         if next_page_token:
             params = next_page_token
         if self.replication_key:
-            params["sort"] = "asc"
+            params["sort"] = "desc" if self.newest_first else "asc"
             params["order_by"] = self.replication_key
         return params
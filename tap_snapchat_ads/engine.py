@@ -0,0 +1,109 @@
+"""Asyncio request engine for SnapchatAds streams."""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import importlib.util
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from singer_sdk.authenticators import SingletonMeta
+
+
+class AsyncRequestEngine(metaclass=SingletonMeta):
+    """Send stream requests as coroutines on a background event loop.
+
+    All streams share one pooled `httpx.AsyncClient` (keep-alive, and HTTP/2 when
+    the `h2` package is installed) and a single cap on in-flight requests.
+    Responses are handed back to the streams as `requests.Response` objects, so
+    pagination, retries and everything else `request_records` does run unchanged.
+    """
+
+    def __init__(self, max_concurrency: int, timeout: float):
+        try:
+            import httpx
+        except ImportError as ex:
+            raise ImportError(
+                "The async http engine requires httpx, install it with "
+                "`pip install 'tap-snapchat-ads[async]'`"
+            ) from ex
+        self._transport_errors = (httpx.TransportError,)
+        self._client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            timeout=timeout,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="snapchat-ads-http", daemon=True
+        )
+        self._thread.start()
+
+    @classmethod
+    def get_instance(cls) -> AsyncRequestEngine | None:
+        """Return the engine if one was started and is not closed yet."""
+        return getattr(cls, "_SingletonMeta__single_instance", None)
+
+    def send(self, prepared_request: requests.PreparedRequest) -> requests.Response:
+        """Send a prepared request on the engine loop and wait for its response.
+
+        Raises:
+            requests.exceptions.ConnectionError: On transport errors, which the
+                stream's backoff retries like those of `requests`.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._send(prepared_request), self._loop
+        )
+        try:
+            return future.result()
+        except self._transport_errors as ex:
+            raise requests.exceptions.ConnectionError(
+                ex, request=prepared_request
+            ) from ex
+
+    async def _send(
+        self, prepared_request: requests.PreparedRequest
+    ) -> requests.Response:
+        async with self._semaphore:
+            return await self._send_once(prepared_request)
+
+    async def _send_once(
+        self, prepared_request: requests.PreparedRequest
+    ) -> requests.Response:
+        started = time.perf_counter()
+        response = await self._client.request(
+            prepared_request.method or "GET",
+            prepared_request.url or "",
+            headers=dict(prepared_request.headers),
+            content=prepared_request.body,
+        )
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.reason = response.reason_phrase
+        result.headers = CaseInsensitiveDict(response.headers)
+        result.url = str(response.url)
+        result.encoding = response.encoding
+        result.elapsed = datetime.timedelta(seconds=time.perf_counter() - started)
+        result.request = prepared_request
+        result._content = response.content
+        return result
+
+    def close(self) -> None:
+        """Close the connection pool and stop the event loop.
+
+        The singleton is released, so a tap created later in the same process gets a
+        new engine.
+        """
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        setattr(type(self), "_SingletonMeta__single_instance", None)
+
@@ -0,0 +1,134 @@
+"""Pluggable JSON backends for decoding responses and writing Singer messages."""
+
+from __future__ import annotations
+
+import datetime
+import decimal
+import importlib.util
+import json
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from singer_sdk.singerlib import Message
+from singer_sdk.singerlib.encoding import GenericSingerWriter
+from singer_sdk.singerlib.json import serialize_json
+
+# Backends tried, in order, when `json_backend` is `auto`.
+PREFERRED_BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _default(obj: Any) -> Any:
+    """Encode the values the fast backends don't support like the SDK does."""
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat(sep="T")
+    return str(obj)
+
+
+def dumps_canonical(obj: Any) -> bytes:
+    """Encode `obj` the way the SDK does, whichever backend is configured.
+
+    Used for what is compared across syncs, such as cache keys and fingerprints,
+    so that changing `json_backend` doesn't invalidate them.
+    """
+    return serialize_json(obj).encode()
+
+
+@dataclass(frozen=True)
+class JSONBackend:
+    """A JSON implementation: `loads` takes bytes, `dumps` returns bytes."""
+
+    name: str
+    loads: Callable[[bytes], Any]
+    dumps: Callable[[Any], bytes]
+
+
+def _orjson_backend() -> JSONBackend:
+    import orjson
+
+    def default(obj: Any) -> Any:
+        if isinstance(obj, decimal.Decimal):
+            raise TypeError("Decimal")
+        return _default(obj)
+
+    def dumps(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, default=default)
+        except TypeError:
+            # orjson can only write decimals as floats: leave them to the SDK encoder,
+            # which writes their exact value.
+            return dumps_canonical(obj)
+
+    return JSONBackend(name="orjson", loads=orjson.loads, dumps=dumps)
+
+
+def _msgspec_backend() -> JSONBackend:
+    import msgspec
+
+    encoder = msgspec.json.Encoder(enc_hook=_default, decimal_format="number")
+    return JSONBackend(
+        name="msgspec", loads=msgspec.json.Decoder().decode, dumps=encoder.encode
+    )
+
+
+def _json_backend() -> JSONBackend:
+    return JSONBackend(
+        name="json",
+        loads=json.loads,
+        dumps=lambda obj: serialize_json(obj).encode(),
+    )
+
+
+_BACKEND_FACTORIES = {
+    "orjson": _orjson_backend,
+    "msgspec": _msgspec_backend,
+    "json": _json_backend,
+}
+
+
+def get_json_backend(name: str | None = "auto") -> JSONBackend:
+    """Return the JSON backend called `name`, or the fastest installed one for `auto`.
+
+    Raises:
+        ImportError: If a backend is requested explicitly but not installed.
+    """
+    if name in (None, "auto"):
+        name = next(
+            candidate for candidate in PREFERRED_BACKENDS
+            if candidate == "json" or importlib.util.find_spec(candidate) is not None
+        )
+    try:
+        return _BACKEND_FACTORIES[name]()
+    except ImportError as ex:
+        raise ImportError(
+            f"The `{name}` JSON backend is not installed, install it with "
+            f"`pip install 'tap-snapchat-ads[{name}]'`"
+        ) from ex
+
+
+class SingerMessageWriter(GenericSingerWriter[bytes, Message]):
+    """Write Singer messages to stdout with a configurable JSON backend."""
+
+    def __init__(self, backend: JSONBackend | None = None):
+        self.backend = backend or get_json_backend()
+
+    def serialize_message(self, message: Message) -> bytes:
+        """Serialize a message into a line of json."""
+        return self.backend.dumps(message.to_dict()) + b"\n"
+
+    def write_message(self, message: Message) -> None:
+        """Write a message to stdout.
+
+        Lines go to the binary layer of stdout when it has one, once the text
+        layer is flushed, so that they never overtake text written before them.
+        """
+        line = self.format_message(message)
+        stdout = getattr(sys.stdout, "buffer", None)
+        if stdout is None:
+            sys.stdout.write(line.decode())
+            sys.stdout.flush()
+            return
+        sys.stdout.flush()
+        stdout.write(line)
+        stdout.flush()
@@ -0,0 +1,307 @@
+"""Request and record throughput metrics of the SnapchatAds streams."""
+
+from __future__ import annotations
+
+import bisect
+import enum
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import requests
+from singer_sdk.metrics import Point, Tag
+
+from tap_snapchat_ads.streaming import is_unread
+
+# Upper bounds of the request latency buckets, in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+# Upper bounds of the pages per partition buckets.
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, math.inf)
+
+
+class Metric(str, enum.Enum):
+    """Metrics logged by the tap at the end of the sync, on top of those of the SDK.
+
+    Names differ from the SDK's per request and per partition metrics, so that
+    consumers summing those don't count the totals twice.
+    """
+
+    HTTP_REQUEST_TOTAL = "http_request_total"
+    HTTP_REQUEST_LATENCY = "http_request_latency"
+    HTTP_RESPONSE_BYTES = "http_response_bytes"
+    HTTP_RETRY_COUNT = "http_retry_count"
+    THROTTLE_COUNT = "throttle_count"
+    THROTTLE_DURATION = "throttle_duration"
+    PARSE_DURATION = "parse_duration"
+    WAIT_DURATION = "wait_duration"
+    PARTITION_PAGE_COUNT = "partition_page_count"
+    RECORD_TOTAL = "record_total"
+    RECORDS_PER_SECOND = "records_per_second"
+
+
+@dataclass
+class Histogram:
+    """Counts of observed values per bucket, with their total."""
+
+    bounds: tuple[float, ...]
+    counts: list[int] = field(init=False)
+    count: int = 0
+    total: float = 0.0
+
+    def __post_init__(self):
+        self.counts = [0] * len(self.bounds)
+
+    def observe(self, value: float) -> None:
+        """Count `value` in the first bucket whose upper bound is not lower."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def get_buckets(self) -> dict[str, int]:
+        """Return the cumulative count of every bucket, by upper bound."""
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == math.inf else f"{bound:g}"] = cumulative
+        return buckets
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "buckets": self.get_buckets(),
+            "count": self.count,
+            "sum": round(self.total, 6),
+        }
+
+
+@dataclass
+class EndpointMetrics:
+    """Requests sent to one endpoint of a stream."""
+
+    requests: int = 0
+    errors: int = 0
+    bytes: int = 0
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+
+
+class StreamMetrics:
+    """Request and record throughput of one stream over the whole sync.
+
+    Requests are observed from worker threads and the async engine, so updates are
+    made under a lock. Records are counted on the main thread, as they are written.
+    """
+
+    def __init__(self, stream_name: str):
+        self.stream_name = stream_name
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.pages = Histogram(PAGE_BUCKETS)
+        self.records = 0
+        self.retries = 0
+        self.throttled_requests = 0
+        self.throttled_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._partition_pages: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.endpoints or self.records)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Return the time from the first request to the last finished partition."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return max(self.finished_at - self.started_at, 0.0)
+
+    @property
+    def records_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.records / elapsed if elapsed else 0.0
+
+    def observe_request(
+        self, endpoint: str, context_key: tuple, response: requests.Response
+    ) -> None:
+        """Count a response, its latency and size, as a page of its partition."""
+        latency = response.elapsed.total_seconds()
+        with self._lock:
+            now = time.monotonic()
+            if self.started_at is None:
+                self.started_at = now - latency
+            metrics = self.endpoints.setdefault(endpoint, EndpointMetrics())
+            metrics.requests += 1
+            if response.status_code >= 400:
+                metrics.errors += 1
+            if is_unread(response):
+                # Reading a streamed body here would load it all, so trust its header.
+                metrics.bytes += int(response.headers.get("Content-Length") or 0)
+            else:
+                metrics.bytes += len(response.content or b"")
+            metrics.latency.observe(latency)
+            self.wait_seconds += latency
+            self._partition_pages[context_key] = self._partition_pages.get(context_key, 0) + 1
+
+    def observe_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def observe_throttle(self, seconds: float) -> None:
+        """Count the time a request waited for the rate limiter."""
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.throttled_requests += 1
+            self.throttled_seconds += seconds
+            self.wait_seconds += seconds
+
+    def observe_parse(self, seconds: float) -> None:
+        with self._lock:
+            self.parse_seconds += seconds
+
+    def observe_record(self) -> None:
+        self.records += 1
+
+    def finish_partition(self, context_key: tuple) -> None:
+        """Count the pages requested for a partition once all its records were synced."""
+        with self._lock:
+            pages = self._partition_pages.pop(context_key, 0)
+            if pages:
+                self.pages.observe(pages)
+            self.finished_at = time.monotonic()
+
+    def get_points(self) -> list[Point]:
+        """Return the metrics of the stream as Singer METRIC points."""
+        tags = {Tag.STREAM: self.stream_name}
+        points = []
+        for endpoint, metrics in self.endpoints.items():
+            endpoint_tags = {**tags, Tag.ENDPOINT: endpoint}
+            points += [
+                Point("counter", Metric.HTTP_REQUEST_TOTAL, metrics.requests, endpoint_tags),
+                Point("histogram", Metric.HTTP_REQUEST_LATENCY, metrics.latency.to_dict(),
+                      endpoint_tags),
+                Point("counter", Metric.HTTP_RESPONSE_BYTES, metrics.bytes, endpoint_tags),
+            ]
+        points += [
+            Point("counter", Metric.HTTP_RETRY_COUNT, self.retries, tags),
+            Point("counter", Metric.THROTTLE_COUNT, self.throttled_requests, tags),
+            Point("timer", Metric.THROTTLE_DURATION, round(self.throttled_seconds, 6), tags),
+            Point("timer", Metric.PARSE_DURATION, round(self.parse_seconds, 6), tags),
+            Point("timer", Metric.WAIT_DURATION, round(self.wait_seconds, 6), tags),
+            Point("histogram", Metric.PARTITION_PAGE_COUNT, self.pages.to_dict(), tags),
+            Point("counter", Metric.RECORD_TOTAL, self.records, tags),
+            Point("gauge", Metric.RECORDS_PER_SECOND, round(self.records_per_second, 3), tags),
+        ]
+        return points
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "endpoints": {
+                endpoint: {
+                    "requests": metrics.requests,
+                    "errors": metrics.errors,
+                    "bytes": metrics.bytes,
+                    "latency": metrics.latency.to_dict(),
+                }
+                for endpoint, metrics in self.endpoints.items()
+            },
+            "retries": self.retries,
+            "throttled_requests": self.throttled_requests,
+            "throttled_seconds": round(self.throttled_seconds, 6),
+            "parse_seconds": round(self.parse_seconds, 6),
+            "wait_seconds": round(self.wait_seconds, 6),
+            "partition_pages": self.pages.to_dict(),
+            "records": self.records,
+            "elapsed_seconds": round(self.elapsed_seconds, 6),
+            "records_per_second": round(self.records_per_second, 3),
+        }
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+
+
+def format_prometheus(stream_metrics: Iterable[StreamMetrics]) -> str:
+    """Return the metrics of the streams in the Prometheus text exposition format."""
+    samples: dict[str, tuple[str, list[str]]] = {}
+
+    def add(name: str, kind: str, labels: str, value: float) -> None:
+        value = value if isinstance(value, int) else repr(float(value))
+        samples.setdefault(name, (kind, []))[1].append(f"{name}{{{labels}}} {value}")
+
+    def add_histogram(name: str, labels: str, histogram: Histogram) -> None:
+        for bound, count in histogram.get_buckets().items():
+            add(f"{name}_bucket", "histogram", f'{labels},le="{bound}"', count)
+        add(f"{name}_sum", "histogram", labels, histogram.total)
+        add(f"{name}_count", "histogram", labels, histogram.count)
+
+    for metrics in stream_metrics:
+        labels = _format_labels(stream=metrics.stream_name)
+        for endpoint, endpoint_metrics in metrics.endpoints.items():
+            endpoint_labels = _format_labels(stream=metrics.stream_name, endpoint=endpoint)
+            add("tap_snapchat_ads_http_requests_total", "counter", endpoint_labels,
+                endpoint_metrics.requests)
+            add("tap_snapchat_ads_http_request_errors_total", "counter", endpoint_labels,
+                endpoint_metrics.errors)
+            add("tap_snapchat_ads_http_response_bytes_total", "counter", endpoint_labels,
+                endpoint_metrics.bytes)
+            add_histogram("tap_snapchat_ads_http_request_duration_seconds", endpoint_labels,
+                          endpoint_metrics.latency)
+        add("tap_snapchat_ads_http_retries_total", "counter", labels, metrics.retries)
+        add("tap_snapchat_ads_throttled_requests_total", "counter", labels,
+            metrics.throttled_requests)
+        add("tap_snapchat_ads_throttle_seconds_total", "counter", labels,
+            metrics.throttled_seconds)
+        add("tap_snapchat_ads_parse_seconds_total", "counter", labels, metrics.parse_seconds)
+        add("tap_snapchat_ads_wait_seconds_total", "counter", labels, metrics.wait_seconds)
+        add_histogram("tap_snapchat_ads_partition_pages", labels, metrics.pages)
+        add("tap_snapchat_ads_records_total", "counter", labels, metrics.records)
+        add("tap_snapchat_ads_records_per_second", "gauge", labels, metrics.records_per_second)
+
+    lines = []
+    for name, (kind, name_samples) in samples.items():
+        family = name.removesuffix("_bucket").removesuffix("_sum").removesuffix("_count")
+        if kind != "histogram" or name.endswith("_bucket"):
+            lines.append(f"# TYPE {family} {kind}")
+        lines += name_samples
+    return "\n".join(lines) + "\n"
+
+
+def write_summary(
+    path: str | Path, stream_metrics: Iterable[StreamMetrics], summary_format: str = "json"
+) -> None:
+    """Write the metrics of the streams to `path` as JSON or a Prometheus textfile.
+
+    The file is replaced atomically, as textfile collectors may read it at any time.
+    """
+    stream_metrics = [metrics for metrics in stream_metrics if not metrics.is_empty]
+    if summary_format == "prometheus":
+        content = format_prometheus(stream_metrics)
+    else:
+        content = json.dumps(
+            {"streams": {metrics.stream_name: metrics.to_dict() for metrics in stream_metrics}},
+            indent=2,
+        ) + "\n"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(file_descriptor, "w") as summary_file:
+            summary_file.write(content)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
@@ -0,0 +1,152 @@
+"""Process-wide adaptive rate limiting for the SnapchatAds API."""
+
+from __future__ import annotations
+
+import email.utils
+import math
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Callable
+
+import requests
+
+# Fraction of the current rate added back after every successful response.
+RATE_INCREASE = 0.02
+# How far back request timestamps are kept to measure the actual request rate.
+OBSERVATION_WINDOW_SECONDS = 10.0
+
+
+class RateLimiter:
+    """Token bucket whose refill rate adapts to what the API reports.
+
+    The rate starts at `max_rate` (unlimited when not set). Every 429 halves the
+    rate actually observed over the last few seconds and blocks all callers until
+    `Retry-After` has passed; successful responses grow the rate back slowly.
+    `X-RateLimit-Remaining`/`X-RateLimit-Reset` headers, when present, cap the rate
+    so the remaining quota is spread evenly until the reset.
+    `clock` returns the current time in seconds and defaults to `time.monotonic`.
+    """
+
+    def __init__(
+        self,
+        max_rate: float | None = None,
+        min_rate: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_rate = max_rate or math.inf
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.throttled_seconds = 0.0
+        self.throttled_requests = 0
+        self.rate_limited_responses = 0
+        self._clock = clock
+        self._tokens = self._capacity
+        self._refilled_at = clock()
+        self._blocked_until = 0.0
+        self._sent: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def _capacity(self) -> float:
+        return max(self.rate, 1.0) if math.isfinite(self.rate) else math.inf
+
+    def reserve(self) -> float:
+        """Take a token and return the number of seconds to wait before sending."""
+        with self._lock:
+            now = self._clock()
+            if math.isfinite(self.rate):
+                elapsed = now - self._refilled_at
+                self._tokens = min(self._capacity, self._tokens + elapsed * self.rate)
+                self._tokens -= 1
+                wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            else:
+                wait = 0.0
+            self._refilled_at = now
+            wait = max(wait, self._blocked_until - now)
+            if wait > 0:
+                self.throttled_seconds += wait
+                self.throttled_requests += 1
+            self._sent.append(now + wait)
+            while self._sent and self._sent[0] < now - OBSERVATION_WINDOW_SECONDS:
+                self._sent.popleft()
+            return wait
+
+    def acquire(self) -> float:
+        """Block until a request may be sent and return the number of seconds waited."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def observe(self, response: requests.Response) -> None:
+        """Adapt the rate to the status code and rate limit headers of a response."""
+        with self._lock:
+            now = self._clock()
+            if response.status_code == 429:
+                self.rate_limited_responses += 1
+                observed_rate = len(self._sent) / OBSERVATION_WINDOW_SECONDS
+                self.rate = max(self.min_rate, min(self.rate, observed_rate) / 2)
+                self._tokens = min(self._tokens, 0.0)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                self._blocked_until = max(
+                    self._blocked_until, now + (retry_after or 1 / self.rate)
+                )
+                return
+
+            remaining = _header_float(response, "X-RateLimit-Remaining")
+            reset = _header_float(response, "X-RateLimit-Reset")
+            if remaining is not None and reset:
+                if remaining <= 0:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+                self.rate = max(self.min_rate, min(self.max_rate, remaining / reset))
+            elif self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate * (1 + RATE_INCREASE))
+
+    def get_counters(self) -> dict[str, Any]:
+        """Return the throttling counters accumulated so far."""
+        return {
+            "rate": self.rate,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "throttled_requests": self.throttled_requests,
+            "rate_limited_responses": self.rate_limited_responses,
+        }
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Return the number of seconds a `Retry-After` header asks to wait."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def _header_float(response: requests.Response, name: str) -> float | None:
+    try:
+        return float(response.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+_rate_limiters: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: Any, max_rate: float | None = None) -> RateLimiter:
+    """Return the rate limiter shared by everything using the same `key`.
+
+    Streams pass their (singleton) authenticator, so every stream sending requests
+    with the same access token draws from the same bucket.
+    """
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(max_rate=max_rate)
+        return _rate_limiters[key]
@@ -0,0 +1,73 @@
+"""Roll hourly stats rows up into daily rows."""
+
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+from tap_snapchat_ads.windows import as_wall_time, parse_datetime
+
+# Metrics that can't be summed over hours: reach, frequency and ratios.
+NON_ADDITIVE_STATS_FIELDS = frozenset({
+    'uniques',
+    'frequency',
+    'attachment_uniques',
+    'attachment_frequency',
+    'swipe_up_percent',
+    'conversion_rate',
+    'avg_screen_time_millis',
+    'avg_view_time_millis',
+    'attachment_avg_view_time_millis',
+})
+# Entity fields copied from the first hourly row of a day.
+DAILY_ROW_FIELDS = (
+    'id',
+    'type',
+    'swipe_up_attribution_window',
+    'view_attribution_window',
+    'finalized_data_end_time',
+)
+
+
+class DailyRollup:
+    """Sum hourly stats rows into daily rows, per entity and ad account day.
+
+    Hourly rows are timestamped in the ad account's timezone, so they are grouped
+    by their local date, and days keep the UTC offset they start with.
+    """
+
+    def __init__(self, fields: list[str]):
+        self.fields = fields
+        self._days: dict[tuple[str, str], dict[str, Any]] = {}
+
+    def add(self, row: dict[str, Any]) -> None:
+        """Add the metrics of one hourly row to its day."""
+        key = (row['id'], row['start_time'][:10])
+        day = self._days.get(key)
+        if day is None:
+            start = parse_datetime(row['start_time']).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            day = self._days[key] = {
+                **{field: row[field] for field in DAILY_ROW_FIELDS if field in row},
+                'granularity': 'DAY',
+                'start_time': start.isoformat(timespec='milliseconds'),
+                'end_time': (start + datetime.timedelta(days=1)).isoformat(
+                    timespec='milliseconds'
+                ),
+                **{field: 0 for field in self.fields},
+            }
+        if row['end_time'][:10] != key[1]:
+            # The last hour of the day ends at the next midnight, in its own offset.
+            day['end_time'] = row['end_time']
+        for field in self.fields:
+            value = row.get(field)
+            if value:
+                day[field] += value
+
+    def get_rows(self, end_time: datetime.datetime) -> list[dict[str, Any]]:
+        """Return the daily rows of the days that end by `end_time` (wall clock)."""
+        return [
+            day for day in self._days.values()
+            if as_wall_time(parse_datetime(day['end_time'])) <= end_time
+        ]
@@ -0,0 +1,134 @@
+"""Split syncs into shards run by separate tap processes, and merge their states.
+
+A shard is selected with `shard_mode`, `shard_index` and `shard_count`:
+
+- `ad_account`: each shard syncs the ad accounts, and everything below them, whose
+  ID hashes to it. Organization level streams are synced by every shard.
+- `entity`: each shard requests the stats of the entities whose ID hashes to it;
+  ad accounts for ad account and breakdown stats. Entity streams are synced in full.
+- `date_range`: the days from `start_date` to `end_date` (or today) are split into
+  `shard_count` consecutive ranges, and each shard requests the stats of its range.
+
+Records synced by more than one shard are identical and share their primary key.
+Each shard keeps its own state. Once every shard finished, merge the states with:
+
+    python -m tap_snapchat_ads.sharding state-0.json state-1.json > state.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import hashlib
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from tap_snapchat_ads.windows import parse_datetime
+
+SHARD_MODES = ("ad_account", "entity", "date_range")
+# State keys that record how far back data may still change keep the earliest value.
+EARLIEST_STATE_KEYS = ("finalized_until",)
+
+
+@dataclass(frozen=True)
+class Shard:
+    """The part of the sync one tap process is responsible for."""
+
+    mode: str
+    index: int
+    count: int
+
+    def __post_init__(self):
+        if self.mode not in SHARD_MODES:
+            raise ValueError(f"shard_mode must be one of {', '.join(SHARD_MODES)}")
+        if not 0 <= self.index < self.count:
+            raise ValueError("shard_index must be at least 0 and less than shard_count")
+
+    @classmethod
+    def from_config(cls, config: dict) -> Shard | None:
+        """Return the shard configured, or None if the sync isn't sharded."""
+        if not config.get("shard_mode") or (config.get("shard_count") or 1) <= 1:
+            return None
+        return cls(config["shard_mode"], config.get("shard_index") or 0, config["shard_count"])
+
+    def includes(self, key: str) -> bool:
+        """Return True if `key` hashes to this shard, the same way in every process."""
+        digest = hashlib.sha256(key.encode()).digest()
+        return int.from_bytes(digest[:8], "big") % self.count == self.index
+
+    def get_date_range(
+        self, start: datetime.datetime, end: datetime.datetime
+    ) -> tuple[datetime.datetime, datetime.datetime]:
+        """Return this shard's part of the days from `start` to `end`."""
+        days = (end - start).days
+        range_start = start + datetime.timedelta(days=days * self.index // self.count)
+        if self.index == self.count - 1:
+            return range_start, end
+        return range_start, start + datetime.timedelta(days=days * (self.index + 1) // self.count)
+
+
+def _merge_values(key: str, values: list[Any]) -> Any:
+    """Merge the values shards recorded for one state key."""
+    if all(isinstance(value, dict) for value in values):
+        return _merge_dicts(values)
+    timestamps = [value for value in values if isinstance(value, str)]
+    try:
+        parsed = [parse_datetime(value) for value in timestamps]
+    except ValueError:
+        return values[0]
+    if not parsed:
+        return values[0]
+    pick = min if key in EARLIEST_STATE_KEYS else max
+    return timestamps[parsed.index(pick(parsed))]
+
+
+def _merge_dicts(states: list[dict]) -> dict:
+    merged: dict = {}
+    for key in dict.fromkeys(key for state in states for key in state):
+        values = [state[key] for state in states if state.get(key) is not None]
+        if key == "partitions":
+            merged[key] = _merge_partitions(values)
+        elif values:
+            merged[key] = _merge_values(key, values)
+        else:
+            merged[key] = None
+    return merged
+
+
+def _merge_partitions(partition_lists: list[list[dict]]) -> list[dict]:
+    """Merge the partition states of shards, matching them by context."""
+    partitions: dict[str, list[dict]] = {}
+    for partition_list in partition_lists:
+        for partition in partition_list:
+            key = json.dumps(partition.get("context"), sort_keys=True)
+            partitions.setdefault(key, []).append(partition)
+    return [_merge_dicts(states) for states in partitions.values()]
+
+
+def merge_states(states: list[dict]) -> dict:
+    """Merge the final states of shards into the state of an unsharded sync.
+
+    Partitions are matched by context. Bookmarks keep the latest value, except
+    `finalized_until` which keeps the earliest so that unfinalized data is still
+    requested again. Date range shards must all have finished: the merged bookmark
+    is the end of the last range.
+    """
+    merged = _merge_dicts(states)
+    merged.pop("currently_syncing", None)
+    return merged
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge the state files of tap shards.")
+    parser.add_argument("states", nargs="+", type=Path)
+    args = parser.parse_args()
+    states = [json.loads(path.read_text()) for path in args.states]
+    json.dump(merge_states(states), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Incremental JSON parsing of response bodies while they are downloaded.
+
+Parse events are produced by ijson, which the `streaming` extra installs.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable, Iterator
+from types import ModuleType
+from typing import Any
+
+import requests
+
+# Size of the chunks read off the socket.
+CHUNK_SIZE = 64 * 1024
+
+
+def is_unread(response: requests.Response) -> bool:
+    """Return True if the body of a streamed response has not been read yet."""
+    return response._content is False
+
+
+def iter_chunks(response: requests.Response) -> Iterable[bytes]:
+    """Return the body of `response` in chunks, read off the socket if it is unread."""
+    if is_unread(response):
+        return response.iter_content(CHUNK_SIZE)
+    return [response.content]
+
+
+class _ChunkReader:
+    """A file-like view of an iterable of byte chunks, as ijson reads it."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+
+    def read(self, size: int = -1) -> bytes:
+        # ijson probes the type of the source with read(0), which must not consume.
+        if size == 0:
+            return b""
+        # An empty read means the end of the document, so empty chunks are skipped.
+        return next((chunk for chunk in self._chunks if chunk), b"")
+
+
+def require_ijson() -> ModuleType:
+    """Return the ijson module.
+
+    Raises:
+        ImportError: If ijson is not installed.
+    """
+    try:
+        import ijson
+    except ImportError as ex:
+        raise ImportError(
+            "Streaming responses requires ijson, install it with "
+            "`pip install 'tap-snapchat-ads[streaming]'`"
+        ) from ex
+    return ijson
+
+
+def parse_events(chunks: Iterable[bytes]) -> Iterator[tuple[str, str, Any]]:
+    """Yield the `(prefix, event, value)` parse events of a JSON document.
+
+    Numbers are decoded to ints and floats, like `json.loads` does.
+    """
+    return require_ijson().parse(_ChunkReader(chunks), use_float=True)
+
+
+class ObjectBuilder:
+    """Build a Python object from parse events.
+
+    `value` is the object built so far, so it can be inspected while it is built.
+    """
+
+    def __init__(self):
+        self.value: Any = None
+        self._containers: list[dict | list] = []
+        self._keys: list[str | None] = []
+
+    def event(self, event: str, value: Any) -> None:
+        if event == "map_key":
+            self._keys[-1] = value
+            return
+        if event in ("end_map", "end_array"):
+            self._containers.pop()
+            self._keys.pop()
+            return
+        if event == "start_map":
+            value = {}
+        elif event == "start_array":
+            value = []
+        if not self._containers:
+            self.value = value
+        elif isinstance(self._containers[-1], list):
+            self._containers[-1].append(value)
+        else:
+            self._containers[-1][self._keys[-1]] = value
+        if event in ("start_map", "start_array"):
+            self._containers.append(value)
+            self._keys.append(None)
+
+
+def iter_items(
+    events: Iterable[tuple[str, str, Any]], prefix: str, envelope: ObjectBuilder
+) -> Iterator[Any]:
+    """Yield the values found at `prefix` one at a time, as soon as each is complete.
+
+    The rest of the document is built into `envelope`, with those values left out,
+    so that e.g. paging links stay available once the items are consumed.
+    """
+    builder: ObjectBuilder | None = None
+    depth = 0
+    for event_prefix, event, value in events:
+        if builder is None:
+            if event_prefix != prefix or event in ("map_key", "end_map", "end_array"):
+                envelope.event(event, value)
+                continue
+            if event not in ("start_map", "start_array"):
+                yield value
+                continue
+            builder = ObjectBuilder()
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+            if depth == 0:
+                yield builder.value
+                builder = None
+
+
+def jsonpath_to_prefix(jsonpath: str) -> str | None:
+    """Return the ijson prefix of a JSONPath like `$.ads[*].ad`, if it has one."""
+    if not re.fullmatch(r"\$(\.\w+|\[\*\])*", jsonpath):
+        return None
+    parts = re.findall(r"\.(\w+)|\[\*\]", jsonpath)
+    return ".".join(part or "item" for part in parts)
@@ -4,15 +4,28 @@ from __future__ import annotations
 
 import datetime
 from collections.abc import Iterable
+from functools import cached_property
 from typing import Any
 from urllib.parse import urlparse, parse_qs
 
-import pytz
 import requests
-from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk import typing as th  # JSON Schema typing helpers
+from singer_sdk.pagination import LegacyStreamPaginator
 
 from tap_snapchat_ads.client import SnapchatAdsStream
+from tap_snapchat_ads.rollup import NON_ADDITIVE_STATS_FIELDS, DailyRollup
+from tap_snapchat_ads.windows import (
+    StatsPageToken,
+    StatsWindow,
+    StatsWindowPlanner,
+    WindowComplete,
+    as_wall_time,
+    get_timezone,
+    merge_windows,
+    parse_datetime,
+    subtract_windows,
+    truncate,
+)
 
 
 class OrganizationsStream(SnapchatAdsStream):
@@ -95,9 +108,17 @@ class AdAccountsStream(SnapchatAdsStream):
         )),
     ).to_dict()
 
+    def post_process(self, row: dict, context: dict | None = None) -> dict | None:
+        """Leave out the ad accounts, and so their children, of other shards."""
+        if self.shard and self.shard.mode == 'ad_account' and not self.shard.includes(row['id']):
+            return None
+        return super().post_process(row, context)
+
     def get_child_context(self, record: dict, context: dict | None) -> dict:
         return {
-            'ad_account_id': record["id"]
+            'ad_account_id': record["id"],
+            # Stats request times are in the ad account's timezone.
+            'ad_account_timezone': record.get("timezone"),
         }
 
 
@@ -141,7 +162,12 @@ class AdsStream(SnapchatAdsStream):
 
     def get_child_context(self, record: dict, context: dict | None) -> dict:
         return {
-            "ad_id": record["id"]
+            "ad_id": record["id"],
+            "ad_account_id": (context or {}).get("ad_account_id"),
+            "ad_account_timezone": (context or {}).get("ad_account_timezone"),
+            "entity_created_at": record.get("created_at"),
+            "entity_updated_at": record.get("updated_at"),
+            "entity_status": record.get("status"),
         }
 
 
@@ -206,7 +232,14 @@ class AdSquadsStream(SnapchatAdsStream):
 
     def get_child_context(self, record: dict, context: dict | None) -> dict:
         return {
-            "ad_squad_id": record["id"]
+            "ad_squad_id": record["id"],
+            "ad_account_id": (context or {}).get("ad_account_id"),
+            "ad_account_timezone": (context or {}).get("ad_account_timezone"),
+            "entity_created_at": record.get("created_at"),
+            "entity_start_time": record.get("start_time"),
+            "entity_end_time": record.get("end_time"),
+            "entity_updated_at": record.get("updated_at"),
+            "entity_status": record.get("status"),
         }
 
 
@@ -287,7 +320,14 @@ class CampaignsStream(SnapchatAdsStream):
 
     def get_child_context(self, record: dict, context: dict | None) -> dict:
         return {
-            "campaign_id": record["id"]
+            "campaign_id": record["id"],
+            "ad_account_id": (context or {}).get("ad_account_id"),
+            "ad_account_timezone": (context or {}).get("ad_account_timezone"),
+            "entity_created_at": record.get("created_at"),
+            "entity_start_time": record.get("start_time"),
+            "entity_end_time": record.get("end_time"),
+            "entity_updated_at": record.get("updated_at"),
+            "entity_status": record.get("status"),
         }
 
 
@@ -557,6 +597,17 @@ class RolesStream(SnapchatAdsStream):
 ALL_STATS_FIELDS = 'android_installs,attachment_avg_view_time_millis,attachment_impressions,attachment_quartile_1,attachment_quartile_2,attachment_quartile_3,attachment_total_view_time_millis,attachment_view_completion,avg_screen_time_millis,avg_view_time_millis,impressions,ios_installs,quartile_1,quartile_2,quartile_3,screen_time_millis,spend,swipe_up_percent,swipes,total_installs,video_views,video_views_time_based,video_views_15s,view_completion,view_time_millis,conversion_purchases,conversion_purchases_value,conversion_save,conversion_start_checkout,conversion_add_cart,conversion_view_content,conversion_add_billing,conversion_sign_ups,conversion_searches,conversion_level_completes,conversion_app_opens,conversion_page_views,conversion_subscribe,conversion_ad_click,conversion_ad_view,conversion_complete_tutorial,conversion_invite,conversion_login,conversion_share,conversion_reserve,conversion_achievement_unlocked,conversion_add_to_wishlist,conversion_spend_credits,conversion_rate,conversion_start_trial,conversion_list_view,custom_event_1,custom_event_2,custom_event_3,custom_event_4,custom_event_5,attachment_frequency,attachment_uniques,frequency,uniques'
 
 
+class StatsPaginator(LegacyStreamPaginator):
+    """Walk the pages and windows of a stats partition, empty pages included.
+
+    A page whose rows were all left out by `stats_empty_rows` can still have a next
+    page, and windows after it: only `get_next_page_token` ends the partition.
+    """
+
+    def continue_if_empty(self, response: requests.Response) -> bool:
+        return True
+
+
 class StatsStream(SnapchatAdsStream):
     ignore_parent_replication_key = True
     primary_keys = ['id', 'start_time']
@@ -564,6 +615,11 @@ class StatsStream(SnapchatAdsStream):
     granularity = 'DAY'
     date_step_days = 30
     fields = ALL_STATS_FIELDS
+    breakdown: str | None = None
+    # Windows already start at the bookmark.
+    filter_records_before_bookmark = False
+    # A row with any of these metrics set means the entity delivered in that period.
+    delivery_metrics = ('spend', 'impressions', 'swipes')
     properties = [
         th.Property("id", th.StringType),
         th.Property("start_time", th.DateTimeType),
@@ -576,67 +632,588 @@ class StatsStream(SnapchatAdsStream):
     ]
     properties += [th.Property(metric, th.NumberType) for metric in fields.split(',')]
     schema = th.PropertiesList(*properties).to_dict()
-    max_timestamp = datetime.datetime.now()
 
-    def get_url_params(
-            self, context: dict | None, next_page_token: Any | None
-    ) -> dict[str, Any]:
-        if next_page_token:
-            start_time = next_page_token['start_time']
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The context key of the entity whose stats a partition holds, if any.
+        self.entity_key = self.state_partitioning_keys[0] if self.state_partitioning_keys else None
+        self.compact_state = bool(self.entity_key and self.config.get("stats_compact_state"))
+        if self.compact_state:
+            # One bookmark per ad account instead of one per entity.
+            self.state_partitioning_keys = ['ad_account_id']
+
+    @cached_property
+    def date_range(self) -> tuple[datetime.datetime | None, datetime.datetime | None]:
+        """Return the wall clock bounds of the stats to sync, or None where unbounded.
+
+        Those are `end_date`, and with date range sharding the shard's part of the
+        days from `start_date` to `end_date` or today.
+        """
+        end_date = self.config.get("end_date")
+        end = as_wall_time(truncate(parse_datetime(end_date), 'DAY')) if end_date else None
+        if not self.shard or self.shard.mode != 'date_range':
+            return None, end
+        start = as_wall_time(truncate(parse_datetime(self.config["start_date"]), 'DAY'))
+        today = truncate(datetime.datetime.now(datetime.timezone.utc), 'DAY')
+        return self.shard.get_date_range(start, end or as_wall_time(today))
+
+    @cached_property
+    def window_planner(self) -> StatsWindowPlanner:
+        """Return the window planner, created when the stream starts syncing."""
+        now = as_wall_time(datetime.datetime.now(datetime.timezone.utc))
+        return StatsWindowPlanner(
+            granularity=self.granularity,
+            max_step=datetime.timedelta(days=self.date_step_days),
+            end_time=min(self.date_range[1] or now, now),
+            target_rows=self.config.get("stats_target_rows_per_request"),
+        )
+
+    @cached_property
+    def selected_fields(self) -> list[str]:
+        """Return the metrics of `fields` that are selected in the catalog.
+
+        Falls back to the first metric when none is, as the API needs at least one.
+        """
+        fields = self.fields.split(',')
+        return [
+            field for field in fields if self.mask[('properties', field)]
+        ] or fields[:1]
+
+    @property
+    def request_fields(self) -> list[str]:
+        """Return the metrics to request from the API."""
+        return self.selected_fields
+
+    def get_end_time(self, context: dict | None) -> datetime.datetime:
+        """Return the wall clock end of the sync for the ad account of `context`.
+
+        Windows, and so bookmarks, never go past the account's current day or hour,
+        which is still in progress.
+        """
+        timezone = get_timezone((context or {}).get('ad_account_timezone'))
+        return self.window_planner.get_end_time(timezone)
+
+    def get_window(
+        self,
+        context: dict | None,
+        start_time: datetime.datetime,
+        finalized_data_end_time: datetime.datetime | None = None,
+        step: datetime.timedelta | None = None,
+    ) -> StatsWindow | None:
+        """Return the window starting at `start_time` for the entity in `context`."""
+        entity_start_time = (
+            (context or {}).get('entity_start_time') or (context or {}).get('entity_created_at')
+        )
+        entity_end_time = (context or {}).get('entity_end_time')
+        return self.window_planner.get_window(
+            start_time,
+            finalized_data_end_time,
+            step=step,
+            entity_start_time=parse_datetime(entity_start_time) if entity_start_time else None,
+            entity_end_time=parse_datetime(entity_end_time) if entity_end_time else None,
+            end_time=self.get_end_time(context),
+        )
+
+    def prefetch(self, context: dict, executor) -> None:
+        # Fix the sync window and fields on the main thread before workers use them.
+        _ = self.window_planner, self.request_fields
+        super().prefetch(context, executor)
+
+    def is_entity_inactive(self, context: dict | None, start_time: datetime.datetime) -> bool:
+        """Return True if the entity cannot have delivered since `start_time`.
+
+        That is the case for paused (or otherwise not active) entities that were last
+        updated, and last delivered, before `start_time`.
+        """
+        if not context or not self.config.get("stats_skip_inactive_entities", True):
+            return False
+        status = context.get('entity_status')
+        updated_at = context.get('entity_updated_at')
+        if status in (None, 'ACTIVE') or not updated_at:
+            return False
+        last_delivery_time = self.get_last_delivery_time(context)
+        return all(
+            parse_datetime(value) < start_time
+            for value in (updated_at, last_delivery_time) if value
+        )
+
+    def get_last_delivery_time(self, context: dict | None) -> str | None:
+        """Return the start of the last period the entity of `context` delivered in.
+
+        With compact state, it is only kept for entities that delivered after the
+        ad account's bookmark: for the others, it can't keep them from being skipped.
+        """
+        state = self.get_context_state(context)
+        if self.compact_state:
+            return state.get('last_delivery_times', {}).get(context[self.entity_key])
+        return state.get('last_delivery_time')
+
+    def set_last_delivery_time(self, context: dict | None, start_time: str) -> None:
+        """Record that the entity of `context` delivered in the period at `start_time`."""
+        last_delivery_time = self.get_last_delivery_time(context)
+        if last_delivery_time and parse_datetime(start_time) <= parse_datetime(last_delivery_time):
+            return
+        state = self.get_context_state(context)
+        if self.compact_state:
+            state.setdefault('last_delivery_times', {})[context[self.entity_key]] = start_time
+        else:
+            state['last_delivery_time'] = start_time
+
+    @property
+    def newest_first(self) -> bool:
+        """Return True if the windows of a partition are requested newest first."""
+        return self.config.get("stats_backfill_order") == "newest_first"
+
+    @property
+    def backfill_checkpoints(self) -> bool:
+        """Return True if every completed window is recorded in the state right away."""
+        return bool(self.config.get("stats_backfill_checkpoints"))
+
+    def get_synced_windows(self, context: dict | None) -> list[StatsWindow]:
+        """Return the windows of the partition an interrupted sync completed."""
+        state = self.get_context_state(context)
+        synced_windows = state.get('synced_windows')
+        if self.compact_state:
+            synced_windows = (synced_windows or {}).get(context[self.entity_key])
+        return [
+            StatsWindow(parse_datetime(start), parse_datetime(end))
+            for start, end in synced_windows or []
+        ]
+
+    def set_synced_windows(self, context: dict | None, windows: list[StatsWindow]) -> None:
+        """Record the completed windows of the partition, dropping them if there are none."""
+        synced_windows = [
+            [window.start.isoformat(), window.end.isoformat()] for window in windows
+        ]
+        state = self.get_context_state(context)
+        if self.compact_state:
+            entity_windows = state.setdefault('synced_windows', {})
+            entity_windows[context[self.entity_key]] = synced_windows
+            synced_windows = {
+                entity_id: windows for entity_id, windows in entity_windows.items() if windows
+            }
+        if synced_windows:
+            state['synced_windows'] = synced_windows
         else:
-            start_time = self.get_starting_timestamp(context)
-        end_time = min(
-            (start_time + datetime.timedelta(days=self.date_step_days)).replace(tzinfo=pytz.UTC),
-            self.max_timestamp.replace(tzinfo=pytz.UTC)
+            state.pop('synced_windows', None)
+
+    def checkpoint_window(self, context: dict | None, window: StatsWindow) -> None:
+        """Record a completed window and write the state, so a new sync resumes after it."""
+        self.set_synced_windows(
+            context, merge_windows([*self.get_synced_windows(context), window])
+        )
+        self._is_state_flushed = False
+        self._write_state_message()
+
+    def get_remaining_windows(
+        self, context: dict | None, start_time: datetime.datetime
+    ) -> list[StatsWindow]:
+        """Return the ranges from `start_time` to the end of the sync left to request.
+
+        Those are clipped to the entity's lifetime, less the windows an interrupted
+        sync completed.
+        """
+        span = self.get_window(
+            context, start_time, step=self.get_end_time(context) - as_wall_time(start_time)
         )
+        if span is None:
+            return []
+        return subtract_windows(span, self.get_synced_windows(context))
+
+    def get_first_page_token(self, context: dict | None) -> StatsPageToken | None:
+        """Return the token of the first window of `context`, or None if none is left.
+
+        With newest first order or checkpoints, the ranges left are planned up front
+        and every window is split off them.
+        """
+        start_time = self.get_starting_timestamp(context)
+        if not (self.newest_first or self.backfill_checkpoints):
+            window = self.get_window(context, start_time)
+            return StatsPageToken(window=window) if window else None
+        window, remaining = self.window_planner.take_window(
+            self.get_remaining_windows(context, start_time), newest_first=self.newest_first
+        )
+        return StatsPageToken(window=window, remaining=remaining) if window else None
+
+    def get_shard_key(self, context: dict | None) -> str:
+        """Return the ID of the entity whose stats are requested for `context`."""
+        return (context or {}).get(self.entity_key or 'ad_account_id', '')
+
+    def request_records(self, context: dict | None) -> Iterable[dict]:
+        if not self.request_fields:
+            # Every selected metric is rolled up from hourly stats.
+            return
+        if (
+            self.shard and self.shard.mode == 'entity'
+            and not self.shard.includes(self.get_shard_key(context))
+        ):
+            return
+        if self.get_first_page_token(context) is None:
+            # Already up to date: the next window cannot have data yet.
+            return
+        if self.is_entity_inactive(context, self.get_starting_timestamp(context)):
+            self.logger.debug("Skipping stats of inactive entity %s", context)
+            return
+        yield from super().request_records(context)
+
+    def get_partition_records(self, context: dict | None) -> Iterable[dict[str, Any]]:
+        """Return the stats rows of a partition."""
+        return super().get_records(context)
+
+    def get_starting_timestamp(self, context: dict | None) -> datetime.datetime | None:
+        """Return the wall clock time the next window of a partition starts at.
+
+        That is the bookmark, or the end of the last complete window if later:
+        without empty rows, the last row can be far behind the last window requested.
+        With `stats_refresh_unfinalized`, it moves back to the partition's
+        `finalized_data_end_time`, so the data that may still change is requested again.
+        Date range shards start no earlier than their range.
+        """
+        start_time = super().get_starting_timestamp(context)
+        if start_time is None:
+            return None
+        start_time = as_wall_time(start_time)
+        if self.date_range[0] is not None:
+            start_time = max(start_time, self.date_range[0])
+        state = self.get_context_state(context)
+        if state.get('synced_until'):
+            start_time = max(start_time, parse_datetime(state['synced_until']))
+        if self.config.get("stats_refresh_unfinalized") and state.get('finalized_until'):
+            start_time = min(start_time, as_wall_time(parse_datetime(state['finalized_until'])))
+        return start_time
+
+    def get_records(self, context: dict | None) -> Iterable[dict[str, Any]]:
+        state = self.get_context_state(context)
+        synced_until = None
+        finalized_until = None
+        for record in self.get_partition_records(context):
+            if isinstance(record, WindowComplete):
+                synced_until = max(synced_until or record.end, record.end)
+                if record.finalized_until is not None:
+                    # Also when the window had no rows, so it isn't requested forever.
+                    finalized_until = max(
+                        finalized_until or record.finalized_until,
+                        record.finalized_until,
+                    )
+                if self.backfill_checkpoints and record.start is not None:
+                    self.checkpoint_window(context, StatsWindow(record.start, record.end))
+                continue
+            if any(record.get(metric) for metric in self.delivery_metrics):
+                self.set_last_delivery_time(context, record['start_time'])
+            yield record
+        # Only once every row of the partition was emitted.
+        synced_windows = self.get_synced_windows(context)
+        if synced_windows:
+            # The partition is complete, including what an interrupted sync requested.
+            synced_until = max(synced_until or synced_windows[-1].end, synced_windows[-1].end)
+            self.set_synced_windows(context, [])
+        if not self.config.get("stats_refresh_unfinalized"):
+            finalized_until = None
+        if self.compact_state:
+            self.merge_progress(state, synced_until, finalized_until)
+            return
+        if synced_until is not None:
+            state['synced_until'] = synced_until.isoformat()
+        if finalized_until is not None:
+            state['finalized_until'] = finalized_until.isoformat()
+
+    def merge_progress(
+        self,
+        state: dict,
+        synced_until: datetime.datetime | None,
+        finalized_until: datetime.datetime | None,
+    ) -> None:
+        """Merge the progress of one entity into the pending progress of its ad account.
+
+        Entities of an ad account share its state, so their progress only takes effect
+        when the state is finalized, once every entity was synced. The account is synced
+        until the latest window end, as earlier ones are those of entities that ended,
+        and finalized until its earliest `finalized_data_end_time`.
+        """
+        progress = state.setdefault('stats_progress', {})
+        if synced_until is not None:
+            progress['synced_until'] = max(
+                progress.get('synced_until', ''), synced_until.isoformat()
+            )
+        if finalized_until is not None:
+            progress['finalized_until'] = min(
+                progress.get('finalized_until', finalized_until.isoformat()),
+                finalized_until.isoformat(),
+            )
+
+    @cached_property
+    def legacy_bookmark(self) -> str | None:
+        """Drop the per-entity partitions of a state that wasn't compact yet.
+
+        Returns their earliest bookmark, which ad accounts without one start from.
+        """
+        partitions = self.stream_state.get('partitions', [])
+        legacy_partitions = [
+            partition for partition in partitions
+            if 'ad_account_id' not in partition.get('context', {})
+        ]
+        partitions[:] = [
+            partition for partition in partitions if partition not in legacy_partitions
+        ]
+        bookmarks = [
+            partition['replication_key_value'] for partition in legacy_partitions
+            if partition.get('replication_key_value')
+        ]
+        return min(bookmarks, key=parse_datetime) if bookmarks else None
+
+    def _write_starting_replication_value(self, context: dict | None) -> None:
+        if self.compact_state and self.legacy_bookmark:
+            state = self.get_context_state(context)
+            if not state.get('replication_key_value'):
+                state['replication_key'] = self.replication_key
+                state['replication_key_value'] = self.legacy_bookmark
+        super()._write_starting_replication_value(context)
+
+    def _finalize_state(self, state: dict | None = None) -> None:
+        progress = state.pop('stats_progress', None) if state else None
+        if progress:
+            state.update(progress)
+            # Deliveries before the next sync's start can't keep entities from being skipped.
+            resume_time = state.get('synced_until', '')
+            if self.config.get("stats_refresh_unfinalized") and state.get('finalized_until'):
+                resume_time = min(resume_time, state['finalized_until'])
+            state['last_delivery_times'] = {
+                entity_id: start_time
+                for entity_id, start_time in state.get('last_delivery_times', {}).items()
+                if as_wall_time(parse_datetime(start_time)).isoformat() >= resume_time
+            }
+        super()._finalize_state(state)
+
+    def finalize_state_progress_markers(self, state: dict | None = None) -> None:
+        if not state and self.compact_state:
+            # Ad account partitions are not synced as a whole, so the SDK leaves them.
+            for partition_state in self.stream_state.get('partitions', []):
+                self._finalize_state(partition_state)
+        super().finalize_state_progress_markers(state)
+
+    def get_new_paginator(self) -> StatsPaginator:
+        return StatsPaginator(self)
+
+    def get_page_token(
+            self, context: dict | None, next_page_token: StatsPageToken | None
+    ) -> StatsPageToken:
+        """Return `next_page_token`, or the token of the first window of `context`."""
+        if next_page_token is not None:
+            return next_page_token
+        return self.get_first_page_token(context)
+
+    def prepare_request(
+            self, context: dict | None, next_page_token: StatsPageToken | None
+    ) -> requests.PreparedRequest:
+        page_token = self.get_page_token(context, next_page_token)
+        request = super().prepare_request(context, page_token)
+        # Keep the context and window with the request: the next window depends on them.
+        request.stats_context = context
+        request.stats_page_token = page_token
+        return request
+
+    def get_request_context(self, response: requests.Response) -> dict | None:
+        """Return the context the request of `response` was prepared for."""
+        return getattr(response.request, 'stats_context', None)
+
+    def get_url_params(
+            self, context: dict | None, next_page_token: StatsPageToken | None
+    ) -> dict[str, Any]:
+        page_token = self.get_page_token(context, next_page_token)
         params = {
-            'fields': self.fields,
+            'fields': ','.join(self.request_fields),
             'granularity': self.granularity,
-            'omit_empty': 'false',
-            "start_time": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
-            "end_time": end_time.strftime("%Y-%m-%dT%H:%M:%S"),
-            'conversion_source_types': 'web,app,total',
+            'omit_empty': 'true' if self.config.get("stats_empty_rows") == "omit" else 'false',
+            "start_time": page_token.window.start.strftime("%Y-%m-%dT%H:%M:%S"),
+            "end_time": page_token.window.end.strftime("%Y-%m-%dT%H:%M:%S"),
             'swipe_up_attribution_window': self.config['swipe_up_attribution_window'],
             'view_attribution_window': self.config['view_attribution_window'],
         }
-        if next_page_token:
-            if next_page_token.get('cursor'):
-                params['cursor'] = next_page_token['cursor']
-            if next_page_token.get('limit'):
-                params['limit'] = next_page_token['limit']
+        if any(field.startswith('conversion_') for field in self.request_fields):
+            params['conversion_source_types'] = 'web,app,total'
+        if self.breakdown:
+            params['breakdown'] = self.breakdown
+        if page_token.cursor:
+            params['cursor'] = page_token.cursor
+        if page_token.limit:
+            params['limit'] = page_token.limit
         return params
 
     def get_next_page_token(
-        self, response: requests.Response, previous_token: Any | None
-    ) -> Any | None:
-        """Return a token for identifying next page or None if no more pages."""
-        if self.next_page_token_jsonpath:
-            all_matches = extract_jsonpath(
-                self.next_page_token_jsonpath, response.json()
+        self, response: requests.Response, previous_token: StatsPageToken | None
+    ) -> StatsPageToken | None:
+        """Return the next page of the current window, or the first page of the next one."""
+        page_token: StatsPageToken = response.request.stats_page_token
+        response_json = self.get_response_json(response)
+        next_link = response_json.get('paging', {}).get('next_link')
+        if next_link:
+            next_link_params = parse_qs(urlparse(next_link).query)
+            return StatsPageToken(
+                window=page_token.window,
+                step=page_token.step,
+                cursor=next_link_params.get('cursor', [None])[0],
+                limit=next_link_params.get('limit', [None])[0],
+                remaining=page_token.remaining,
+            )
+
+        window = page_token.window
+        step = self.window_planner.get_next_step(
+            window.end - window.start, self.count_rows(response)
+        )
+        if page_token.remaining is not None:
+            next_window, remaining = self.window_planner.take_window(
+                page_token.remaining,
+                self.get_finalized_data_end_time(response),
+                step=step,
+                newest_first=self.newest_first,
+            )
+            if next_window is None:
+                return None
+            return StatsPageToken(window=next_window, step=step, remaining=remaining)
+        next_window = self.get_window(
+            self.get_request_context(response),
+            window.end,
+            self.get_finalized_data_end_time(response),
+            step,
+        )
+        if next_window is None:
+            return None
+        return StatsPageToken(window=next_window, step=step)
+
+    def parse_finalized_data_end_time(
+        self, response: requests.Response
+    ) -> datetime.datetime | None:
+        """Return the earliest `finalized_data_end_time` of the response, if any.
+
+        It is returned as the ad account's wall clock time, whatever offset the API
+        gave it.
+        """
+        finalized_data_end_times = [
+            timeseries_stat['timeseries_stat']['finalized_data_end_time']
+            for timeseries_stat in self.get_response_json(response).get('timeseries_stats', [])
+            if timeseries_stat['timeseries_stat'].get('finalized_data_end_time')
+        ]
+        if not finalized_data_end_times:
+            return None
+        context = self.get_request_context(response) or {}
+        timezone_name = context.get('ad_account_timezone')
+        timezone = get_timezone(timezone_name) if timezone_name else None
+        return min(
+            as_wall_time(parse_datetime(value), timezone)
+            for value in finalized_data_end_times
+        )
+
+    def get_finalized_data_end_time(
+        self, response: requests.Response
+    ) -> datetime.datetime | None:
+        """Return the `finalized_data_end_time` to cap windows at, if enabled."""
+        if not self.config.get("stats_end_at_finalized_data"):
+            return None
+        return self.parse_finalized_data_end_time(response)
+
+    def get_finalized_until(self, response: requests.Response) -> datetime.datetime:
+        """Return the wall clock time the stats of the response's window are final to.
+
+        That is the response's `finalized_data_end_time`, or the window end if earlier
+        or if the response has none.
+        """
+        window_end = response.request.stats_page_token.window.end
+        finalized_data_end_time = self.parse_finalized_data_end_time(response)
+        return min(finalized_data_end_time or window_end, window_end)
+
+    def count_rows(self, response: requests.Response) -> int:
+        """Return the number of data points in the response, empty ones included."""
+        rows = getattr(response, 'stats_rows', None)
+        if rows is not None:
+            # Streamed responses were counted while they were parsed.
+            return rows
+        return sum(
+            len(entity_stat['timeseries'])
+            for timeseries_stat in self.get_response_json(response)['timeseries_stats']
+            for entity_stat in self.get_entity_stats(timeseries_stat['timeseries_stat'])
+        )
+
+    def get_shared_fields(self, timeseries_stat: dict) -> dict:
+        """Return the fields of a breakdown `timeseries_stat` shared by its entity stats."""
+        return {
+            key: value for key, value in timeseries_stat.items()
+            if key not in ('id', 'type', 'start_time', 'end_time', 'breakdown_stats')
+        }
+
+    def get_entity_stats(self, timeseries_stat: dict) -> Iterable[dict]:
+        """Return the per-entity stats contained in a `timeseries_stat` object.
+
+        Breakdown responses nest the entity stats under `breakdown_stats`; those are
+        fanned back out so that every row looks like a per-entity stats row.
+        """
+        if not self.breakdown:
+            yield timeseries_stat
+            return
+        shared = self.get_shared_fields(timeseries_stat)
+        for entity_stat in timeseries_stat.get('breakdown_stats', {}).get(self.breakdown, []):
+            yield dict(shared, **entity_stat)
+
+    @property
+    def data_points_prefix(self) -> str:
+        """Return the ijson prefix of the data points in a stats response."""
+        prefix = 'timeseries_stats.item.timeseries_stat'
+        if self.breakdown:
+            prefix += f'.breakdown_stats.{self.breakdown}.item'
+        return f'{prefix}.timeseries.item'
+
+    def iter_data_points(self, response: requests.Response) -> Iterable[tuple[dict, dict]]:
+        """Yield every data point of the response with the fields of its entity."""
+        if not self.stream_responses:
+            for timeseries_stat in self.get_response_json(response)['timeseries_stats']:
+                for entity_stat in self.get_entity_stats(timeseries_stat['timeseries_stat']):
+                    entity = {
+                        key: value for key, value in entity_stat.items() if key != 'timeseries'
+                    }
+                    for data_point in entity_stat['timeseries']:
+                        yield entity, data_point
+            return
+        # Data points are parsed one at a time. Their entity fields are those read
+        # before the `timeseries` array, which the API sends last.
+        rows = 0
+        entity_stat, entity = None, None
+        for data_point in self.iter_response_items(response, self.data_points_prefix):
+            timeseries_stat = (
+                response.json_envelope.value['timeseries_stats'][-1]['timeseries_stat']
+            )
+            current = (
+                timeseries_stat['breakdown_stats'][self.breakdown][-1]
+                if self.breakdown else timeseries_stat
+            )
+            if current is not entity_stat:
+                entity_stat = current
+                entity = {key: value for key, value in current.items() if key != 'timeseries'}
+                if self.breakdown:
+                    entity = {**self.get_shared_fields(timeseries_stat), **entity}
+            rows += 1
+            yield entity, data_point
+        response.stats_rows = rows
+
+    def parse_response(self, response: requests.Response) -> Iterable[dict | WindowComplete]:
+        skip_empty_rows = self.config.get("stats_empty_rows") == "filter"
+        for entity, data_point in self.iter_data_points(response):
+            if skip_empty_rows and not any(data_point['stats'].values()):
+                continue
+            # Entity fields are shared by all data points; each row is built
+            # with a single dict display.
+            yield {
+                **entity,
+                'start_time': data_point['start_time'],
+                'end_time': data_point['end_time'],
+                **data_point['stats'],
+            }
+        page_token = getattr(response.request, 'stats_page_token', None)
+        next_link = self.get_response_json(response).get('paging', {}).get('next_link')
+        if page_token is not None and not next_link:
+            yield WindowComplete(
+                page_token.window.end,
+                page_token.window.start,
+                self.get_finalized_until(response),
             )
-            first_match = next(iter(all_matches), None)
-            next_page_link_parsed = urlparse(first_match)
-            next_page_token = parse_qs(next_page_link_parsed.query)
-        else:
-            next_page_token = response.headers.get("X-Next-Page", None)
-            first_match = None
-
-        if not first_match and not next_page_token:
-            end_time = datetime.datetime.strptime(parse_qs(urlparse(response.request.url).query)['end_time'][0], "%Y-%m-%dT%H:%M:%S")
-            if end_time < self.max_timestamp:
-                next_page_token = {"start_time": end_time}
-        return next_page_token
-
-    def parse_response(self, response: requests.Response) -> Iterable[dict]:
-        response_json = response.json()
-        for timeseries_stat in response_json['timeseries_stats']:
-            for data_point in timeseries_stat['timeseries_stat']['timeseries']:
-                new_row = timeseries_stat['timeseries_stat'].copy()
-                new_row.pop('timeseries')
-                new_row['start_time'] = data_point['start_time']
-                new_row['end_time'] = data_point['end_time']
-                new_row = dict(new_row, **data_point['stats'])
-                yield new_row
 
 
 class StatsDailyStream(StatsStream):
@@ -646,7 +1223,62 @@ class StatsDailyStream(StatsStream):
     granularity = 'DAY'
     date_step_days = 30
     fields = ALL_STATS_FIELDS
-    max_timestamp = datetime.datetime.now(tz=None).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Daily rows rolled up by the hourly sibling, by partition.
+        self.rolled_up_records: dict[tuple, list[dict]] = {}
+
+    @cached_property
+    def rollup_source(self) -> StatsHourlyStream | None:
+        """Return the hourly stream additive metrics are rolled up from, if any."""
+        hourly_stream = self._tap.streams.get(self.name.replace('_daily', '_hourly'))
+        if hourly_stream is None or hourly_stream.rollup_target is not self:
+            return None
+        return hourly_stream
+
+    @cached_property
+    def rollup_fields(self) -> list[str]:
+        """Return the selected metrics that can be summed over hours."""
+        return [
+            field for field in self.selected_fields
+            if field not in NON_ADDITIVE_STATS_FIELDS
+        ]
+
+    @property
+    def request_fields(self) -> list[str]:
+        """Return the metrics to request, less those rolled up from hourly stats."""
+        if self.rollup_source is None:
+            return self.selected_fields
+        return [
+            field for field in self.selected_fields
+            if field in NON_ADDITIVE_STATS_FIELDS
+        ]
+
+    def get_partition_records(self, context: dict | None) -> Iterable[dict[str, Any]]:
+        """Return rolled up rows, completed with non-additive metrics from the API.
+
+        Rows the API returns for days the rollup doesn't cover are passed through.
+        """
+        rolled_up = None
+        if self.rollup_source is not None:
+            rolled_up = self.rolled_up_records.pop(self._context_key(context), None)
+        if rolled_up is None:
+            yield from super().get_partition_records(context)
+            return
+        api_rows = {
+            (row['id'], row['start_time'][:10]): row
+            for row in super().get_partition_records(context)
+            if not isinstance(row, WindowComplete)
+        }
+        markers = []
+        for row in rolled_up:
+            if isinstance(row, WindowComplete):
+                markers.append(row)
+            else:
+                yield {**row, **api_rows.pop((row['id'], row['start_time'][:10]), {})}
+        yield from api_rows.values()
+        yield from markers
 
 
 class AdAccountStatsDailyStream(StatsDailyStream):
@@ -660,18 +1292,21 @@ class CampaignStatsDailyStream(StatsDailyStream):
     name = "campaign_stats_daily"
     path = "/campaigns/{campaign_id}/stats"
     parent_stream_type = CampaignsStream
+    state_partitioning_keys = ['campaign_id']
 
 
 class AdSquadStatsDailyStream(StatsDailyStream):
     name = "ad_squad_stats_daily"
     path = "/adsquads/{ad_squad_id}/stats"
     parent_stream_type = AdSquadsStream
+    state_partitioning_keys = ['ad_squad_id']
 
 
 class AdStatsDailyStream(StatsDailyStream):
     name = "ad_stats_daily"
     path = "/ads/{ad_id}/stats"
     parent_stream_type = AdsStream
+    state_partitioning_keys = ['ad_id']
 
 
 class StatsHourlyStream(StatsStream):
@@ -681,7 +1316,82 @@ class StatsHourlyStream(StatsStream):
     granularity = 'HOUR'
     date_step_days = 7
     fields = ALL_STATS_FIELDS
-    max_timestamp = datetime.datetime.now(tz=None).replace(minute=0, second=0, microsecond=0)
+
+    @cached_property
+    def rollup_target(self) -> StatsDailyStream | None:
+        """Return the daily stream rolled up from this one, if enabled and selected."""
+        daily_stream = self._tap.streams.get(self.name.replace('_hourly', '_daily'))
+        if (
+            not self.config.get("stats_daily_from_hourly")
+            or daily_stream is None
+            or not (self.selected and daily_stream.selected)
+        ):
+            return None
+        return daily_stream
+
+    @property
+    def backfill_checkpoints(self) -> bool:
+        """Return False when rolling up, as days are only complete with all their hours."""
+        return super().backfill_checkpoints and self.rollup_target is None
+
+    @property
+    def request_fields(self) -> list[str]:
+        """Return the selected metrics, and those the daily stream rolls up."""
+        if self.rollup_target is None:
+            return self.selected_fields
+        return self.selected_fields + [
+            field for field in self.rollup_target.rollup_fields
+            if field not in self.selected_fields
+        ]
+
+    def _write_starting_replication_value(self, context: dict | None) -> None:
+        super()._write_starting_replication_value(context)
+        if self.rollup_target is not None:
+            self.rollup_target._write_starting_replication_value(context)
+
+    def get_starting_timestamp(self, context: dict | None) -> datetime.datetime | None:
+        """Return the bookmark, moved back to the start of the daily bookmark's day.
+
+        When daily stats are rolled up, hours are requested from the start of every
+        day the daily stream still needs.
+        """
+        start_time = super().get_starting_timestamp(context)
+        if self.rollup_target is None or start_time is None:
+            return start_time
+        daily_start_time = self.rollup_target.get_starting_timestamp(context)
+        if daily_start_time is None:
+            return start_time
+        return min(start_time, truncate(daily_start_time, 'DAY'))
+
+    def get_partition_records(self, context: dict | None) -> Iterable[dict[str, Any]]:
+        """Return the stats rows of a partition, also rolled up for the daily stream."""
+        if self.rollup_target is None:
+            yield from super().get_partition_records(context)
+            return
+        rollup = DailyRollup(self.rollup_target.rollup_fields)
+        synced_until = None
+        finalized_until = None
+        for record in super().get_partition_records(context):
+            if isinstance(record, WindowComplete):
+                synced_until = max(synced_until or record.end, record.end)
+                if record.finalized_until is not None:
+                    finalized_until = max(
+                        finalized_until or record.finalized_until,
+                        record.finalized_until,
+                    )
+            else:
+                rollup.add(record)
+            yield record
+        daily_end_time = self.rollup_target.get_end_time(context)
+        rolled_up: list = rollup.get_rows(daily_end_time)
+        if synced_until is not None:
+            end = min(truncate(synced_until, 'DAY'), daily_end_time)
+            rolled_up.append(WindowComplete(
+                end,
+                finalized_until=min(truncate(finalized_until, 'DAY'), end)
+                if finalized_until is not None else None,
+            ))
+        self.rollup_target.rolled_up_records[self._context_key(context)] = rolled_up
 
 
 class AdAccountStatsHourlyStream(StatsHourlyStream):
@@ -695,22 +1405,68 @@ class CampaignStatsHourlyStream(StatsHourlyStream):
     name = "campaign_stats_hourly"
     path = "/campaigns/{campaign_id}/stats"
     parent_stream_type = CampaignsStream
+    state_partitioning_keys = ['campaign_id']
 
 
 class AdSquadStatsHourlyStream(StatsHourlyStream):
     name = "ad_squad_stats_hourly"
     path = "/adsquads/{ad_squad_id}/stats"
     parent_stream_type = AdSquadsStream
+    state_partitioning_keys = ['ad_squad_id']
 
 
 class AdStatsHourlyStream(StatsHourlyStream):
     name = "ad_stats_hourly"
     path = "/ads/{ad_id}/stats"
     parent_stream_type = AdsStream
+    state_partitioning_keys = ['ad_id']
+
+
+class CampaignStatsDailyBreakdownStream(CampaignStatsDailyStream):
+    path = "/adaccounts/{ad_account_id}/stats"
+    parent_stream_type = AdAccountsStream
+    state_partitioning_keys = None
+    breakdown = 'campaign'
+
+
+class AdSquadStatsDailyBreakdownStream(AdSquadStatsDailyStream):
+    path = "/adaccounts/{ad_account_id}/stats"
+    parent_stream_type = AdAccountsStream
+    state_partitioning_keys = None
+    breakdown = 'adsquad'
+
+
+class AdStatsDailyBreakdownStream(AdStatsDailyStream):
+    path = "/adaccounts/{ad_account_id}/stats"
+    parent_stream_type = AdAccountsStream
+    state_partitioning_keys = None
+    breakdown = 'ad'
+
+
+class CampaignStatsHourlyBreakdownStream(CampaignStatsHourlyStream):
+    path = "/adaccounts/{ad_account_id}/stats"
+    parent_stream_type = AdAccountsStream
+    state_partitioning_keys = None
+    breakdown = 'campaign'
+
+
+class AdSquadStatsHourlyBreakdownStream(AdSquadStatsHourlyStream):
+    path = "/adaccounts/{ad_account_id}/stats"
+    parent_stream_type = AdAccountsStream
+    state_partitioning_keys = None
+    breakdown = 'adsquad'
+
+
+class AdStatsHourlyBreakdownStream(AdStatsHourlyStream):
+    path = "/adaccounts/{ad_account_id}/stats"
+    parent_stream_type = AdAccountsStream
+    state_partitioning_keys = None
+    breakdown = 'ad'
 
 
 class TargetingStream(SnapchatAdsStream):
     ignore_parent_replication_key = True
+    cache_reference_data = True
     primary_keys = ["id"]
     replication_key = None
     schema = th.PropertiesList(
@@ -823,6 +1579,7 @@ class LocationCategoriesTargetingStream(TargetingStream):
 
 class TargetingGeoStream(SnapchatAdsStream):
     ignore_parent_replication_key = True
+    cache_reference_data = True
     replication_key = None
     schema = th.PropertiesList(
         th.Property("id", th.StringType),
@@ -870,29 +1627,34 @@ class CountriesTargetingGeoStream(TargetingGeoStream):
 
     def post_process(self, row: dict, context: dict | None = None) -> dict | None:
         row["id"] = row['country']['id']
-        return row
+        return super().post_process(row, context)
 
 
 class TargetingGeoStreamMultiCountry(TargetingGeoStream):
 
+    @property
+    def partitions(self) -> list[dict] | None:
+        """Return one partition per country in `targeting_country_codes`."""
+        return [
+            {"country_code": country_code}
+            for country_code in self.config.get("targeting_country_codes", [])
+        ]
+
     def get_records(self, context: dict | None) -> Iterable[dict[str, Any]]:
-        """Return a generator of record-type dictionary objects.
-        Each record emitted should be a dictionary of property names to their values.
-        Args:
-            context: Stream partition or context dictionary.
-        Yields:
-            One item per (possibly processed) record in the API.
+        """Return the records of a country, prefetching up to `max_workers` countries ahead.
+
+        Countries are still synced, and their records emitted, in configuration order.
         """
-        for country_code in self.config["targeting_country_codes"]:
-            if context is None:
-                context = {}
-            context["country_code"] = country_code
-            for record in self.request_records(context):
-                transformed_record = self.post_process(record, context)
-                if transformed_record is None:
-                    # Record filtered out during post_process()
-                    continue
-                yield transformed_record
+        if context is None:
+            # No country configured.
+            return
+        if self.max_workers > 1:
+            partitions = self.partitions
+            index = partitions.index(context)
+            for partition in partitions[index:index + self.max_workers]:
+                if self._context_key(partition) not in self._prefetched_records:
+                    self.prefetch(partition, self.executor)
+        yield from super().get_records(context)
 
 
 class RegionsTargetingGeoMultiCountryStream(TargetingGeoStreamMultiCountry):
@@ -904,7 +1666,7 @@ class RegionsTargetingGeoMultiCountryStream(TargetingGeoStreamMultiCountry):
     def post_process(self, row: dict, context: dict | None = None) -> dict | None:
         row["id"] = row['region']['id']
         row['country_code'] = context['country_code']
-        return row
+        return super().post_process(row, context)
 
 
 class MetrosTargetingGeoMultiCountryStream(TargetingGeoStreamMultiCountry):
@@ -916,7 +1678,7 @@ class MetrosTargetingGeoMultiCountryStream(TargetingGeoStreamMultiCountry):
     def post_process(self, row: dict, context: dict | None = None) -> dict | None:
         row["id"] = row['metro']['id']
         row['country_code'] = context['country_code']
-        return row
+        return super().post_process(row, context)
 
 
 class PostalCodesTargetingGeoMultiCountryStream(TargetingGeoStreamMultiCountry):
@@ -928,4 +1690,4 @@ class PostalCodesTargetingGeoMultiCountryStream(TargetingGeoStreamMultiCountry):
     def post_process(self, row: dict, context: dict | None = None) -> dict | None:
         row["id"] = row["postalCode"]
         row['country_code'] = context['country_code']
-        return row
+        return super().post_process(row, context)
@@ -5,6 +5,10 @@ from __future__ import annotations
 from singer_sdk import Tap, Stream
 from singer_sdk import typing as th  # JSON schema typing helpers
 
+from tap_snapchat_ads.engine import AsyncRequestEngine
+from tap_snapchat_ads.jsonlib import SingerMessageWriter, get_json_backend
+from tap_snapchat_ads.metrics import write_summary
+from tap_snapchat_ads.sharding import Shard
 from tap_snapchat_ads.streams import (
     OrganizationsStream,
     AdAccountsStream,
@@ -31,6 +35,12 @@ from tap_snapchat_ads.streams import (
     CampaignStatsHourlyStream,
     AdSquadStatsHourlyStream,
     AdStatsHourlyStream,
+    CampaignStatsDailyBreakdownStream,
+    AdSquadStatsDailyBreakdownStream,
+    AdStatsDailyBreakdownStream,
+    CampaignStatsHourlyBreakdownStream,
+    AdSquadStatsHourlyBreakdownStream,
+    AdStatsHourlyBreakdownStream,
     AgeGroupsTargetingStream,
     GendersTargetingStream,
     LanguagesTargetingStream,
@@ -99,11 +109,22 @@ STREAM_TYPES = [
     MetrosTargetingGeoMultiCountryStream,
     PostalCodesTargetingGeoMultiCountryStream,
 ]
+# Replacements used when `stats_breakdown` is enabled: one ad account level request
+# with a breakdown instead of one request per campaign, ad squad or ad.
+BREAKDOWN_STREAM_TYPES = {
+    CampaignStatsDailyStream: CampaignStatsDailyBreakdownStream,
+    AdSquadStatsDailyStream: AdSquadStatsDailyBreakdownStream,
+    AdStatsDailyStream: AdStatsDailyBreakdownStream,
+    CampaignStatsHourlyStream: CampaignStatsHourlyBreakdownStream,
+    AdSquadStatsHourlyStream: AdSquadStatsHourlyBreakdownStream,
+    AdStatsHourlyStream: AdStatsHourlyBreakdownStream,
+}
 
 
 class TapSnapchatAds(Tap):
     """SnapchatAds tap class."""
     name = "tap-snapchat-ads"
+    message_writer_class = SingerMessageWriter
 
     config_jsonschema = th.PropertiesList(
         th.Property(
@@ -147,6 +168,29 @@ class TapSnapchatAds(Tap):
             required=False,
             description="User agent"
         ),
+        th.Property(
+            "api_url",
+            th.StringType,
+            required=False,
+            default="https://adsapi.snapchat.com/v1",
+            description="Base URL of the Marketing API, e.g. of a local mock server"
+        ),
+        th.Property(
+            "auth_url",
+            th.StringType,
+            required=False,
+            default="https://accounts.snapchat.com/login/oauth2/access_token",
+            description="URL the refresh token is exchanged for access tokens at"
+        ),
+        th.Property(
+            "token_cache_path",
+            th.StringType,
+            required=False,
+            description=(
+                "File to cache the access token and its expiry in, so that consecutive "
+                "runs reuse the token instead of exchanging the refresh token again"
+            ),
+        ),
         th.Property(
             "start_date",
             th.DateTimeType,
@@ -154,6 +198,36 @@ class TapSnapchatAds(Tap):
             default="2022-01-01T00:00:00Z",
             description="Start date for stats"
         ),
+        th.Property(
+            "end_date",
+            th.DateTimeType,
+            required=False,
+            description="Date to request stats until, instead of until now"
+        ),
+        th.Property(
+            "shard_mode",
+            th.StringType,
+            required=False,
+            allowed_values=["ad_account", "entity", "date_range"],
+            description="How the sync is split across `shard_count` tap processes: by "
+                        "ad account, by the entity stats are requested for, or by "
+                        "date range from `start_date` to `end_date`. States of the "
+                        "shards are merged with `python -m tap_snapchat_ads.sharding`"
+        ),
+        th.Property(
+            "shard_index",
+            th.IntegerType,
+            required=False,
+            default=0,
+            description="Shard this process syncs, from 0 to `shard_count` - 1"
+        ),
+        th.Property(
+            "shard_count",
+            th.IntegerType,
+            required=False,
+            default=1,
+            description="Number of shards the sync is split into"
+        ),
         th.Property(
             "targeting_country_codes",
             th.ArrayType(th.StringType),
@@ -161,11 +235,285 @@ class TapSnapchatAds(Tap):
             default=[],
             description="List of lower - case 2 - letter ISO Country Codes for Ads Targeting."
         ),
+        th.Property(
+            "stats_breakdown",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Fetch campaign, ad squad and ad stats with a single ad account "
+                        "stats request per window using a breakdown, instead of one "
+                        "request per entity"
+        ),
+        th.Property(
+            "max_workers",
+            th.IntegerType,
+            required=False,
+            default=1,
+            description="Number of child stream partitions (ad accounts, campaigns, "
+                        "ads, ...) fetched in parallel. Records and state are still "
+                        "emitted in order"
+        ),
+        th.Property(
+            "http_engine",
+            th.StringType,
+            required=False,
+            default="requests",
+            allowed_values=["requests", "async"],
+            description="HTTP client requests are sent with: `requests`, or `async` "
+                        "(asyncio with a pooled HTTP/2 client shared by the "
+                        "`max_workers` worker threads, requires the `async` extra). "
+                        "With `async`, `max_workers` caps the number of requests in "
+                        "flight"
+        ),
+        th.Property(
+            "max_requests_per_second",
+            th.NumberType,
+            required=False,
+            description="Upper bound for the request rate shared by all streams. The "
+                        "rate adapts to 429 responses and rate limit headers below "
+                        "this bound; unlimited until throttled when not set"
+        ),
+        th.Property(
+            "stats_end_at_finalized_data",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Stop requesting stats windows past the "
+                        "`finalized_data_end_time` reported by the API"
+        ),
+        th.Property(
+            "stats_target_rows_per_request",
+            th.IntegerType,
+            required=False,
+            default=10000,
+            description="Target number of rows per stats response. Date windows "
+                        "shrink or grow (up to 30 days daily, 7 days hourly) to stay "
+                        "close to it"
+        ),
+        th.Property(
+            "stats_skip_inactive_entities",
+            th.BooleanType,
+            required=False,
+            default=True,
+            description="Skip stats requests for campaigns, ad squads and ads that are "
+                        "not active and were neither updated nor delivered since their "
+                        "bookmark. Set to false to request every entity"
+        ),
+        th.Property(
+            "json_backend",
+            th.StringType,
+            required=False,
+            default="auto",
+            allowed_values=["auto", "orjson", "msgspec", "json"],
+            description="JSON library used to decode responses and write Singer "
+                        "messages. `auto` uses orjson or msgspec when installed"
+        ),
+        th.Property(
+            "stream_responses",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Parse records while responses are downloaded, so that memory "
+                        "holds a single record rather than whole pages. Requires the "
+                        "`streaming` extra (ijson)"
+        ),
+        th.Property(
+            "reference_cache_dir",
+            th.StringType,
+            required=False,
+            description="Directory to cache targeting reference data in. Caching is "
+                        "disabled when not set"
+        ),
+        th.Property(
+            "reference_cache_ttl_hours",
+            th.NumberType,
+            required=False,
+            default=24,
+            description="Hours cached targeting reference data is used before it is "
+                        "fetched again"
+        ),
+        th.Property(
+            "reference_cache_mode",
+            th.StringType,
+            required=False,
+            default="replay",
+            allowed_values=["replay", "skip"],
+            description="`replay` emits cached records, `skip` emits nothing for "
+                        "cached or refetched but unchanged reference data"
+        ),
+        th.Property(
+            "change_detection_dir",
+            th.StringType,
+            required=False,
+            description="Directory to keep row fingerprints of full-table streams in. "
+                        "When set, those streams only emit new or changed rows"
+        ),
+        th.Property(
+            "change_detection_streams",
+            th.ArrayType(th.StringType),
+            required=False,
+            description="Names of the full-table streams to detect changes for. All "
+                        "of them when not set"
+        ),
+        th.Property(
+            "change_detection_tombstones",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Emit a record with `_sdc_deleted_at` set for rows that "
+                        "disappeared since the last sync"
+        ),
+        th.Property(
+            "incremental_newest_first",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Request incremental entities sorted by `updated_at` newest "
+                        "first, and stop paginating at the first one unchanged since "
+                        "the bookmark"
+        ),
+        th.Property(
+            "entity_index_dir",
+            th.StringType,
+            required=False,
+            description="Directory to index organizations, ad accounts, campaigns, "
+                        "ad squads and ads in. Stats-only syncs then reuse a recent "
+                        "index instead of listing every entity again"
+        ),
+        th.Property(
+            "entity_index_max_age_hours",
+            th.NumberType,
+            required=False,
+            default=24,
+            description="Hours an entity index is reused by syncs that don't select "
+                        "the entity stream itself"
+        ),
+        th.Property(
+            "stats_daily_from_hourly",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="When both daily and hourly stats of an entity are selected, "
+                        "roll additive daily metrics up from hourly stats instead of "
+                        "requesting them. Reach, frequency and ratio metrics are still "
+                        "requested daily"
+        ),
+        th.Property(
+            "stats_empty_rows",
+            th.StringType,
+            required=False,
+            default="keep",
+            allowed_values=["keep", "omit", "filter"],
+            description="What to do with stats rows without any metric: `keep` them, "
+                        "have the API `omit` them, or `filter` them out in the tap"
+        ),
+        th.Property(
+            "stats_refresh_unfinalized",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Request stats again from each entity's last "
+                        "`finalized_data_end_time` on every sync, to pick up late "
+                        "conversions. Finalized stats are never requested again"
+        ),
+        th.Property(
+            "stats_backfill_order",
+            th.StringType,
+            required=False,
+            default="oldest_first",
+            allowed_values=["oldest_first", "newest_first"],
+            description="Order the date windows of stats are requested in. With "
+                        "`newest_first`, recent stats land before older history"
+        ),
+        th.Property(
+            "stats_backfill_checkpoints",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Record every completed stats window in the state right away, "
+                        "so that an interrupted sync resumes at the first window it "
+                        "did not complete"
+        ),
+        th.Property(
+            "stats_compact_state",
+            th.BooleanType,
+            required=False,
+            default=False,
+            description="Keep a single bookmark per ad account for campaign, ad squad "
+                        "and ad stats, instead of one per entity, so the state stays "
+                        "small with many entities. Bookmarks only move once the whole "
+                        "sync succeeded"
+        ),
+        th.Property(
+            "metrics_summary_path",
+            th.StringType,
+            required=False,
+            description="File to write request and record throughput metrics of every "
+                        "stream to at the end of the sync, e.g. for a Prometheus "
+                        "node exporter textfile collector"
+        ),
+        th.Property(
+            "metrics_summary_format",
+            th.StringType,
+            required=False,
+            default="json",
+            allowed_values=["json", "prometheus"],
+            description="Format of the metrics summary file"
+        ),
     ).to_dict()
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if isinstance(self.message_writer, SingerMessageWriter):
+            backend = get_json_backend(self.config.get("json_backend"))
+            self.message_writer.backend = backend
+        # Fail before syncing on an invalid shard configuration.
+        Shard.from_config(self.config)
+
+    def load_streams(self) -> list[Stream]:
+        """Load streams and set them up once their child streams are known.
+
+        Tombstone columns are added where change detection is active, and hourly
+        stats are synced first when daily stats are rolled up.
+        """
+        streams = super().load_streams()
+        for stream in streams:
+            stream.add_tombstone_column()
+        if self.config.get("stats_daily_from_hourly"):
+            for stream in streams:
+                stream.child_streams.sort(
+                    key=lambda child: getattr(child, 'granularity', None) != 'HOUR'
+                )
+        return streams
+
+    def sync_all(self) -> None:
+        """Sync all streams, then write the metrics summary and close the async engine.
+
+        Both also happen when the sync fails.
+        """
+        try:
+            super().sync_all()
+        finally:
+            summary_path = self.config.get("metrics_summary_path")
+            if summary_path:
+                write_summary(
+                    summary_path,
+                    [stream.sync_metrics for stream in self.streams.values()],
+                    self.config.get("metrics_summary_format", "json"),
+                )
+            engine = AsyncRequestEngine.get_instance()
+            if engine is not None:
+                engine.close()
+
     def discover_streams(self) -> list[Stream]:
         """Return a list of discovered streams."""
-        return [stream_class(tap=self) for stream_class in STREAM_TYPES]
+        stream_types = STREAM_TYPES
+        if self.config.get("stats_breakdown"):
+            stream_types = [
+                BREAKDOWN_STREAM_TYPES.get(stream_class, stream_class)
+                for stream_class in stream_types
+            ]
+        return [stream_class(tap=self) for stream_class in stream_types]
 
 
 if __name__ == "__main__":
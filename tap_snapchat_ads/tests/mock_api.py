@@ -0,0 +1,429 @@
+"""A local stand-in for the Snapchat Marketing API, serving synthetic data.
+
+Responses use the envelopes of the real API (`organizations`/`adaccounts`
+wrappers, `paging.next_link`, `timeseries_stats` and `targeting_dimensions`), so
+the tap runs against it unchanged when `api_url` and `auth_url` point at it:
+
+    with MockSnapchatAdsAPI(MockDataset(ads=50, days=30)) as api:
+        tap = TapSnapchatAds(config=api.config)
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qsl, urlsplit
+
+import tap_snapchat_ads
+
+# Ad accounts report stats in their own timezone; all mock accounts share this one,
+# a fixed UTC-8 which the IANA database names Etc/GMT+8.
+ACCOUNT_TIMEZONE = datetime.timezone(datetime.timedelta(hours=-8))
+ACCOUNT_TIMEZONE_NAME = "Etc/GMT+8"
+GRANULARITY_STEPS = {
+    "DAY": datetime.timedelta(days=1),
+    "HOUR": datetime.timedelta(hours=1),
+}
+STATS_TYPES = {
+    "adaccounts": "AD_ACCOUNT",
+    "campaigns": "CAMPAIGN",
+    "adsquads": "AD_SQUAD",
+    "ads": "AD",
+}
+# Geo targeting dimensions nest their values one level deeper than the others.
+GEO_DIMENSIONS = ("country", "region", "metro")
+
+
+@dataclass
+class MockDataset:
+    """The scale of the synthetic data and the misbehaviour of the mock API.
+
+    Every ad account has one campaign with one ad squad holding its `ads`, all
+    active since the first of the `days` before `end_date` that stats are served for.
+    """
+
+    organizations: int = 1
+    ad_accounts: int = 1
+    ads: int = 2
+    days: int = 7
+    targeting_dimensions: int = 10
+    page_size: int = 100
+    # Seconds every API request takes.
+    latency: float = 0.0
+    # Answer every n-th API request with a 429.
+    rate_limit_every: int = 0
+    end_date: datetime.date = field(
+        default_factory=lambda: datetime.datetime.now(ACCOUNT_TIMEZONE).date()
+    )
+
+    @property
+    def end_time(self) -> datetime.datetime:
+        """Return the (wall clock) end of the served stats."""
+        return datetime.datetime.combine(self.end_date, datetime.time())
+
+    @property
+    def start_time(self) -> datetime.datetime:
+        """Return the (wall clock) start of the served stats."""
+        return self.end_time - datetime.timedelta(days=self.days)
+
+    @property
+    def start_date(self) -> str:
+        """Return the `start_date` to configure the tap with."""
+        return self.start_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _format_time(value: datetime.datetime) -> str:
+    return value.replace(tzinfo=ACCOUNT_TIMEZONE).isoformat(timespec="milliseconds")
+
+
+class MockSnapchatAdsAPI:
+    """Serve a `MockDataset` over HTTP from a background thread.
+
+    Requests are counted per route in `requests`, token exchanges included.
+    """
+
+    routes = (
+        (r"/login/oauth2/access_token", "get_token"),
+        (r"/v1/me/organizations", "get_organizations"),
+        (r"/v1/organizations/(?P<organization_id>[^/]+)/adaccounts", "get_ad_accounts"),
+        (r"/v1/adaccounts/(?P<ad_account_id>[^/]+)/(?P<kind>campaigns|adsquads|ads)",
+         "get_entities"),
+        (r"/v1/(?P<kind>adaccounts|campaigns|adsquads|ads)/(?P<entity_id>[^/]+)/stats",
+         "get_stats"),
+        (r"/v1/targeting/geo/(?P<country_code>[^/]+)/(?P<dimension>[^/]+)", "get_targeting"),
+        (r"/v1/targeting/(?:.+/)?(?P<dimension>[^/]+)", "get_targeting"),
+    )
+
+    def __init__(self, dataset: MockDataset | None = None):
+        self.dataset = dataset or MockDataset()
+        self.requests: Counter[str] = Counter()
+        self._api_requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def config(self) -> dict[str, Any]:
+        """Return a tap config pointing at the mock API."""
+        return {
+            "client_id": "mock-client-id",
+            "client_secret": "mock-client-secret",
+            "refresh_token": "mock-refresh-token",
+            "start_date": self.dataset.start_date,
+            "api_url": f"{self.url}/v1",
+            "auth_url": f"{self.url}/login/oauth2/access_token",
+        }
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def start(self) -> MockSnapchatAdsAPI:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> MockSnapchatAdsAPI:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, method: str, url: str) -> tuple[int, dict[str, str], dict]:
+        """Return the status, headers and body of the response to a request."""
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query))
+        for pattern, handler_name in self.routes:
+            match = re.fullmatch(pattern, parts.path)
+            if match:
+                break
+        else:
+            handler_name, match = None, None
+        with self._lock:
+            self.requests[handler_name or "other"] += 1
+            if handler_name != "get_token":
+                self._api_requests += 1
+                rate_limited = (
+                    self.dataset.rate_limit_every
+                    and self._api_requests % self.dataset.rate_limit_every == 0
+                )
+            else:
+                rate_limited = False
+        if handler_name != "get_token":
+            time.sleep(self.dataset.latency)
+        if rate_limited:
+            return 429, {"Retry-After": "0"}, {"request_status": "ERROR"}
+        if handler_name is None:
+            # Endpoints without synthetic data answer without records.
+            return 200, {}, {"request_status": "SUCCESS"}
+        return 200, {}, getattr(self, handler_name)(parts.path, query, **match.groupdict())
+
+    def _build_handler(self) -> type[BaseHTTPRequestHandler]:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                status, headers, body = api.handle(self.command, self.path)
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+    # Synthetic entities
+
+    def _timestamps(self) -> dict[str, str]:
+        created_at = self.dataset.start_date
+        return {"created_at": created_at, "updated_at": created_at}
+
+    def _page(self, path: str, query: dict, key: str, singular: str, records: list) -> dict:
+        """Return one page of `records` wrapped like the API does, with its next link."""
+        offset = int(query.get("cursor") or 0)
+        limit = self.dataset.page_size
+        body: dict[str, Any] = {
+            "request_status": "SUCCESS",
+            key: [
+                {"sub_request_status": "SUCCESS", singular: record}
+                for record in records[offset:offset + limit]
+            ],
+        }
+        if offset + limit < len(records):
+            body["paging"] = {
+                "next_link": f"{self.url}{path}?cursor={offset + limit}&limit={limit}"
+            }
+        return body
+
+    def get_ad_account_ids(self, organization_id: str) -> list[str]:
+        suffix = organization_id.removeprefix("org-")
+        return [f"account-{suffix}-{index}" for index in range(self.dataset.ad_accounts)]
+
+    def get_ad_ids(self, ad_account_id: str) -> list[str]:
+        suffix = ad_account_id.removeprefix("account-")
+        return [f"ad-{suffix}-{index}" for index in range(self.dataset.ads)]
+
+    def get_token(self, path: str, query: dict) -> dict:
+        return {
+            # Every exchange returns a new token, numbered after the exchange.
+            "access_token": f"mock-access-token-{self.requests['get_token']}",
+            "token_type": "Bearer",
+            "expires_in": 1800,
+            "refresh_token": "mock-refresh-token",
+            "scope": "snapchat-marketing-api",
+        }
+
+    def get_organizations(self, path: str, query: dict) -> dict:
+        organizations = [
+            {"id": f"org-{index}", "name": f"Organization {index}", "type": "ENTERPRISE",
+             "state": "ACTIVE", **self._timestamps()}
+            for index in range(self.dataset.organizations)
+        ]
+        return self._page(path, query, "organizations", "organization", organizations)
+
+    def get_ad_accounts(self, path: str, query: dict, organization_id: str) -> dict:
+        ad_accounts = [
+            {"id": ad_account_id, "name": ad_account_id, "type": "PARTNER", "status": "ACTIVE",
+             "organization_id": organization_id, "currency": "USD",
+             "timezone": ACCOUNT_TIMEZONE_NAME, **self._timestamps()}
+            for ad_account_id in self.get_ad_account_ids(organization_id)
+        ]
+        return self._page(path, query, "adaccounts", "adaccount", ad_accounts)
+
+    def get_entities(self, path: str, query: dict, ad_account_id: str, kind: str) -> dict:
+        suffix = ad_account_id.removeprefix("account-")
+        shared = {"status": "ACTIVE", **self._timestamps()}
+        if kind == "campaigns":
+            records = [{"id": f"campaign-{suffix}", "ad_account_id": ad_account_id,
+                        "start_time": self.dataset.start_date, **shared}]
+            return self._page(path, query, "campaigns", "campaign", records)
+        if kind == "adsquads":
+            records = [{"id": f"adsquad-{suffix}", "campaign_id": f"campaign-{suffix}",
+                        "start_time": self.dataset.start_date, **shared}]
+            return self._page(path, query, "adsquads", "adsquad", records)
+        records = [
+            {"id": ad_id, "ad_account_id": ad_account_id, "ad_squad_id": f"adsquad-{suffix}",
+             "type": "SNAP_AD", **shared}
+            for ad_id in self.get_ad_ids(ad_account_id)
+        ]
+        return self._page(path, query, "ads", "ad", records)
+
+    # Synthetic stats
+
+    def get_timeseries(
+        self, entity_id: str, query: dict, step: datetime.timedelta
+    ) -> list[dict[str, Any]]:
+        """Return the stats rows of an entity within the requested window."""
+        start = max(datetime.datetime.fromisoformat(query["start_time"]), self.dataset.start_time)
+        end = min(datetime.datetime.fromisoformat(query["end_time"]), self.dataset.end_time)
+        fields = query.get("fields", "impressions").split(",")
+        seed = zlib.crc32(entity_id.encode())
+        timeseries = []
+        while start < end:
+            period = int(start.timestamp() // step.total_seconds())
+            timeseries.append({
+                "start_time": _format_time(start),
+                "end_time": _format_time(start + step),
+                "stats": {
+                    field_name: (seed + period * 7 + index * 31) % 1000
+                    for index, field_name in enumerate(fields)
+                },
+            })
+            start += step
+        return timeseries
+
+    def get_stats(self, path: str, query: dict, kind: str, entity_id: str) -> dict:
+        granularity = query.get("granularity", "DAY")
+        step = GRANULARITY_STEPS[granularity]
+        timeseries_stat: dict[str, Any] = {
+            "id": entity_id,
+            "type": STATS_TYPES[kind],
+            "granularity": granularity,
+            "start_time": _format_time(datetime.datetime.fromisoformat(query["start_time"])),
+            "end_time": _format_time(datetime.datetime.fromisoformat(query["end_time"])),
+            "finalized_data_end_time": _format_time(self.dataset.end_time),
+        }
+        breakdown = query.get("breakdown")
+        if breakdown:
+            suffix = entity_id.removeprefix("account-")
+            entity_ids = {
+                "campaign": [f"campaign-{suffix}"],
+                "adsquad": [f"adsquad-{suffix}"],
+                "ad": self.get_ad_ids(entity_id),
+            }[breakdown]
+            timeseries_stat["breakdown_stats"] = {breakdown: [
+                {"id": breakdown_entity_id, "type": breakdown.upper(),
+                 "timeseries": self.get_timeseries(breakdown_entity_id, query, step)}
+                for breakdown_entity_id in entity_ids
+            ]}
+        else:
+            timeseries_stat["timeseries"] = self.get_timeseries(entity_id, query, step)
+        return {
+            "request_status": "SUCCESS",
+            "timeseries_stats": [
+                {"sub_request_status": "SUCCESS", "timeseries_stat": timeseries_stat}
+            ],
+        }
+
+    # Synthetic targeting
+
+    def get_targeting(
+        self, path: str, query: dict, dimension: str, country_code: str | None = None
+    ) -> dict:
+        values = []
+        for index in range(self.dataset.targeting_dimensions):
+            value_id = f"{country_code or 'all'}-{dimension}-{index}"
+            if dimension in GEO_DIMENSIONS:
+                values.append({dimension: {"id": value_id, "name": value_id}})
+            elif dimension == "postal_code":
+                values.append({"postalCode": f"{index:05}"})
+            else:
+                values.append({"id": value_id, "name": value_id, "path": dimension})
+        return self._page(path, query, "targeting_dimensions", dimension, values)
+
+
+@dataclass
+class TapRun:
+    """The outcome of a tap process."""
+
+    records: Counter[str]
+    wall_seconds: float
+    peak_rss_bytes: int
+    # The last state the tap emitted.
+    state: dict[str, Any] = field(default_factory=dict)
+
+
+def run_tap(
+    config: dict[str, Any],
+    stream_names: Iterable[str],
+    directory: Path,
+    state: dict[str, Any] | None = None,
+) -> TapRun:
+    """Sync the `stream_names` streams in a separate tap process, resuming `state`.
+
+    A process of its own gives every run a clean authenticator and its own peak RSS.
+
+    Raises:
+        RuntimeError: If the tap exits with an error.
+    """
+    from tap_snapchat_ads.tap import TapSnapchatAds
+
+    stream_names = set(stream_names)
+    catalog = TapSnapchatAds(config=config, parse_env_config=False).catalog_dict
+    for entry in catalog["streams"]:
+        for metadata in entry["metadata"]:
+            if not metadata["breadcrumb"]:
+                metadata["metadata"]["selected"] = entry["tap_stream_id"] in stream_names
+    directory.mkdir(parents=True, exist_ok=True)
+    config_path, catalog_path = directory / "config.json", directory / "catalog.json"
+    config_path.write_text(json.dumps(config))
+    catalog_path.write_text(json.dumps(catalog))
+    state_args = []
+    if state is not None:
+        (directory / "state.json").write_text(json.dumps(state))
+        state_args = ["--state", str(directory / "state.json")]
+    package_root = str(Path(tap_snapchat_ads.__file__).resolve().parents[1])
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(
+        filter(None, (package_root, os.environ.get("PYTHONPATH")))
+    )}
+
+    records: Counter[str] = Counter()
+    state: dict[str, Any] = {}
+    with open(directory / "stderr.log", "wb") as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "tap_snapchat_ads.tap",
+             "--config", str(config_path), "--catalog", str(catalog_path), *state_args],
+            stdout=subprocess.PIPE, stderr=stderr, env=env,
+        )
+        for line in process.stdout:
+            if line.startswith(b'{"type":"RECORD"') or b'"type": "RECORD"' in line[:20]:
+                records[json.loads(line)["stream"]] += 1
+            elif line.startswith(b'{"type":"STATE"') or b'"type": "STATE"' in line[:20]:
+                state = json.loads(line)["value"]
+        process.stdout.close()
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(
+            f"The tap exited with {process.returncode}: "
+            f"{(directory / 'stderr.log').read_text()[-2000:]}"
+        )
+    # `ru_maxrss` is in kilobytes on Linux.
+    return TapRun(records, wall_seconds, rusage.ru_maxrss * 1024, state)
@@ -0,0 +1,120 @@
+"""Tests for the renewal and caching of access tokens."""
+
+import datetime
+import json
+import threading
+import time
+
+import pytest
+import requests
+from singer_sdk.exceptions import RetriableAPIError
+
+from tap_snapchat_ads.auth import REFRESH_MARGIN_SECONDS, SnapchatAdsAuthenticator
+from tap_snapchat_ads.tests.mock_api import MockSnapchatAdsAPI
+from tap_snapchat_ads.tests.test_streams import build_response, build_tap
+
+
+@pytest.fixture
+def api():
+    with MockSnapchatAdsAPI() as api:
+        yield api
+
+
+def build_authenticator(api, **kwargs) -> SnapchatAdsAuthenticator:
+    """Return a new authenticator for the mock API, bypassing the singleton."""
+    authenticator = SnapchatAdsAuthenticator.__new__(SnapchatAdsAuthenticator)
+    authenticator.__init__(
+        client_id=api.config["client_id"],
+        client_secret=api.config["client_secret"],
+        refresh_token=api.config["refresh_token"],
+        auth_endpoint=api.config["auth_url"],
+        oauth_scopes="snapchat-marketing-api",
+        **kwargs,
+    )
+    return authenticator
+
+
+def authenticate(authenticator) -> str:
+    """Authenticate a request and return its access token."""
+    request = requests.Request("GET", "https://adsapi.snapchat.com/v1/me").prepare()
+    return authenticator(request).headers["Authorization"].removeprefix("Bearer ")
+
+
+def test_concurrent_requests_share_one_token_exchange(api):
+    """Requests waiting for a token all get the one a single exchange returned."""
+    authenticator = build_authenticator(api)
+    tokens = []
+    threads = [
+        threading.Thread(target=lambda: tokens.append(authenticate(authenticator)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tokens == ["mock-access-token-1"] * 8
+    assert api.requests["get_token"] == 1
+
+
+def test_token_is_renewed_in_the_background_before_it_expires(api):
+    """A token expiring within the margin is still used while a new one is requested."""
+    authenticator = build_authenticator(api)
+    authenticate(authenticator)
+    authenticator.access_token = "expiring-access-token"
+    authenticator.last_refreshed -= datetime.timedelta(
+        seconds=authenticator.expires_in - REFRESH_MARGIN_SECONDS + 1
+    )
+
+    assert authenticate(authenticator) == "expiring-access-token"
+    authenticator._background_refresh.join()
+    assert authenticate(authenticator) == "mock-access-token-2"
+    assert api.requests["get_token"] == 2
+
+
+def test_cached_token_is_reused_by_the_next_run(api, tmp_path):
+    """A cached token spares the next run the exchange, unless the credentials changed."""
+    cache_path = tmp_path / "token.json"
+    authenticate(build_authenticator(api, token_cache_path=str(cache_path)))
+    cached = json.loads(cache_path.read_text())
+
+    assert cached["access_token"] == "mock-access-token-1"
+    assert "mock-refresh-token" not in cache_path.read_text()
+    assert cache_path.stat().st_mode & 0o777 == 0o600
+
+    authenticate(build_authenticator(api, token_cache_path=str(cache_path)))
+    assert api.requests["get_token"] == 1
+
+    other = build_authenticator(api, token_cache_path=str(cache_path))
+    other._refresh_token = "other-refresh-token"
+    other.access_token = None
+    other.last_refreshed = None
+    other.load_cached_token()
+    assert other.access_token is None
+
+
+def test_rejected_token_is_renewed_once(api):
+    """A 401 expires the token it was sent with, but not a token renewed since."""
+    tap = build_tap(**api.config)
+    stream = tap.streams["organizations"]
+    authenticator = build_authenticator(api)
+    stream.authenticator = authenticator
+    stale_token = authenticate(authenticator)
+    response = build_response({}, f"{api.url}/v1/me/organizations")
+    response.status_code = 401
+    response.request = requests.Request(
+        "GET", response.url, headers={"Authorization": f"Bearer {stale_token}"}
+    ).prepare()
+
+    with pytest.raises(RetriableAPIError):
+        stream.validate_response(response)
+    assert not authenticator.is_token_valid()
+
+    authenticate(authenticator)
+    refreshed = authenticator.last_refreshed
+    time.sleep(0.01)
+    with pytest.raises(RetriableAPIError):
+        stream.validate_response(response)
+    authenticate(authenticator)
+    assert authenticator.last_refreshed == refreshed
+    assert api.requests["get_token"] == 2
@@ -0,0 +1,180 @@
+"""Tests for the reference data cache and change detection."""
+
+import copy
+
+import pytest
+from singer_sdk.streams import RESTStream
+
+from tap_snapchat_ads.cache import ReferenceCache
+from tap_snapchat_ads.jsonlib import get_json_backend
+from tap_snapchat_ads.tap import TapSnapchatAds
+from tap_snapchat_ads.tests.test_streams import SAMPLE_CONFIG, build_tap
+
+
+def test_cache_round_trip(tmp_path):
+    """Entries are stored per partition, with their fetch time and content hash."""
+    cache = ReferenceCache(tmp_path, get_json_backend("json"))
+    records = [{"id": "1", "name": "Amsterdam"}]
+
+    entry = cache.put("targeting_metros", {"country_code": "nl"}, records)
+
+    cached = cache.get("targeting_metros", {"country_code": "nl"})
+    assert cached == entry
+    assert cached.is_fresh(60) and not cached.is_fresh(0)
+    assert cache.get("targeting_metros", {"country_code": "be"}) is None
+    assert cache.content_hash(records) != cache.content_hash([])
+
+
+@pytest.fixture
+def api_requests(monkeypatch):
+    """Serve a fixed targeting dataset instead of the API, recording each request."""
+    sent = []
+
+    def request_records(stream, context):
+        sent.append(stream.name)
+        yield {"id": "male", "name": "Male"}
+
+    monkeypatch.setattr(RESTStream, "request_records", request_records)
+    return sent
+
+
+def sync_records(stream_name: str, **config) -> list[dict]:
+    """Sync one stream and return the records it emitted."""
+    return sync_resuming(stream_name, None, **config)[0]
+
+
+def sync_resuming(
+    stream_name: str, state: dict | None, **config
+) -> tuple[list[dict], dict]:
+    """Sync one stream from `state`, returning its records and the last state."""
+    tap = TapSnapchatAds(
+        config={**SAMPLE_CONFIG, **config}, state=state, parse_env_config=False
+    )
+    messages, states = [], []
+    tap.write_message = messages.append
+    tap.state_writer.write_state = lambda state: states.append(copy.deepcopy(state))
+    tap.streams[stream_name].sync()
+    records = [message.record for message in messages if hasattr(message, "record")]
+    return records, states[-1]
+
+
+def test_fresh_reference_data_is_replayed_from_the_cache(tmp_path, api_requests):
+    """A second run within the TTL replays the records without requesting them."""
+    first = sync_records("targeting_genders", reference_cache_dir=str(tmp_path))
+    second = sync_records("targeting_genders", reference_cache_dir=str(tmp_path))
+
+    assert first == second == [{"id": "male", "name": "Male"}]
+    assert api_requests == ["targeting_genders"]
+
+
+def test_unchanged_reference_data_is_skipped(tmp_path, api_requests):
+    """In `skip` mode, cached or refetched unchanged datasets are not emitted."""
+    config = {"reference_cache_dir": str(tmp_path), "reference_cache_mode": "skip"}
+
+    assert sync_records("targeting_genders", **config)
+    assert sync_records("targeting_genders", **config) == []
+    assert sync_records("targeting_genders", reference_cache_ttl_hours=0, **config) == []
+    assert api_requests == ["targeting_genders", "targeting_genders"]
+
+
+def test_streams_other_than_reference_data_are_not_cached(tmp_path, api_requests):
+    """Only targeting streams use the cache."""
+    sync_records("roles", reference_cache_dir=str(tmp_path))
+    assert not list(tmp_path.iterdir())
+
+
+def test_change_detection_emits_changed_rows_and_tombstones(tmp_path, monkeypatch):
+    """Only new or changed rows are emitted, and removed rows as tombstones."""
+    datasets = iter([
+        [{"id": "male", "name": "Male"}, {"id": "female", "name": "Female"}],
+        [{"id": "male", "name": "Male"}, {"id": "female", "name": "Female"}],
+        [{"id": "male", "name": "Men"}],
+    ])
+    monkeypatch.setattr(
+        RESTStream, "request_records", lambda stream, context: iter(next(datasets))
+    )
+    config = {
+        "change_detection_dir": str(tmp_path),
+        "change_detection_tombstones": True,
+    }
+
+    records, state = sync_resuming("targeting_genders", None, **config)
+    assert len(records) == 2
+    records, state = sync_resuming("targeting_genders", state, **config)
+    assert records == []
+    (changed, deleted), _ = sync_resuming("targeting_genders", state, **config)
+    assert changed == {"id": "male", "name": "Men"}
+    assert deleted["id"] == "female" and deleted["_sdc_deleted_at"]
+
+
+def test_changes_are_emitted_again_when_their_state_was_lost(tmp_path, monkeypatch):
+    """A sync resuming from an earlier state compares against that state's rows."""
+    datasets = iter([
+        [{"id": "male", "name": "Male"}],
+        [{"id": "male", "name": "Men"}],
+        [{"id": "male", "name": "Men"}],
+    ])
+    monkeypatch.setattr(
+        RESTStream, "request_records", lambda stream, context: iter(next(datasets))
+    )
+    config = {"change_detection_dir": str(tmp_path)}
+
+    _, state = sync_resuming("targeting_genders", None, **config)
+    # The target fails, so the state of this sync is never stored.
+    changed, _ = sync_resuming("targeting_genders", state, **config)
+    resent, _ = sync_resuming("targeting_genders", state, **config)
+
+    assert changed == resent == [{"id": "male", "name": "Men"}]
+    assert len(list(tmp_path.glob("targeting_genders/*.fingerprints.json.gz"))) == 2
+
+
+def test_change_detection_is_limited_to_the_configured_streams(tmp_path, api_requests):
+    """Streams not listed in `change_detection_streams` emit every row."""
+    config = {
+        "change_detection_dir": str(tmp_path),
+        "change_detection_streams": ["targeting_countries"],
+    }
+    sync_records("targeting_genders", **config)
+    assert sync_records("targeting_genders", **config)
+
+
+def test_only_change_detected_streams_get_a_tombstone_column(tmp_path):
+    """`_sdc_deleted_at` is only added where change detection is active."""
+    config = {"change_detection_tombstones": True}
+
+    def has_tombstones(tap, stream_name):
+        return "_sdc_deleted_at" in tap.streams[stream_name].schema["properties"]
+
+    assert not has_tombstones(build_tap(**config), "targeting_genders")
+    tap = build_tap(
+        change_detection_dir=str(tmp_path),
+        change_detection_streams=["targeting_genders", "organizations"],
+        **config,
+    )
+    assert has_tombstones(tap, "targeting_genders")
+    assert not has_tombstones(tap, "targeting_countries")
+    assert not has_tombstones(tap, "organizations")
+
+
+def test_stats_only_syncs_reuse_the_entity_index(tmp_path, monkeypatch):
+    """Unselected parents replay their indexed records instead of listing them."""
+    requested = []
+
+    def request_records(stream, context):
+        requested.append(stream.name)
+        if stream.name == "ads":
+            yield {"id": "ad-1", "updated_at": "2024-01-01T00:00:00.000Z"}
+
+    monkeypatch.setattr(RESTStream, "request_records", request_records)
+
+    def sync_ad_stats():
+        tap = build_tap(entity_index_dir=str(tmp_path))
+        for stream in tap.streams.values():
+            stream.selected = stream.name == "ad_stats_daily"
+        tap.write_message = lambda message: None
+        tap.streams["ads"].sync(context={"ad_account_id": "account-1"})
+
+    sync_ad_stats()
+    sync_ad_stats()
+
+    assert requested == ["ads", "ad_stats_daily", "ad_stats_daily"]
@@ -1,7 +1,14 @@
 """Tests standard tap features using the built-in SDK tests library."""
 
 import datetime
-
+from pathlib import Path
+
+import yaml
+from singer_sdk.helpers.capabilities import (
+    BATCH_CONFIG,
+    FLATTENING_CONFIG,
+    STREAM_MAPS_CONFIG,
+)
 from singer_sdk.testing import get_standard_tap_tests
 
 from tap_snapchat_ads.tap import TapSnapchatAds
@@ -23,4 +30,21 @@ def test_standard_tap_tests():
         test()
 
 
+def test_meltano_settings_match_the_config_schema():
+    """Every config setting is declared in meltano.yml."""
+    project = yaml.safe_load((Path(__file__).parents[2] / "meltano.yml").read_text())
+    (extractor,) = project["plugins"]["extractors"]
+    settings = [setting["name"] for setting in extractor["settings"]]
+    # Settings of the SDK's built-in capabilities are declared by Meltano itself.
+    builtin_settings = {
+        name
+        for config in (STREAM_MAPS_CONFIG, FLATTENING_CONFIG, BATCH_CONFIG)
+        for name in config["properties"]
+    }
+    assert settings == [
+        name for name in TapSnapchatAds.config_jsonschema["properties"]
+        if name not in builtin_settings
+    ]
+
+
 # TODO: Create additional tests as appropriate for your tap.
@@ -0,0 +1,78 @@
+"""Tests for the JSON backends."""
+
+import datetime
+import decimal
+import importlib.util
+import io
+import json
+
+import pytest
+from singer_sdk.singerlib import RecordMessage
+
+from tap_snapchat_ads import jsonlib
+from tap_snapchat_ads.cache import ReferenceCache
+from tap_snapchat_ads.jsonlib import SingerMessageWriter, get_json_backend
+
+
+@pytest.mark.parametrize("name", ["orjson", "msgspec", "json"])
+def test_backends_match_the_sdk_encoding(name):
+    """Every backend writes records that decode to what the SDK would write."""
+    if importlib.util.find_spec(name) is None:
+        pytest.skip(f"{name} is not installed")
+    backend = get_json_backend(name)
+    message = RecordMessage(
+        stream="ad_stats_hourly",
+        record={
+            "id": "ad-1",
+            "spend": decimal.Decimal("0.1000000000000000000001"),
+            "impressions": 10,
+        },
+        time_extracted=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+    )
+
+    line = SingerMessageWriter(backend).serialize_message(message)
+
+    assert line.endswith(b"\n")
+    expected = get_json_backend("json").dumps(message.to_dict())
+    assert json.loads(line, parse_float=decimal.Decimal) == json.loads(
+        expected, parse_float=decimal.Decimal
+    )
+    assert backend.loads(b'{"a": [1, 2.5]}') == {"a": [1, 2.5]}
+
+
+def test_auto_backend_falls_back_to_json(monkeypatch):
+    """Without orjson and msgspec installed, the standard library is used."""
+    monkeypatch.setattr(jsonlib.importlib.util, "find_spec", lambda name: None)
+    assert get_json_backend("auto").name == "json"
+
+
+def test_writer_writes_lines_to_stdout(monkeypatch):
+    """Messages are written as bytes lines to stdout, after text written before them."""
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    monkeypatch.setattr(jsonlib.sys, "stdout", stdout)
+
+    stdout.write("text\n")
+    message = RecordMessage(stream="roles", record={"id": "1"})
+    SingerMessageWriter().write_message(message)
+
+    text, line = stdout.buffer.getvalue().splitlines()
+    assert text == b"text"
+    assert json.loads(line)["record"] == {"id": "1"}
+
+
+@pytest.mark.parametrize("name", ["orjson", "msgspec"])
+def test_cache_keys_do_not_depend_on_the_backend(tmp_path, name):
+    """Cached partitions and fingerprints stay valid when `json_backend` changes."""
+    if importlib.util.find_spec(name) is None:
+        pytest.skip(f"{name} is not installed")
+    context = {"country_code": "nl", "name": "Zürich"}
+    records = [{"id": "1", "name": "Zürich", "ratio": 0.1}]
+    stores = [
+        ReferenceCache(tmp_path, get_json_backend(backend))
+        for backend in ("json", name)
+    ]
+
+    stores[0].put("targeting_metros", context, records)
+
+    assert stores[1].get("targeting_metros", context).records == records
+    assert stores[1].content_hash(records) == stores[0].content_hash(records)
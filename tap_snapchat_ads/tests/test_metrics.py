@@ -0,0 +1,97 @@
+"""Tests for the request and record throughput metrics."""
+
+import datetime
+import json
+
+import requests
+
+from tap_snapchat_ads.metrics import StreamMetrics, format_prometheus
+from tap_snapchat_ads.tests.test_streams import build_response, build_tap, skip_authentication
+
+
+def build_timed_response(seconds: float, content: bytes = b"{}", status_code: int = 200):
+    """Return a response that took `seconds` to arrive."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.elapsed = datetime.timedelta(seconds=seconds)
+    return response
+
+
+def test_stream_metrics_are_counted_per_endpoint_and_partition():
+    """Requests are counted per endpoint, and pages per partition once it finished."""
+    metrics = StreamMetrics("ads")
+    for context_key, seconds in (("a", 0.2), ("a", 3.0), ("b", 0.04)):
+        metrics.observe_request("/ads", (context_key,), build_timed_response(seconds, b"12345"))
+    metrics.observe_request("/ads", ("b",), build_timed_response(0.1, status_code=500))
+    metrics.observe_retry()
+    metrics.observe_throttle(0.5)
+    metrics.observe_throttle(0.0)
+    for context_key in ("a", "b"):
+        metrics.finish_partition((context_key,))
+
+    summary = metrics.to_dict()
+
+    assert summary["endpoints"]["/ads"]["requests"] == 4
+    assert summary["endpoints"]["/ads"]["errors"] == 1
+    assert summary["endpoints"]["/ads"]["bytes"] == 17
+    assert summary["endpoints"]["/ads"]["latency"]["buckets"]["0.05"] == 1
+    assert summary["endpoints"]["/ads"]["latency"]["buckets"]["2.5"] == 3
+    assert summary["endpoints"]["/ads"]["latency"]["buckets"]["+Inf"] == 4
+    assert summary["partition_pages"]["buckets"]["2"] == 2
+    assert (summary["retries"], summary["throttled_requests"]) == (1, 1)
+    assert summary["wait_seconds"] == 3.84
+
+
+def test_prometheus_summary_groups_samples_per_metric():
+    """Each metric gets one TYPE line, histograms as buckets with a sum and count."""
+    metrics = [StreamMetrics("ads"), StreamMetrics("campaigns")]
+    for stream_metrics in metrics:
+        stream_metrics.observe_request("/path", (), build_timed_response(0.3))
+
+    lines = format_prometheus(metrics).splitlines()
+
+    assert lines.count("# TYPE tap_snapchat_ads_http_request_duration_seconds histogram") == 1
+    assert (
+        'tap_snapchat_ads_http_request_duration_seconds_bucket'
+        '{stream="ads",endpoint="/path",le="0.5"} 1'
+    ) in lines
+    assert 'tap_snapchat_ads_http_requests_total{stream="campaigns",endpoint="/path"} 1' in lines
+    assert lines.index("# TYPE tap_snapchat_ads_http_requests_total counter") < lines.index(
+        'tap_snapchat_ads_http_requests_total{stream="ads",endpoint="/path"} 1'
+    )
+
+
+def test_sync_metrics_are_logged_and_written_at_the_end(tmp_path, caplog):
+    """Synced requests and records end up in METRIC logs and the summary file."""
+    summary_path = tmp_path / "metrics.json"
+    tap = build_tap(metrics_summary_path=str(summary_path))
+    stream = tap.streams["billing_centers"]
+    skip_authentication(stream)
+
+    class Session(requests.Session):
+        def send(self, prepared_request, **kwargs):
+            response = build_response({"billingcenter": [
+                {"billingcenter": {"id": "bc-1", "updated_at": "2024-01-01T00:00:00Z"}},
+                {"billingcenter": {"id": "bc-2", "updated_at": "2024-01-02T00:00:00Z"}},
+            ]}, prepared_request.url)
+            response.elapsed = datetime.timedelta(seconds=0.1)
+            return response
+
+    stream._requests_session = Session()
+    for each in tap.streams.values():
+        each.selected = each is stream
+    tap.streams["organizations"].request_records = lambda context: iter(
+        [{"id": "org-1"}]
+    )
+    tap.streams["ad_accounts"].request_records = lambda context: iter([])
+    tap.write_message = lambda message: None
+    with caplog.at_level("INFO"):
+        tap.sync_all()
+
+    summary = json.loads(summary_path.read_text())["streams"]
+    assert list(summary) == ["billing_centers"]
+    assert summary["billing_centers"]["endpoints"][stream.path]["requests"] == 1
+    assert summary["billing_centers"]["records"] == 2
+    assert summary["billing_centers"]["partition_pages"]["count"] == 1
+    assert '"metric":"record_total","value":2' in caplog.text
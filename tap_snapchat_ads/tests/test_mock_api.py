@@ -0,0 +1,64 @@
+"""End-to-end tests of the tap against the mock API."""
+
+import pytest
+
+from tap_snapchat_ads.tests.mock_api import MockDataset, MockSnapchatAdsAPI, run_tap
+
+
+def test_tap_syncs_against_the_mock_api(tmp_path):
+    """Entities are paginated, stats walk their windows and tokens come from `auth_url`."""
+    dataset = MockDataset(ad_accounts=2, ads=3, days=3, page_size=2)
+    with MockSnapchatAdsAPI(dataset) as api:
+        run = run_tap(
+            {**api.config, "targeting_country_codes": ["nl"]},
+            ["ads", "ad_stats_daily", "ad_stats_hourly", "targeting_genders", "targeting_regions"],
+            tmp_path,
+        )
+
+    assert run.records == {
+        "ads": 6,
+        "ad_stats_daily": 6 * 3,
+        "ad_stats_hourly": 6 * 3 * 24,
+        "targeting_genders": 10,
+        "targeting_regions": 10,
+    }
+    assert api.requests["get_token"] == 1
+    assert api.requests["get_entities"] == 2 * 2
+    assert run.peak_rss_bytes > 0
+
+
+@pytest.mark.parametrize("breakdown", [False, True])
+def test_breakdown_stats_match_per_entity_stats(tmp_path, breakdown):
+    """Breakdown responses yield the rows per-entity requests do, in fewer requests."""
+    with MockSnapchatAdsAPI(MockDataset(ads=4, days=2)) as api:
+        run = run_tap({**api.config, "stats_breakdown": breakdown}, ["ad_stats_daily"], tmp_path)
+
+    assert run.records == {"ad_stats_daily": 4 * 2}
+    assert api.requests["get_stats"] == (1 if breakdown else 4)
+
+
+def test_rate_limited_requests_are_retried(tmp_path):
+    """A 429 is retried, so no page is lost."""
+    with MockSnapchatAdsAPI(MockDataset(ads=3, page_size=2, rate_limit_every=4)) as api:
+        run = run_tap(api.config, ["ads"], tmp_path)
+
+    assert run.records == {"ads": 3}
+    assert api.requests["get_entities"] == 3
+
+
+def test_async_engine_resumes_incremental_syncs(tmp_path):
+    """A second async sync starts at the bookmarks, also of up-to-date stats."""
+    pytest.importorskip("httpx")
+    stream_names = ["ads", "ad_stats_daily"]
+    with MockSnapchatAdsAPI(MockDataset(ads=3, days=2)) as api:
+        config = {**api.config, "http_engine": "async", "max_workers": 2}
+        first = run_tap(config, stream_names, tmp_path / "first")
+        stats_requests = api.requests["get_stats"]
+        second = run_tap(config, stream_names, tmp_path / "second", first.state)
+
+    assert first.records == {"ads": 3, "ad_stats_daily": 3 * 2}
+    assert second.records["ad_stats_daily"] == 0
+    assert api.requests["get_stats"] == stats_requests
+    assert second.state["bookmarks"]["ad_stats_daily"] == (
+        first.state["bookmarks"]["ad_stats_daily"]
+    )
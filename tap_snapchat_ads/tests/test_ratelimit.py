@@ -0,0 +1,96 @@
+"""Tests for the adaptive rate limiter."""
+
+import pytest
+import requests
+
+from tap_snapchat_ads.ratelimit import RateLimiter, get_rate_limiter, parse_retry_after
+
+
+def build_response(status_code: int, headers: dict | None = None):
+    """Return an empty `requests.Response` with the given status and headers."""
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeClock:
+    """Clock that only moves when the test advances it."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_paces_requests():
+    """Requests beyond the bucket capacity wait for tokens to refill."""
+    limiter = RateLimiter(max_rate=10, clock=FakeClock())
+    waits = [limiter.reserve() for _ in range(15)]
+    assert waits[:10] == [0.0] * 10
+    assert waits[10:] == pytest.approx([0.1, 0.2, 0.3, 0.4, 0.5])
+    assert limiter.get_counters()["throttled_requests"] == 5
+
+
+def test_tokens_refill_as_time_passes():
+    """Tokens come back at `rate` per second up to the bucket capacity."""
+    clock = FakeClock()
+    limiter = RateLimiter(max_rate=10, clock=clock)
+    for _ in range(10):
+        limiter.reserve()
+
+    clock.now += 0.5
+    assert [limiter.reserve() for _ in range(6)] == pytest.approx(
+        [0.0] * 5 + [0.1]
+    )
+    clock.now += 60
+    assert [limiter.reserve() for _ in range(10)] == [0.0] * 10
+
+
+def test_429_blocks_for_retry_after_and_lowers_the_rate():
+    """A 429 halves the observed rate and blocks callers for `Retry-After`."""
+    limiter = RateLimiter(clock=FakeClock())
+    for _ in range(100):
+        limiter.reserve()
+
+    limiter.observe(build_response(429, {"Retry-After": "2"}))
+
+    assert limiter.rate == 5.0
+    assert limiter.reserve() == pytest.approx(2.0)
+    assert limiter.get_counters()["rate_limited_responses"] == 1
+
+
+def test_rate_recovers_after_successful_responses():
+    """Successful responses grow the rate back towards `max_rate`."""
+    limiter = RateLimiter(max_rate=10)
+    limiter.rate = 5.0
+    for _ in range(100):
+        limiter.observe(build_response(200))
+    assert limiter.rate == 10
+
+
+def test_rate_limit_headers_spread_the_remaining_quota():
+    """`X-RateLimit-*` headers cap the rate to what is left until the reset."""
+    limiter = RateLimiter(max_rate=100)
+    limiter.observe(
+        build_response(200, {"X-RateLimit-Remaining": "30", "X-RateLimit-Reset": "10"})
+    )
+    assert limiter.rate == 3.0
+
+
+def test_parse_retry_after():
+    """`Retry-After` accepts both seconds and HTTP dates."""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after(None) is None
+
+
+def test_limiters_are_shared_per_key():
+    """Streams using the same authenticator share one limiter."""
+    class Key:
+        pass
+
+    key = Key()
+    assert get_rate_limiter(key) is get_rate_limiter(key, max_rate=5)
+    assert get_rate_limiter(key) is not get_rate_limiter(Key())
@@ -0,0 +1,46 @@
+"""Tests for rolling hourly stats up into daily stats."""
+
+import datetime
+
+from tap_snapchat_ads.rollup import DailyRollup
+
+
+def hourly_rows(day: str, offset: str, hours: int = 24, spend: int = 1):
+    """Return the hourly rows of one day in the ad account's timezone."""
+    start = datetime.datetime.fromisoformat(f"{day}T00:00:00{offset}")
+    return [
+        {
+            "id": "ad-1",
+            "type": "AD",
+            "granularity": "HOUR",
+            "start_time": (start + datetime.timedelta(hours=hour)).isoformat(
+                timespec="milliseconds"
+            ),
+            "end_time": (start + datetime.timedelta(hours=hour + 1)).isoformat(
+                timespec="milliseconds"
+            ),
+            "spend": spend,
+            "impressions": None,
+        }
+        for hour in range(hours)
+    ]
+
+
+def test_hours_are_summed_per_local_day():
+    """Days follow the account timezone and only complete days are returned."""
+    rollup = DailyRollup(["spend", "impressions"])
+    for day, hours in (("2024-01-01", 24), ("2024-01-02", 5)):
+        for row in hourly_rows(day, "-08:00", hours=hours):
+            rollup.add(row)
+
+    rows = rollup.get_rows(datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc))
+
+    assert rows == [{
+        "id": "ad-1",
+        "type": "AD",
+        "granularity": "DAY",
+        "start_time": "2024-01-01T00:00:00.000-08:00",
+        "end_time": "2024-01-02T00:00:00.000-08:00",
+        "spend": 24,
+        "impressions": 0,
+    }]
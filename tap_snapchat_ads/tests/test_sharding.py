@@ -0,0 +1,92 @@
+"""Tests for splitting syncs into shards and merging their states."""
+
+import datetime
+
+import pytest
+
+from tap_snapchat_ads.sharding import Shard, merge_states
+from tap_snapchat_ads.tests.mock_api import MockDataset, MockSnapchatAdsAPI, run_tap
+
+
+def test_keys_and_days_are_split_over_shards():
+    """Every key and day belongs to exactly one shard."""
+    shards = [Shard("entity", index, 3) for index in range(3)]
+    for key in (f"ad-{index}" for index in range(50)):
+        assert sum(shard.includes(key) for shard in shards) == 1
+    assert Shard("entity", 1, 3).includes("ad-7") == Shard("entity", 1, 3).includes("ad-7")
+
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2024, 1, 11, 5, tzinfo=datetime.timezone.utc)
+    ranges = [shard.get_date_range(start, end) for shard in shards]
+    assert ranges[0][0] == start
+    assert ranges[-1][1] == end
+    assert all(ranges[index][1] == ranges[index + 1][0] for index in range(2))
+    assert [(range_end - range_start).days for range_start, range_end in ranges] == [3, 3, 4]
+
+    with pytest.raises(ValueError):
+        Shard("entity", 3, 3)
+    assert Shard.from_config({"shard_mode": "entity", "shard_count": 1}) is None
+
+
+def test_merged_state_keeps_latest_bookmarks():
+    """Partitions are matched by context; finalized times keep the earliest value."""
+    states = [
+        {"currently_syncing": "ad_stats_daily", "bookmarks": {"ad_stats_daily": {"partitions": [
+            {"context": {"ad_id": "ad-1"}, "replication_key": "start_time",
+             "replication_key_value": "2024-01-05T00:00:00.000-08:00",
+             "finalized_until": "2024-01-04T00:00:00.000-08:00",
+             "last_delivery_times": {"ad-1": "2024-01-04T00:00:00.000-08:00"}},
+        ]}}},
+        {"bookmarks": {"ad_stats_daily": {"partitions": [
+            {"context": {"ad_id": "ad-1"}, "replication_key": "start_time",
+             "replication_key_value": "2024-01-09T00:00:00.000-08:00",
+             "finalized_until": "2024-01-08T00:00:00.000-08:00",
+             "last_delivery_times": {"ad-2": "2024-01-08T00:00:00.000-08:00"}},
+            {"context": {"ad_id": "ad-2"}, "replication_key": "start_time",
+             "replication_key_value": "2024-01-09T00:00:00.000-08:00"},
+        ]}}},
+    ]
+
+    merged = merge_states(states)
+
+    assert "currently_syncing" not in merged
+    assert merged["bookmarks"]["ad_stats_daily"]["partitions"] == [
+        {"context": {"ad_id": "ad-1"}, "replication_key": "start_time",
+         "replication_key_value": "2024-01-09T00:00:00.000-08:00",
+         "finalized_until": "2024-01-04T00:00:00.000-08:00",
+         "last_delivery_times": {"ad-1": "2024-01-04T00:00:00.000-08:00",
+                                 "ad-2": "2024-01-08T00:00:00.000-08:00"}},
+        {"context": {"ad_id": "ad-2"}, "replication_key": "start_time",
+         "replication_key_value": "2024-01-09T00:00:00.000-08:00"},
+    ]
+
+
+def bookmarks(state: dict, stream_name: str) -> dict:
+    return {
+        str(partition["context"]): partition.get("replication_key_value")
+        for partition in state["bookmarks"][stream_name]["partitions"]
+        if partition.get("replication_key_value")
+    }
+
+
+@pytest.mark.parametrize("shard_mode", ["ad_account", "entity", "date_range"])
+def test_shards_sync_what_one_process_does(tmp_path, shard_mode):
+    """Shards sync each stats row once, and their merged state matches an unsharded sync."""
+    stream_names = ["ads", "ad_stats_daily"]
+    with MockSnapchatAdsAPI(MockDataset(ad_accounts=4, ads=2, days=4)) as api:
+        full = run_tap(api.config, stream_names, tmp_path / "full")
+        shards = [
+            run_tap(
+                {**api.config, "shard_mode": shard_mode, "shard_index": index, "shard_count": 2},
+                stream_names,
+                tmp_path / str(index),
+            )
+            for index in range(2)
+        ]
+
+    assert sum(shard.records["ad_stats_daily"] for shard in shards) == 4 * 2 * 4
+    assert all(shard.records["ad_stats_daily"] for shard in shards)
+    if shard_mode == "ad_account":
+        assert sum(shard.records["ads"] for shard in shards) == full.records["ads"]
+    merged = merge_states([shard.state for shard in shards])
+    assert bookmarks(merged, "ad_stats_daily") == bookmarks(full.state, "ad_stats_daily")
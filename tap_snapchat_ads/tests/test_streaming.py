@@ -0,0 +1,132 @@
+"""Tests for parsing responses while they are downloaded."""
+
+import importlib.util
+import json
+import sys
+
+import pytest
+
+from tap_snapchat_ads.streaming import (
+    ObjectBuilder,
+    iter_items,
+    jsonpath_to_prefix,
+    parse_events,
+)
+from tap_snapchat_ads.tests.mock_api import MockDataset, MockSnapchatAdsAPI, run_tap
+from tap_snapchat_ads.tests.test_streams import build_response, build_tap
+
+DOCUMENT = {
+    "request_status": "SUCCESS",
+    "values": [0, -12, 2.5, -1.5e-3, "", "ünï\"cødé\\", True, False, None, [], {}, [[1]]],
+    "paging": {"next_link": "https://adsapi.snapchat.com/v1/ads?cursor=abc&limit=2"},
+}
+
+requires_ijson = pytest.mark.skipif(
+    importlib.util.find_spec("ijson") is None, reason="ijson is not installed",
+)
+
+
+def split(body: bytes, size: int) -> list[bytes]:
+    return [body[index:index + size] for index in range(0, len(body), size)]
+
+
+@requires_ijson
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 1024])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_events_build_the_document_across_chunk_boundaries(chunk_size, indent):
+    """Tokens split over chunks, multi-byte characters included, decode like json.loads."""
+    body = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False).encode()
+    builder = ObjectBuilder()
+    for _, event, value in parse_events(split(body, chunk_size)):
+        builder.event(event, value)
+
+    assert builder.value == json.loads(body)
+    assert [type(value) for value in builder.value["values"][:4]] == [int, int, float, float]
+
+
+def test_streaming_requires_ijson(monkeypatch):
+    """Enabling `stream_responses` without ijson fails with how to install it."""
+    monkeypatch.setitem(sys.modules, "ijson", None)
+    stream = build_tap(stream_responses=True).streams["ads"]
+    with pytest.raises(ImportError, match=r"tap-snapchat-ads\[streaming\]"):
+        stream.stream_responses
+
+
+@requires_ijson
+def test_items_are_yielded_and_the_rest_kept_as_envelope():
+    """Items at the prefix come out one by one; paging links stay in the envelope."""
+    body = json.dumps(DOCUMENT).encode()
+    envelope = ObjectBuilder()
+
+    items = list(iter_items(parse_events(split(body, 5)), "values.item", envelope))
+
+    assert items == DOCUMENT["values"]
+    assert envelope.value == {**DOCUMENT, "values": []}
+    assert jsonpath_to_prefix("$.targeting_dimensions[*].postal_code") == (
+        "targeting_dimensions.item.postal_code"
+    )
+    assert jsonpath_to_prefix("$..ads") is None
+
+
+@requires_ijson
+@pytest.mark.parametrize("stats_breakdown", [False, True])
+def test_streamed_stats_rows_match_decoded_ones(stats_breakdown):
+    """Streaming stats yields the rows, row count and finalized time decoding does."""
+    data_points = [
+        {"start_time": f"2024-01-0{day}T00:00:00.000-08:00",
+         "end_time": f"2024-01-0{day + 1}T00:00:00.000-08:00",
+         "stats": {"spend": day, "impressions": 0}}
+        for day in (1, 2)
+    ]
+    entity_stats = [
+        {"id": f"ad-{index}", "type": "AD", "granularity": "DAY", "timeseries": data_points}
+        for index in (1, 2)
+    ]
+    timeseries_stat = {
+        "id": "account-1" if stats_breakdown else "ad-1",
+        "type": "AD_ACCOUNT" if stats_breakdown else "AD",
+        "granularity": "DAY",
+        "finalized_data_end_time": "2024-01-02T00:00:00.000-08:00",
+    }
+    if stats_breakdown:
+        timeseries_stat["breakdown_stats"] = {"ad": entity_stats}
+    else:
+        timeseries_stat["timeseries"] = data_points
+    payload = {"request_status": "SUCCESS", "timeseries_stats": [
+        {"sub_request_status": "SUCCESS", "timeseries_stat": timeseries_stat},
+    ]}
+
+    results = []
+    for stream_responses in (False, True):
+        stream = build_tap(
+            stats_breakdown=stats_breakdown,
+            stream_responses=stream_responses,
+            stats_end_at_finalized_data=True,
+        ).streams["ad_stats_daily"]
+        response = build_response(payload)
+        results.append((
+            list(stream.parse_response(response)),
+            stream.count_rows(response),
+            stream.get_finalized_data_end_time(response),
+        ))
+
+    assert results[1] == results[0]
+    assert results[1][1] == (4 if stats_breakdown else 2)
+
+
+@requires_ijson
+def test_tap_streams_responses_from_the_mock_api(tmp_path):
+    """Entities, stats and targeting pages are parsed off the socket."""
+    dataset = MockDataset(ads=3, days=2, page_size=2, targeting_dimensions=5)
+    with MockSnapchatAdsAPI(dataset) as api:
+        run = run_tap(
+            {**api.config, "stream_responses": True, "targeting_country_codes": ["nl"]},
+            ["ads", "ad_stats_hourly", "targeting_postal_codes"],
+            tmp_path,
+        )
+
+    assert run.records == {
+        "ads": 3,
+        "ad_stats_hourly": 3 * 2 * 24,
+        "targeting_postal_codes": 5,
+    }
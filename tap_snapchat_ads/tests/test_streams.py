@@ -0,0 +1,775 @@
+"""Tests for stream behaviour that does not need API access."""
+
+import copy
+import datetime
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+import requests
+from singer_sdk.streams import RESTStream
+
+from tap_snapchat_ads.tap import TapSnapchatAds
+from tap_snapchat_ads.windows import WindowComplete, as_wall_time, parse_datetime
+
+SAMPLE_CONFIG = {
+    "client_id": "client-id",
+    "client_secret": "client-secret",
+    "refresh_token": "refresh-token",
+    "start_date": "2024-01-01T00:00:00Z",
+}
+
+
+def build_tap(**config) -> TapSnapchatAds:
+    """Return a tap instance that never touches the network."""
+    return TapSnapchatAds(config={**SAMPLE_CONFIG, **config}, parse_env_config=False)
+
+
+def build_response(payload: dict, url: str = "https://adsapi.snapchat.com/v1/stats"):
+    """Return a `requests.Response` carrying `payload` as its JSON body."""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(payload).encode()
+    response.request = requests.Request("GET", url).prepare()
+    response.url = url
+    return response
+
+
+def skip_authentication(stream) -> None:
+    """Give the stream's authenticator a valid token so it never refreshes it."""
+    stream.authenticator.access_token = "token"
+    stream.authenticator.expires_in = None
+    stream.authenticator.last_refreshed = time.time()
+
+
+def test_breakdown_streams_replace_entity_stats_streams():
+    """Breakdown mode syncs entity stats as children of the ad accounts stream."""
+    streams = build_tap(stats_breakdown=True).streams
+    assert streams["ad_stats_daily"].path == "/adaccounts/{ad_account_id}/stats"
+    assert streams["ad_stats_daily"].breakdown == "ad"
+    assert streams["ad_squad_stats_hourly"].breakdown == "adsquad"
+    assert streams["campaign_stats_daily"].parent_stream_type.__name__ == (
+        "AdAccountsStream"
+    )
+    assert streams["ad_account_stats_daily"].breakdown is None
+    assert streams["ad_stats_daily"].schema == build_tap().streams["ad_stats_daily"].schema
+
+
+def test_breakdown_response_is_fanned_out_per_entity():
+    """Nested `breakdown_stats` produce the same rows as per-entity requests."""
+    stream = build_tap(stats_breakdown=True).streams["ad_stats_daily"]
+    data_point = {
+        "start_time": "2024-01-01T00:00:00.000-08:00",
+        "end_time": "2024-01-02T00:00:00.000-08:00",
+        "stats": {"spend": 10, "impressions": 100},
+    }
+    response = build_response({
+        "timeseries_stats": [{
+            "timeseries_stat": {
+                "id": "account-1",
+                "type": "AD_ACCOUNT",
+                "granularity": "DAY",
+                "finalized_data_end_time": "2024-01-02T00:00:00.000-08:00",
+                "swipe_up_attribution_window": "28_DAY",
+                "breakdown_stats": {
+                    "ad": [
+                        {"id": "ad-1", "type": "AD", "granularity": "DAY",
+                         "timeseries": [data_point]},
+                        {"id": "ad-2", "type": "AD", "granularity": "DAY",
+                         "timeseries": [data_point]},
+                    ],
+                },
+            },
+        }],
+    })
+
+    rows = list(stream.parse_response(response))
+
+    assert [row["id"] for row in rows] == ["ad-1", "ad-2"]
+    assert rows[0] == {
+        "id": "ad-1",
+        "type": "AD",
+        "granularity": "DAY",
+        "finalized_data_end_time": "2024-01-02T00:00:00.000-08:00",
+        "swipe_up_attribution_window": "28_DAY",
+        "start_time": "2024-01-01T00:00:00.000-08:00",
+        "end_time": "2024-01-02T00:00:00.000-08:00",
+        "spend": 10,
+        "impressions": 100,
+    }
+
+
+def test_child_partitions_are_fetched_in_parallel_and_emitted_in_order():
+    """With `max_workers`, child partitions overlap but output stays ordered."""
+    tap = build_tap(max_workers=4)
+    for stream in tap.streams.values():
+        stream.selected = stream.name in ("ads", "ad_stats_daily")
+    ads = tap.streams["ads"]
+    ad_stats = tap.streams["ad_stats_daily"]
+    ad_ids = [f"ad-{index}" for index in range(8)]
+    ads.request_records = lambda context: (
+        {"id": ad_id, "updated_at": "2024-01-01T00:00:00Z"} for ad_id in ad_ids
+    )
+    # Only passed once `max_workers` partitions are requested at the same time.
+    in_flight = threading.Barrier(4, timeout=10)
+
+    def request_stats(context):
+        in_flight.wait()
+        yield {"id": context["ad_id"], "start_time": "2024-01-01T00:00:00Z"}
+
+    ad_stats.request_records = request_stats
+    messages = []
+    tap.write_message = messages.append
+
+    ads.sync(context={"ad_account_id": "account-1"})
+
+    stats_ids = [
+        message.record["id"] for message in messages
+        if getattr(message, "stream", None) == "ad_stats_daily"
+        and hasattr(message, "record")
+    ]
+    assert stats_ids == ad_ids
+
+
+def test_prefetched_stats_partition_starts_at_its_bookmark():
+    """Workers read the starting bookmark, which prefetch writes on the main thread."""
+    stream = build_tap(max_workers=2).streams["ad_stats_daily"]
+    stream.window_planner.end_time = stream.window_planner.end_time.replace(
+        year=2024, month=1, day=4
+    )
+    context = {"ad_id": "ad-1"}
+    requested_windows = []
+    serve_daily_stats(stream, requested_windows)
+
+    stream.prefetch(context, stream.executor)
+    records = list(stream.get_records(context))
+
+    assert requested_windows == [(1, 4)]
+    assert len(records) == 3
+
+
+def test_async_engine_drives_pagination():
+    """Requests sent over the async engine follow `paging.next_link` like `requests`."""
+    httpx = pytest.importorskip("httpx")
+    pages = {
+        None: {"paging": {"next_link": "https://adsapi.snapchat.com/v1/x?cursor=2"},
+               "roles": [{"role": {"id": "role-1"}}]},
+        "2": {"paging": {}, "roles": [{"role": {"id": "role-2"}}]},
+    }
+
+    def handler(request):
+        return httpx.Response(200, json=pages[request.url.params.get("cursor")])
+
+    stream = build_tap(http_engine="async", max_workers=2).streams["roles"]
+    skip_authentication(stream)
+    engine = stream.async_engine
+    engine._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    records = list(stream.request_records({"organization_id": "org-1"}))
+
+    assert [record["id"] for record in records] == ["role-1", "role-2"]
+
+
+def test_async_engine_is_closed_when_the_sync_fails():
+    """The engine is closed however the sync ends, and a new tap gets a new one."""
+    pytest.importorskip("httpx")
+    tap = build_tap(http_engine="async", max_workers=2)
+    engine = tap.streams["roles"].async_engine
+    for stream in tap.streams.values():
+        stream.selected = stream.name == "organizations"
+
+    def fail(context=None):
+        raise RuntimeError("sync failed")
+
+    tap.streams["organizations"].sync = fail
+    with pytest.raises(RuntimeError):
+        tap.sync_all()
+
+    assert not engine._thread.is_alive()
+    assert engine._client.is_closed
+    assert build_tap(http_engine="async", max_workers=2).streams["roles"].async_engine is not engine
+
+
+def test_stats_streams_skip_requests_when_up_to_date():
+    """No request is sent when the bookmark already reached the end of the sync."""
+    stream = build_tap().streams["ad_stats_hourly"]
+    context = {"ad_id": "ad-1"}
+    stream.get_context_state(context).update(
+        replication_key="start_time",
+        replication_key_value=stream.window_planner.end_time.isoformat(),
+    )
+    stream._write_starting_replication_value(context)
+    stream._request = None  # Any request attempt would fail.
+    assert list(stream.request_records(context)) == []
+
+
+def test_stats_requests_start_when_the_entity_was_created():
+    """The first window of a new entity starts at its creation, not `start_date`."""
+    stream = build_tap().streams["ad_stats_daily"]
+    context = {"ad_id": "ad-1", "entity_created_at": "2024-05-02T10:00:00.000Z"}
+    stream._write_starting_replication_value(context)
+
+    params = stream.get_url_params(context, None)
+
+    assert params["start_time"] == "2024-05-01T00:00:00"
+    assert stream.get_context_state(context) is stream.get_context_state({"ad_id": "ad-1"})
+
+
+@pytest.mark.parametrize(
+    ("status", "updated_at", "config", "skipped"),
+    [
+        ("PAUSED", "2024-02-01T00:00:00.000Z", {}, True),
+        ("PAUSED", "2024-03-02T00:00:00.000Z", {}, False),
+        ("ACTIVE", "2024-02-01T00:00:00.000Z", {}, False),
+        ("PAUSED", "2024-02-01T00:00:00.000Z", {"stats_skip_inactive_entities": False}, False),
+    ],
+)
+def test_stats_requests_skip_inactive_entities(status, updated_at, config, skipped):
+    """Paused entities untouched since their bookmark are not requested again."""
+    stream = build_tap(**config).streams["ad_stats_daily"]
+    context = {"ad_id": "ad-1", "entity_status": status, "entity_updated_at": updated_at}
+    stream.get_context_state(context).update(
+        replication_key="start_time",
+        replication_key_value="2024-03-01T00:00:00.000-08:00",
+    )
+    stream._write_starting_replication_value(context)
+    requested = []
+    stream.prepare_request = lambda context, next_page_token: requested.append(context)
+    stream._request = lambda *args: build_response({"timeseries_stats": []})
+    stream.get_next_page_token = lambda response, previous_token: None
+
+    list(stream.request_records(context))
+
+    assert not requested if skipped else requested
+
+
+def test_stats_streams_track_last_delivery():
+    """The start of the latest row with delivery is kept in the partition state."""
+    stream = build_tap().streams["ad_stats_daily"]
+    context = {"ad_id": "ad-1"}
+    stream.request_records = lambda context: iter([
+        {"id": "ad-1", "start_time": "2024-01-01T00:00:00.000-08:00", "spend": 5},
+        {"id": "ad-1", "start_time": "2024-01-02T00:00:00.000-08:00", "spend": 0},
+    ])
+
+    list(stream.get_records(context))
+
+    assert stream.get_context_state(context)["last_delivery_time"] == (
+        "2024-01-01T00:00:00.000-08:00"
+    )
+
+
+def test_stats_fields_follow_catalog_selection():
+    """Only selected metrics are requested, without conversion source types."""
+    stream = build_tap().streams["ad_stats_daily"]
+    for metric in stream.fields.split(","):
+        stream.metadata[("properties", metric)].selected = metric in (
+            "spend", "impressions", "swipes"
+        )
+    stream._mask = None
+    all_fields_stream = build_tap().streams["ad_stats_daily"]
+    for each in (stream, all_fields_stream):
+        each._write_starting_replication_value({"ad_id": "ad-1"})
+
+    params = stream.get_url_params({"ad_id": "ad-1"}, None)
+    all_fields_params = all_fields_stream.get_url_params({"ad_id": "ad-1"}, None)
+
+    assert params["fields"] == "impressions,spend,swipes"
+    assert "conversion_source_types" not in params
+    assert all_fields_params["fields"] == all_fields_stream.fields
+    assert "conversion_source_types" in all_fields_params
+
+
+def test_stats_pagination_keeps_the_window_across_pages():
+    """Cursor pages stay in their window; the next window starts where it ended."""
+    stream = build_tap(start_date="2024-01-01T00:00:00Z").streams["ad_stats_daily"]
+    stream.window_planner.end_time = stream.window_planner.end_time.replace(
+        year=2024, month=3, day=1
+    )
+    context = {"ad_id": "ad-1"}
+    stream._write_starting_replication_value(context)
+    requested = []
+
+    def request(prepared_request, context):
+        params = dict(
+            param.split("=") for param in prepared_request.url.split("?")[1].split("&")
+        )
+        requested.append((params["start_time"][:10], params["end_time"][:10],
+                          params.get("cursor")))
+        next_link = None
+        if not params.get("cursor"):
+            next_link = "https://adsapi.snapchat.com/v1/ads/ad-1/stats?cursor=c2"
+        data_point = {"start_time": params["start_time"], "end_time": params["end_time"],
+                      "stats": {"spend": 1}}
+        response = build_response({
+            "paging": {"next_link": next_link} if next_link else {},
+            "timeseries_stats": [{"timeseries_stat": {
+                "id": "ad-1", "type": "AD", "timeseries": [data_point],
+            }}],
+        }, prepared_request.url)
+        response.request = prepared_request
+        return response
+
+    skip_authentication(stream)
+    stream._request = request
+    rows = list(stream.request_records(context))
+
+    assert requested == [
+        ("2024-01-01", "2024-01-31", None),
+        ("2024-01-01", "2024-01-31", "c2"),
+        ("2024-01-31", "2024-03-01", None),
+        ("2024-01-31", "2024-03-01", "c2"),
+    ]
+    assert rows[0] == {
+        "id": "ad-1", "type": "AD", "start_time": "2024-01-01T00%3A00%3A00",
+        "end_time": "2024-01-31T00%3A00%3A00", "spend": 1,
+    }
+
+
+def test_countries_are_fetched_in_parallel_and_emitted_in_order():
+    """Each country is its own partition, prefetched up to `max_workers` ahead."""
+    countries = ["us", "gb", "nl", "de", "fr", "be"]
+    tap = build_tap(max_workers=3, targeting_country_codes=countries)
+    stream = tap.streams["targeting_postal_codes"]
+    contexts = []
+    # Only passed once `max_workers` countries are requested at the same time.
+    in_flight = threading.Barrier(3, timeout=10)
+
+    def request_postal_codes(context):
+        contexts.append(context)
+        in_flight.wait()
+        yield {"postalCode": f"{context['country_code']}-1"}
+
+    stream.request_records = request_postal_codes
+    messages = []
+    tap.write_message = messages.append
+
+    stream.sync()
+
+    records = [message.record for message in messages if hasattr(message, "record")]
+    assert [record["country_code"] for record in records] == countries
+    assert records[0] == {"id": "us-1", "postalCode": "us-1", "country_code": "us"}
+    assert len({id(context) for context in contexts}) == len(countries)
+
+
+@pytest.mark.parametrize("newest_first", [False, True])
+def test_entities_unchanged_since_the_bookmark_are_left_out(monkeypatch, newest_first):
+    """Unchanged entities are not emitted; newest first, pagination stops at them."""
+    pages = [
+        [{"id": "ad-3", "updated_at": "2024-03-01T00:00:00.000Z"},
+         {"id": "ad-2", "updated_at": "2024-01-01T00:00:00.000Z"}],
+        [{"id": "ad-1", "updated_at": "2023-12-01T00:00:00.000Z"}],
+    ]
+    pages_read = []
+
+    def request_records(stream, context):
+        for page in pages:
+            pages_read.append(page)
+            yield from page
+
+    monkeypatch.setattr(RESTStream, "request_records", request_records)
+    stream = build_tap(incremental_newest_first=newest_first).streams["ads"]
+    context = {"ad_account_id": "account-1"}
+    stream.get_context_state(context)["replication_key_value"] = "2024-02-01T00:00:00.000Z"
+
+    records = list(stream.request_records(context))
+
+    assert [record["id"] for record in records] == ["ad-3"]
+    assert len(pages_read) == (1 if newest_first else 2)
+    assert stream.get_url_params(context, None)["sort"] == (
+        "desc" if newest_first else "asc"
+    )
+
+
+def test_daily_stats_are_rolled_up_from_hourly_stats():
+    """Additive daily metrics come from hourly rows; the rest is still requested."""
+    tap = build_tap(stats_daily_from_hourly=True)
+    for stream in tap.streams.values():
+        stream.selected = stream.name in ("ads", "ad_stats_daily", "ad_stats_hourly")
+    ads, daily, hourly = (
+        tap.streams[name] for name in ("ads", "ad_stats_daily", "ad_stats_hourly")
+    )
+    assert [child.name for child in ads.child_streams] == [
+        "ad_stats_hourly",
+        "ad_stats_daily",
+    ]
+    assert "spend" in hourly.request_fields and "spend" not in daily.request_fields
+    assert "uniques" in daily.request_fields
+
+    ads.request_records = lambda context: iter(
+        [{"id": "ad-1", "updated_at": "2024-01-01T00:00:00Z"}]
+    )
+    hourly_requests, daily_requests = [], []
+
+    def request_hourly(context):
+        hourly_requests.append(hourly.get_starting_timestamp(context))
+        start = datetime.datetime.fromisoformat("2024-01-01T00:00:00.000-08:00")
+        for hour in range(24):
+            yield {
+                "id": "ad-1",
+                "start_time": (start + datetime.timedelta(hours=hour)).isoformat(),
+                "end_time": (start + datetime.timedelta(hours=hour + 1)).isoformat(),
+                "spend": 2,
+            }
+
+    def request_daily(context):
+        daily_requests.append(daily.request_fields)
+        yield {"id": "ad-1", "start_time": "2024-01-01T00:00:00.000-08:00",
+               "end_time": "2024-01-02T00:00:00.000-08:00", "uniques": 7}
+
+    hourly.request_records = request_hourly
+    daily.request_records = request_daily
+    # Hours are requested from the start of the day the daily stream still needs.
+    hourly.get_context_state({"ad_id": "ad-1"}).update(
+        replication_key="start_time",
+        replication_key_value="2024-01-01T05:00:00.000-08:00",
+    )
+    messages = []
+    tap.write_message = messages.append
+
+    ads.sync(context={"ad_account_id": "account-1"})
+
+    daily_records = [
+        message.record
+        for message in messages
+        if getattr(message, "stream", None) == "ad_stats_daily"
+        and hasattr(message, "record")
+    ]
+    assert len(daily_records) == 1
+    assert daily_records[0]["spend"] == 48
+    assert daily_records[0]["uniques"] == 7
+    assert daily_records[0]["granularity"] == "DAY"
+    assert hourly_requests[0].isoformat() == "2024-01-01T00:00:00+00:00"
+
+
+def test_daily_rows_of_days_not_rolled_up_are_passed_through():
+    """A day the hourly rows don't cover keeps the row the API returned for it."""
+    tap = build_tap(stats_daily_from_hourly=True)
+    for stream in tap.streams.values():
+        stream.selected = stream.name in ("ad_stats_daily", "ad_stats_hourly")
+    ads, daily, hourly = (
+        tap.streams[name] for name in ("ads", "ad_stats_daily", "ad_stats_hourly")
+    )
+    ads.request_records = lambda context: iter([{"id": "ad-1"}])
+    start = datetime.datetime.fromisoformat("2024-01-01T00:00:00.000-08:00")
+    hourly.request_records = lambda context: (
+        {"id": "ad-1",
+         "start_time": (start + datetime.timedelta(hours=hour)).isoformat(),
+         "end_time": (start + datetime.timedelta(hours=hour + 1)).isoformat(),
+         "spend": 1}
+        for hour in range(24)
+    )
+    daily.request_records = lambda context: (
+        {"id": "ad-1", "start_time": f"2024-01-0{day}T00:00:00.000-08:00",
+         "end_time": f"2024-01-0{day + 1}T00:00:00.000-08:00", "uniques": day}
+        for day in (1, 2)
+    )
+    messages = []
+    tap.write_message = messages.append
+
+    ads.sync(context={"ad_account_id": "account-1"})
+
+    daily_records = [
+        message.record for message in messages
+        if getattr(message, "stream", None) == "ad_stats_daily"
+        and hasattr(message, "record")
+    ]
+    assert [
+        (record["start_time"][:10], record.get("spend"), record["uniques"])
+        for record in daily_records
+    ] == [("2024-01-01", 24, 1), ("2024-01-02", None, 2)]
+
+
+@pytest.mark.parametrize("policy", ["omit", "filter"])
+def test_bookmark_advances_across_windows_without_rows(policy):
+    """Empty rows are dropped, but the next sync starts after the last window."""
+    stream = build_tap(stats_empty_rows=policy).streams["ad_stats_daily"]
+    stream.window_planner.end_time = stream.window_planner.end_time.replace(
+        year=2024, month=3, day=1
+    )
+    context = {"ad_id": "ad-1"}
+    stream._write_starting_replication_value(context)
+    omit_empty = []
+
+    def request(prepared_request, context):
+        omit_empty.append("omit_empty=true" in prepared_request.url)
+        timeseries = [] if policy == "omit" else [{
+            "start_time": "2024-01-01T00:00:00.000-08:00",
+            "end_time": "2024-01-02T00:00:00.000-08:00",
+            "stats": {"spend": 0, "impressions": 0},
+        }]
+        response = build_response({"timeseries_stats": [{"timeseries_stat": {
+            "id": "ad-1", "type": "AD", "timeseries": timeseries,
+        }}]}, prepared_request.url)
+        response.request = prepared_request
+        return response
+
+    skip_authentication(stream)
+    stream._request = request
+    records = list(stream.get_records(context))
+
+    assert records == []
+    assert omit_empty == [policy == "omit"] * 2
+    assert stream.get_context_state(context)["synced_until"] == "2024-03-01T00:00:00+00:00"
+    assert stream.get_starting_timestamp(context).isoformat() == "2024-03-01T00:00:00+00:00"
+
+
+def test_filtered_pages_do_not_end_the_partition():
+    """A page whose rows were all filtered out is followed by its next page."""
+    stream = build_tap(stats_empty_rows="filter").streams["ad_stats_daily"]
+    stream.window_planner.end_time = stream.window_planner.end_time.replace(
+        year=2024, month=1, day=3
+    )
+    context = {"ad_id": "ad-1"}
+    stream._write_starting_replication_value(context)
+    cursors = []
+
+    def request(prepared_request, context):
+        cursor = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(prepared_request.url).query)).get("cursor")
+        cursors.append(cursor)
+        day = 2 if cursor else 1
+        response = build_response({
+            "timeseries_stats": [{"timeseries_stat": {"id": "ad-1", "type": "AD", "timeseries": [{
+                "start_time": f"2024-01-0{day}T00:00:00.000-08:00",
+                "end_time": f"2024-01-0{day + 1}T00:00:00.000-08:00",
+                "stats": {"spend": 0 if cursor is None else 5},
+            }]}}],
+            "paging": {} if cursor else {
+                "next_link": "https://adsapi.snapchat.com/v1/ads/ad-1/stats?cursor=2&limit=1"
+            },
+        }, prepared_request.url)
+        response.request = prepared_request
+        return response
+
+    skip_authentication(stream)
+    stream._request = request
+    records = list(stream.get_records(context))
+
+    assert cursors == [None, "2"]
+    assert [record["spend"] for record in records] == [5]
+    assert stream.get_context_state(context)["synced_until"] == "2024-01-03T00:00:00+00:00"
+
+
+def test_unfinalized_stats_are_requested_again():
+    """With `stats_refresh_unfinalized`, syncs restart at the finalized data end."""
+    context = {"ad_id": "ad-1", "ad_account_timezone": "America/Los_Angeles"}
+    requested_windows = []
+    state = None
+    # The refresh window comes back without rows, but more of it is final by then.
+    for finalized_data_end_time, rows in (
+        ("2024-01-08T00:00:00.000-08:00", True),
+        ("2024-01-10T08:00:00Z", False),
+    ):
+        tap = TapSnapchatAds(
+            config={**SAMPLE_CONFIG, "stats_refresh_unfinalized": True},
+            state=state,
+            parse_env_config=False,
+        )
+        stream = tap.streams["ad_stats_daily"]
+        stream.window_planner.now = datetime.datetime(
+            2024, 1, 11, 12, tzinfo=datetime.timezone.utc
+        )
+        stream.window_planner.end_time = datetime.datetime(
+            2024, 1, 11, tzinfo=datetime.timezone.utc
+        )
+        stream._write_starting_replication_value(context)
+        serve_daily_stats(stream, requested_windows, finalized_data_end_time, rows)
+        for record in stream.get_records(context):
+            stream._increment_stream_state(record, context=context)
+        stream._finalize_state(stream.get_context_state(context))
+        state = copy.deepcopy(tap.state)
+
+    assert requested_windows == [(1, 11), (8, 11)]
+    assert stream.get_context_state(context)["finalized_until"] == (
+        "2024-01-10T00:00:00+00:00"
+    )
+    stream._write_starting_replication_value(context)
+    assert stream.get_starting_timestamp(context).isoformat() == (
+        "2024-01-10T00:00:00+00:00"
+    )
+
+
+def test_finalized_data_end_time_is_read_as_ad_account_wall_time():
+    """A UTC `finalized_data_end_time` caps windows at the account's wall clock."""
+    stream = build_tap(stats_end_at_finalized_data=True).streams["ad_stats_hourly"]
+    context = {"ad_id": "ad-1", "ad_account_timezone": "America/Los_Angeles"}
+    response = build_response({"timeseries_stats": [{"timeseries_stat": {
+        "id": "ad-1", "type": "AD", "timeseries": [],
+        "finalized_data_end_time": "2024-01-05T08:00:00Z",
+    }}]})
+    stream._write_starting_replication_value(context)
+    response.request = stream.prepare_request(context, None)
+
+    assert stream.get_finalized_data_end_time(response) == datetime.datetime(
+        2024, 1, 5, tzinfo=datetime.timezone.utc
+    )
+
+
+def test_compact_state_keeps_one_bookmark_per_ad_account():
+    """Entities share their ad account's bookmark, which moves once all were synced."""
+    stream = build_tap(stats_compact_state=True).streams["ad_stats_daily"]
+    rows = {
+        "ad-1": [{"id": "ad-1", "start_time": "2024-01-05T00:00:00.000-08:00", "spend": 5}],
+        "ad-2": [{"id": "ad-2", "start_time": "2024-01-03T00:00:00.000-08:00", "spend": 0}],
+    }
+    window_end = as_wall_time(parse_datetime("2024-01-10T00:00:00Z"))
+    stream.get_partition_records = lambda context: iter(
+        rows[context["ad_id"]] + [WindowComplete(window_end)]
+    )
+    start_times = []
+    for ad_id in rows:
+        context = {"ad_id": ad_id, "ad_account_id": "account-1"}
+        stream._write_starting_replication_value(context)
+        start_times.append(stream.get_starting_timestamp(context).isoformat())
+        for record in stream.get_records(context):
+            stream._increment_stream_state(record, context=context)
+    stream.finalize_state_progress_markers()
+
+    assert start_times == ["2024-01-01T00:00:00+00:00"] * 2
+    assert stream.stream_state["partitions"] == [{
+        "context": {"ad_account_id": "account-1"},
+        "replication_key": "start_time",
+        "replication_key_value": "2024-01-05T00:00:00.000-08:00",
+        "synced_until": "2024-01-10T00:00:00+00:00",
+        "last_delivery_times": {},
+    }]
+
+
+def test_compact_state_replaces_per_entity_partitions():
+    """Ad accounts start from the earliest bookmark of a state that wasn't compact."""
+    stream = build_tap(stats_compact_state=True).streams["ad_stats_daily"]
+    stream.stream_state["partitions"] = [
+        {"context": {"ad_id": ad_id}, "replication_key": "start_time",
+         "replication_key_value": bookmark}
+        for ad_id, bookmark in (("ad-1", "2024-02-01T00:00:00Z"), ("ad-2", "2024-01-15T00:00:00Z"))
+    ]
+    context = {"ad_id": "ad-3", "ad_account_id": "account-1"}
+    stream._write_starting_replication_value(context)
+
+    assert [partition["context"] for partition in stream.stream_state["partitions"]] == [
+        {"ad_account_id": "account-1"}
+    ]
+    assert stream.get_starting_timestamp(context).isoformat() == "2024-01-15T00:00:00+00:00"
+
+
+def serve_daily_stats(
+    stream,
+    requested_windows: list,
+    finalized_data_end_time: str | None = None,
+    rows: bool = True,
+) -> None:
+    """Answer the stats requests of `stream` with one row per day of the window."""
+
+    def request(prepared_request, context):
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(prepared_request.url).query))
+        start = datetime.datetime.fromisoformat(params["start_time"])
+        end = datetime.datetime.fromisoformat(params["end_time"])
+        requested_windows.append((start.day, end.day))
+        timeseries = [
+            {"start_time": f"{day:%Y-%m-%d}T00:00:00.000-08:00",
+             "end_time": f"{day + datetime.timedelta(days=1):%Y-%m-%d}T00:00:00.000-08:00",
+             "stats": {"spend": 1}}
+            for day in (start + datetime.timedelta(days=index) for index in range((end - start).days))
+        ] if rows else []
+        timeseries_stat = {"id": "ad-1", "type": "AD", "timeseries": timeseries}
+        if finalized_data_end_time:
+            timeseries_stat["finalized_data_end_time"] = finalized_data_end_time
+        response = build_response(
+            {"timeseries_stats": [{"timeseries_stat": timeseries_stat}]},
+            prepared_request.url,
+        )
+        response.request = prepared_request
+        return response
+
+    skip_authentication(stream)
+    stream._request = request
+
+
+def test_stats_windows_can_be_requested_newest_first():
+    """Recent windows come first, and the partition is synced until the end either way."""
+    stream = build_tap(stats_backfill_order="newest_first").streams["ad_stats_daily"]
+    stream.window_planner.max_step = datetime.timedelta(days=3)
+    stream.window_planner.end_time = stream.window_planner.end_time.replace(
+        year=2024, month=1, day=8
+    )
+    context = {"ad_id": "ad-1"}
+    stream._write_starting_replication_value(context)
+    requested_windows = []
+    serve_daily_stats(stream, requested_windows)
+
+    records = list(stream.get_records(context))
+
+    assert requested_windows == [(5, 8), (2, 5), (1, 2)]
+    assert [record["start_time"][8:10] for record in records[:3]] == ["05", "06", "07"]
+    assert stream.get_context_state(context)["synced_until"] == "2024-01-08T00:00:00+00:00"
+
+
+def test_stats_stop_at_the_ad_account_wall_clock():
+    """An account west of UTC is not synced into the day still in progress there."""
+    stream = build_tap().streams["ad_stats_daily"]
+    # Already the 10th in UTC, but still the 9th in Los Angeles.
+    stream.window_planner.now = datetime.datetime(2024, 1, 10, 5, tzinfo=datetime.timezone.utc)
+    stream.window_planner.end_time = datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc)
+    context = {"ad_id": "ad-1", "ad_account_timezone": "America/Los_Angeles"}
+    stream._write_starting_replication_value(context)
+    requested_windows = []
+    serve_daily_stats(stream, requested_windows)
+
+    records = list(stream.get_records(context))
+
+    assert requested_windows == [(1, 9)]
+    assert len(records) == 8
+    state = stream.get_context_state(context)
+    assert state["synced_until"] == "2024-01-09T00:00:00+00:00"
+    assert stream.stream_state["partitions"][0]["context"] == {"ad_id": "ad-1"}
+
+
+@pytest.mark.parametrize("newest_first", [False, True])
+def test_interrupted_backfill_resumes_at_the_first_incomplete_window(newest_first):
+    """Completed windows are checkpointed, so a new sync only requests the others."""
+    config = {
+        "stats_backfill_checkpoints": True,
+        "stats_backfill_order": "newest_first" if newest_first else "oldest_first",
+    }
+    context = {"ad_id": "ad-1"}
+    requested_windows = []
+    states = []
+    for _ in range(2):
+        tap = TapSnapchatAds(
+            config={**SAMPLE_CONFIG, **config},
+            state=copy.deepcopy(states[-1]) if states else None,
+            parse_env_config=False,
+        )
+        stream = tap.streams["ad_stats_daily"]
+        stream.window_planner.max_step = datetime.timedelta(days=3)
+        stream.window_planner.end_time = stream.window_planner.end_time.replace(
+            year=2024, month=1, day=10
+        )
+        stream._write_starting_replication_value(context)
+        serve_daily_stats(stream, requested_windows)
+        records = stream.get_records(context)
+        if not states:
+            # Interrupted during the second window.
+            for _ in range(4):
+                next(records)
+            records.close()
+        else:
+            list(records)
+        states.append(copy.deepcopy(tap.state))
+
+    partition = states[0]["bookmarks"]["ad_stats_daily"]["partitions"][0]
+    if newest_first:
+        assert requested_windows == [(7, 10), (4, 7), (4, 7), (1, 4)]
+        assert partition["synced_windows"] == [
+            ["2024-01-07T00:00:00+00:00", "2024-01-10T00:00:00+00:00"]
+        ]
+    else:
+        assert requested_windows == [(1, 4), (4, 7), (4, 7), (7, 10)]
+        assert partition["synced_windows"] == [
+            ["2024-01-01T00:00:00+00:00", "2024-01-04T00:00:00+00:00"]
+        ]
+    partition = states[1]["bookmarks"]["ad_stats_daily"]["partitions"][0]
+    assert "synced_windows" not in partition
+    assert partition["synced_until"] == "2024-01-10T00:00:00+00:00"
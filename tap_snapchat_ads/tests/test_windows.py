@@ -0,0 +1,133 @@
+"""Tests for the stats date window planner."""
+
+import datetime
+
+from tap_snapchat_ads.windows import (
+    StatsWindow,
+    StatsWindowPlanner,
+    get_timezone,
+    merge_windows,
+    subtract_windows,
+)
+
+UTC = datetime.timezone.utc
+
+
+def test_end_time_is_truncated_to_the_granularity():
+    """The upper bound only covers complete days or hours."""
+    now = datetime.datetime(2024, 3, 10, 15, 42, tzinfo=UTC)
+    daily = StatsWindowPlanner("DAY", datetime.timedelta(days=30), end_time=now)
+    hourly = StatsWindowPlanner("HOUR", datetime.timedelta(days=7), end_time=now)
+    assert daily.end_time == datetime.datetime(2024, 3, 10, tzinfo=UTC)
+    assert hourly.end_time == datetime.datetime(2024, 3, 10, 15, tzinfo=UTC)
+
+
+def test_end_time_follows_the_ad_account_wall_clock():
+    """Accounts west of UTC end at their own day or hour, which UTC is ahead of."""
+    now = datetime.datetime(2024, 3, 10, 5, 42, tzinfo=UTC)
+    daily = StatsWindowPlanner("DAY", datetime.timedelta(days=30), now=now)
+    hourly = StatsWindowPlanner("HOUR", datetime.timedelta(days=7), now=now)
+    los_angeles = get_timezone("America/Los_Angeles")
+
+    assert daily.get_end_time(los_angeles) == datetime.datetime(2024, 3, 9, tzinfo=UTC)
+    assert hourly.get_end_time(los_angeles) == datetime.datetime(2024, 3, 9, 21, tzinfo=UTC)
+    assert daily.get_end_time(get_timezone("Asia/Tokyo")) == daily.end_time
+    assert hourly.get_end_time(get_timezone(None)) == datetime.datetime(
+        2024, 3, 9, 17, tzinfo=UTC
+    )
+
+
+def test_end_time_is_computed_per_planner():
+    """Each sync gets its own upper bound instead of one fixed at import time."""
+    planner = StatsWindowPlanner("HOUR", datetime.timedelta(days=7))
+    now = datetime.datetime.now(UTC)
+    assert now - planner.end_time < datetime.timedelta(hours=1)
+    assert planner.end_time.tzinfo is not None
+
+
+def test_windows_are_capped_at_the_end_time():
+    """Windows never extend past the end of the sync."""
+    planner = StatsWindowPlanner(
+        "DAY", datetime.timedelta(days=30),
+        end_time=datetime.datetime(2024, 1, 10, tzinfo=UTC),
+    )
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone(-datetime.timedelta(hours=8)))
+    assert planner.get_window(start) == StatsWindow(
+        datetime.datetime(2024, 1, 1, tzinfo=UTC), datetime.datetime(2024, 1, 10, tzinfo=UTC)
+    )
+    assert planner.get_window(datetime.datetime(2024, 1, 10, tzinfo=UTC)) is None
+
+
+def test_windows_can_be_capped_at_finalized_data_end_time():
+    """`finalized_data_end_time` lowers the end of the window to the granularity."""
+    planner = StatsWindowPlanner(
+        "DAY", datetime.timedelta(days=30),
+        end_time=datetime.datetime(2024, 1, 10, tzinfo=UTC),
+    )
+    window = planner.get_window(
+        datetime.datetime(2024, 1, 1, tzinfo=UTC),
+        datetime.datetime(2024, 1, 5, 7, tzinfo=UTC),
+    )
+    assert window.end == datetime.datetime(2024, 1, 5, tzinfo=UTC)
+    assert planner.get_window(
+        datetime.datetime(2024, 1, 5, tzinfo=UTC),
+        datetime.datetime(2024, 1, 5, 7, tzinfo=UTC),
+    ) is None
+
+
+def test_windows_are_clipped_to_the_entity_lifetime():
+    """No window starts before the entity existed or continues after it ended."""
+    planner = StatsWindowPlanner(
+        "DAY", datetime.timedelta(days=30),
+        end_time=datetime.datetime(2024, 6, 1, tzinfo=UTC),
+    )
+    window = planner.get_window(
+        datetime.datetime(2024, 1, 1, tzinfo=UTC),
+        entity_start_time=datetime.datetime(2024, 3, 10, 12, tzinfo=UTC),
+        entity_end_time=datetime.datetime(2024, 3, 12, 12, tzinfo=UTC),
+    )
+    assert window == StatsWindow(
+        datetime.datetime(2024, 3, 9, tzinfo=UTC), datetime.datetime(2024, 3, 13, tzinfo=UTC)
+    )
+    assert planner.get_window(
+        window.end, entity_end_time=datetime.datetime(2024, 3, 12, 12, tzinfo=UTC)
+    ) is None
+
+
+def test_step_adapts_to_the_rows_per_response():
+    """Large responses shrink the next window and small ones grow it back."""
+    planner = StatsWindowPlanner("HOUR", datetime.timedelta(days=7), target_rows=1000)
+    assert planner.get_next_step(datetime.timedelta(days=7), 3500) == datetime.timedelta(days=2)
+    assert planner.get_next_step(datetime.timedelta(days=2), 100000) == datetime.timedelta(days=1)
+    assert planner.get_next_step(datetime.timedelta(days=2), 200) == datetime.timedelta(days=7)
+    assert planner.get_next_step(datetime.timedelta(days=2), 0) == datetime.timedelta(days=7)
+
+
+def day(number: int) -> datetime.datetime:
+    return datetime.datetime(2024, 1, number, tzinfo=UTC)
+
+
+def test_completed_windows_are_left_out_of_the_remaining_ranges():
+    """Ranges left exclude the completed windows, which merge when they touch."""
+    done = [StatsWindow(day(5), day(7)), StatsWindow(day(3), day(5)), StatsWindow(day(9), day(12))]
+    assert merge_windows(done) == [StatsWindow(day(3), day(7)), StatsWindow(day(9), day(12))]
+    assert subtract_windows(StatsWindow(day(1), day(10)), done) == [
+        StatsWindow(day(1), day(3)), StatsWindow(day(7), day(9)),
+    ]
+    assert subtract_windows(StatsWindow(day(4), day(6)), done) == []
+
+
+def test_windows_are_taken_oldest_or_newest_first():
+    """Newest first walks the ranges backwards from their end."""
+    planner = StatsWindowPlanner("DAY", datetime.timedelta(days=3), end_time=day(20))
+    remaining = (StatsWindow(day(1), day(3)), StatsWindow(day(7), day(11)))
+
+    assert planner.take_window(remaining) == (
+        StatsWindow(day(1), day(3)), (StatsWindow(day(7), day(11)),)
+    )
+    assert planner.take_window(remaining, newest_first=True) == (
+        StatsWindow(day(8), day(11)),
+        (StatsWindow(day(1), day(3)), StatsWindow(day(7), day(8))),
+    )
+    assert planner.take_window(remaining, day(2)) == (StatsWindow(day(1), day(2)), ())
+    assert planner.take_window(()) == (None, ())
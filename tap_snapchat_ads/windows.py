@@ -0,0 +1,229 @@
+"""Date window planning for the SnapchatAds stats streams."""
+
+from __future__ import annotations
+
+import datetime
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+import pytz
+
+GRANULARITY_STEPS = {
+    "DAY": datetime.timedelta(days=1),
+    "HOUR": datetime.timedelta(hours=1),
+}
+MIN_STEP = datetime.timedelta(days=1)
+# Entity start and end times are in UTC while windows use the ad account's wall
+# clock, so entity bounds are widened by the largest possible timezone offset.
+ENTITY_TIME_MARGIN = datetime.timedelta(days=1)
+# The timezone whose wall clock is the furthest behind, for ad accounts whose
+# timezone is unknown: windows then never end in a day or hour still in progress.
+EARLIEST_TIMEZONE = datetime.timezone(datetime.timedelta(hours=-12))
+
+
+def parse_datetime(value: str) -> datetime.datetime:
+    """Parse an ISO 8601 timestamp as returned by the API."""
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def as_wall_time(
+    value: datetime.datetime, timezone: datetime.tzinfo | None = None
+) -> datetime.datetime:
+    """Return `value` as a UTC-labelled wall clock time, in `timezone` if given.
+
+    Snapchat interprets request times in the ad account's timezone and returns
+    times with that timezone's offset, so windows are compared on wall clock values.
+    """
+    if timezone is not None:
+        value = value.astimezone(timezone)
+    return value.replace(tzinfo=datetime.timezone.utc)
+
+
+def get_timezone(name: str | None) -> datetime.tzinfo:
+    """Return the IANA timezone `name` of an ad account, or the earliest if unknown."""
+    if name:
+        try:
+            return pytz.timezone(name)
+        except pytz.UnknownTimeZoneError:
+            pass
+    return EARLIEST_TIMEZONE
+
+
+def truncate(value: datetime.datetime, granularity: str) -> datetime.datetime:
+    """Truncate `value` to the start of its day or hour."""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if granularity == "DAY":
+        value = value.replace(hour=0)
+    return value
+
+
+@dataclass(frozen=True)
+class StatsWindow:
+    """The `start_time`/`end_time` bounds of one stats request."""
+
+    start: datetime.datetime
+    end: datetime.datetime
+
+
+@dataclass(frozen=True)
+class StatsPageToken:
+    """Pagination state of a stats request: its window and the page within it."""
+
+    window: StatsWindow
+    step: datetime.timedelta | None = None
+    cursor: str | None = None
+    limit: str | None = None
+    # The ranges still to request after `window`, when they are planned up front.
+    remaining: tuple[StatsWindow, ...] | None = None
+
+
+@dataclass(frozen=True)
+class WindowComplete:
+    """Marker yielded among stats rows once every page of a window was parsed.
+
+    Lets the bookmark, and the time stats are final until, move past windows that
+    returned no rows.
+    """
+
+    end: datetime.datetime
+    start: datetime.datetime | None = None
+    # The wall clock time the stats of the window are final until.
+    finalized_until: datetime.datetime | None = None
+
+
+def merge_windows(windows: Iterable[StatsWindow]) -> list[StatsWindow]:
+    """Merge overlapping and adjacent windows, ordered by start."""
+    merged: list[StatsWindow] = []
+    for window in sorted(windows, key=lambda window: window.start):
+        if merged and window.start <= merged[-1].end:
+            if window.end > merged[-1].end:
+                merged[-1] = StatsWindow(merged[-1].start, window.end)
+        else:
+            merged.append(window)
+    return merged
+
+
+def subtract_windows(window: StatsWindow, done: Iterable[StatsWindow]) -> list[StatsWindow]:
+    """Return the ranges of `window` that none of the `done` windows cover."""
+    remaining = []
+    start = window.start
+    for done_window in merge_windows(done):
+        if done_window.end <= start or done_window.start >= window.end:
+            continue
+        if done_window.start > start:
+            remaining.append(StatsWindow(start, done_window.start))
+        start = max(start, done_window.end)
+    if start < window.end:
+        remaining.append(StatsWindow(start, window.end))
+    return remaining
+
+
+class StatsWindowPlanner:
+    """Plan the date windows requested by a stats stream during one sync.
+
+    The current time is read once, when the planner is created at the start of the
+    stream's sync. Windows of an ad account end no later than its wall clock time
+    then, truncated to the granularity, so only complete days or hours are
+    requested. They can optionally end at the API's `finalized_data_end_time`.
+
+    Windows are clipped to the lifetime of the entity they are requested for, and
+    their length adapts to the number of rows the previous window returned, so that
+    responses stay close to `target_rows`.
+    """
+
+    def __init__(
+        self,
+        granularity: str,
+        max_step: datetime.timedelta,
+        end_time: datetime.datetime | None = None,
+        target_rows: int | None = None,
+        now: datetime.datetime | None = None,
+    ):
+        self.granularity = granularity
+        self.max_step = max_step
+        self.target_rows = target_rows
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+        # Wall clock bound of every window, whatever the ad account's timezone.
+        self.end_time = as_wall_time(truncate(end_time or self.now, granularity))
+
+    def get_end_time(self, timezone: datetime.tzinfo | None = None) -> datetime.datetime:
+        """Return the wall clock end of the windows of an ad account in `timezone`.
+
+        That is the account's current day or hour, or `end_time` if earlier.
+        """
+        if timezone is None:
+            return self.end_time
+        wall_time = as_wall_time(self.now.astimezone(timezone))
+        return min(self.end_time, truncate(wall_time, self.granularity))
+
+    def get_window(
+        self,
+        start_time: datetime.datetime,
+        finalized_data_end_time: datetime.datetime | None = None,
+        *,
+        step: datetime.timedelta | None = None,
+        entity_start_time: datetime.datetime | None = None,
+        entity_end_time: datetime.datetime | None = None,
+        end_time: datetime.datetime | None = None,
+    ) -> StatsWindow | None:
+        """Return the window starting at `start_time`, or None if nothing is left.
+
+        Windows never start before the entity existed nor extend past its end, nor
+        past `end_time` (by default `self.end_time`).
+        """
+        start = as_wall_time(start_time)
+        if entity_start_time is not None:
+            start = max(start, self._truncate(entity_start_time - ENTITY_TIME_MARGIN))
+        end = min(start + (step or self.max_step), end_time or self.end_time)
+        if entity_end_time is not None:
+            end = min(end, self._truncate(entity_end_time + ENTITY_TIME_MARGIN))
+        if finalized_data_end_time is not None:
+            end = min(end, self._truncate(finalized_data_end_time))
+        if end <= start:
+            return None
+        return StatsWindow(start, end)
+
+    def take_window(
+        self,
+        remaining: Sequence[StatsWindow],
+        finalized_data_end_time: datetime.datetime | None = None,
+        *,
+        step: datetime.timedelta | None = None,
+        newest_first: bool = False,
+    ) -> tuple[StatsWindow | None, tuple[StatsWindow, ...]]:
+        """Split the next window off the `remaining` ranges, oldest or newest first.
+
+        Returns the window, or None if nothing is left, and the ranges left after it.
+        """
+        if finalized_data_end_time is not None:
+            end = self._truncate(finalized_data_end_time)
+            remaining = [
+                StatsWindow(window.start, min(window.end, end))
+                for window in remaining if window.start < end
+            ]
+        if not remaining:
+            return None, ()
+        step = step or self.max_step
+        if newest_first:
+            *rest, last = remaining
+            window = StatsWindow(max(last.start, last.end - step), last.end)
+            if window.start > last.start:
+                rest.append(StatsWindow(last.start, window.start))
+            return window, tuple(rest)
+        first, *rest = remaining
+        window = StatsWindow(first.start, min(first.end, first.start + step))
+        if window.end < first.end:
+            rest.insert(0, StatsWindow(window.end, first.end))
+        return window, tuple(rest)
+
+    def get_next_step(
+        self, step: datetime.timedelta | None, rows: int
+    ) -> datetime.timedelta:
+        """Return the length of the next window given the rows of the last one."""
+        if not self.target_rows or not rows:
+            return self.max_step
+        days = (step or self.max_step) / MIN_STEP * self.target_rows / rows
+        return min(self.max_step, max(MIN_STEP, int(days) * MIN_STEP))
+
+    def _truncate(self, value: datetime.datetime) -> datetime.datetime:
+        return truncate(as_wall_time(value), self.granularity)